@@ -0,0 +1,69 @@
+"""
+accumulators.py
+Single-pass GROUP BY: running COUNT/SUM/MIN/MAX per group, compiled per query shape
+
+Instead of collecting the rows of every group in a list and aggregating each
+list afterwards, one generated loop keeps a flat state list per group:
+
+    [rows, seen_0, total_0, min_0, max_0, seen_1, total_1, ...]
+
+with one (seen, total, min, max) block per numeric column; AVG is total / seen.
+Values are converted with float() and skipped when that fails, and totals are
+added in row order from 0, so results equal sum()/min()/max() over the values.
+"""
+
+_accumulators = {}
+
+
+def new_state(column_count):
+    """Empty state of one group"""
+    return [0] + [0, 0, None, None] * column_count
+
+
+def block(index):
+    """Offset of the (seen, total, min, max) block of numeric column `index` in a state"""
+    return 1 + 4 * index
+
+
+def _build(group_count, column_count):
+    names = [f"g{i}" for i in range(group_count)]
+    if group_count == 0: key = "()"
+    elif group_count == 1: key = "r.get(g0)"
+    else: key = "(" + ", ".join(f"r.get({g})" for g in names) + ")"
+    lines = [f"def accumulate(records, groups, group_by, columns):",
+             f"    {''.join(g + ', ' for g in names)}= group_by" if names else "",
+             f"    {''.join(f'c{j}, ' for j in range(column_count))}= columns" if column_count else "",
+             f"    for r in records:",
+             f"        key = {key}",
+             f"        s = groups.get(key)",
+             f"        if s is None:",
+             f"            s = groups[key] = [0{', 0, 0, None, None' * column_count}]",
+             f"        s[0] += 1"]
+    for j in range(column_count):
+        b = block(j)
+        lines += [f"        try:",
+                  f"            x = float(r.get(c{j}))",
+                  f"        except (ValueError, TypeError):",
+                  f"            pass  # Skip non-numeric for math ops",
+                  f"        else:",
+                  f"            s[{b + 1}] += x",
+                  f"            if s[{b}]:",
+                  f"                if x < s[{b + 2}]: s[{b + 2}] = x",
+                  f"                if x > s[{b + 3}]: s[{b + 3}] = x",
+                  f"            else:",
+                  f"                s[{b + 2}] = s[{b + 3}] = x",
+                  f"            s[{b}] += 1"]
+    lines.append("    return groups")
+    namespace = {}
+    exec(compile("\n".join(line for line in lines if line) + "\n", '<accumulate>', 'exec'), namespace)
+    return namespace['accumulate']
+
+
+def compile_accumulator(group_count, column_count):
+    """Function (records, groups, group_by, columns) -> groups that folds records into groups.
+    Keys are the group value itself for one GROUP BY column, a tuple otherwise ((): no GROUP BY)."""
+    shape = (group_count, column_count)
+    accumulate = _accumulators.get(shape)
+    if accumulate is None:
+        accumulate = _accumulators[shape] = _build(group_count, column_count)
+    return accumulate
@@ -0,0 +1,60 @@
+"""
+bench_aggregate.py
+Benchmark: aggregates on a row table vs a columnar table (NumPy path when installed)
+
+Usage: python bench_aggregate.py [--rows 1000000]
+"""
+
+import argparse
+import random
+
+import bench_util
+import database
+import query_parser
+import vectorized
+
+COLUMNS = "CREATE TABLE emp (id INT PRIMARY KEY, dept TEXT, age INT, salary FLOAT)"
+QUERIES = [
+    "SELECT COUNT(*) FROM emp",
+    "SELECT SUM(salary) FROM emp",
+    "SELECT AVG(age) FROM emp WHERE salary > 50000",
+    "SELECT MAX(salary) FROM emp WHERE dept = 'IT' AND age < 30",
+    "SELECT AVG(salary) FROM emp GROUP BY dept",
+]
+
+
+def run_query(db, q):
+    """Result of a parsed aggregate query on db, as the session runs it"""
+    return db.aggregate(q['table'], q['aggregates'], q['where'], q['group_by'], q['having'], q['order_by'], q['limit'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    args = parser.parse_args()
+
+    depts = ['IT', 'HR', 'Ops', 'Sales', 'Legal']
+    rows = [[i, random.choice(depts), random.randint(18, 65), round(random.uniform(20000, 90000), 2)]
+            for i in range(args.rows)]
+    dbs = {}
+    for storage in ('row', 'columnar'):
+        db = dbs[storage] = database.Database('bench', 'bench')
+        db.journal = None
+        db.create_table('emp', query_parser.QueryParser.parse(COLUMNS)['columns'], storage)
+        for values in rows:
+            db.insert_record('emp', values)
+
+    print(f"{args.rows} rows, NumPy {'available' if vectorized.np is not None else 'not installed'}")
+    table = bench_util.Comparison('Query', 60, 'row', 'columnar')
+    table.header()
+    for sql in QUERIES:
+        q = query_parser.QueryParser.parse(sql)
+        call = lambda db: run_query(db, q)
+        slow, expected = bench_util.timed(lambda: call(dbs['row']))
+        fast, got = bench_util.timed(lambda: call(dbs['columnar']))
+        assert got == expected
+        table.row(sql, slow, fast)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+bench_hashtable.py
+Microbenchmark: resizing HashTable vs the original fixed 100-bucket table
+
+Usage: python bench_hashtable.py [--sizes 1000 100000 1000000] [--legacy-max 100000]
+"""
+
+import argparse
+import random
+
+import bench_util
+import data_structures
+
+
+class LegacyNode:
+    def __init__(self, key, value):
+        self.key = key
+        self.value = value
+        self.next = None
+
+
+class LegacyHashTable:
+    """The original implementation: 100 fixed buckets, hash(str(key))"""
+    def __init__(self, size=100):
+        self.size = size
+        self.table = [None] * size
+
+    def _hash(self, key):
+        return hash(str(key)) % self.size
+
+    def insert(self, key, value):
+        index = self._hash(key)
+        if self.table[index] is None:
+            self.table[index] = LegacyNode(key, value)
+        else:
+            current = self.table[index]
+            while current:
+                if current.key == key:
+                    current.value = value
+                    return
+                if current.next is None:
+                    break
+                current = current.next
+            current.next = LegacyNode(key, value)
+
+    def get(self, key):
+        index = self._hash(key)
+        current = self.table[index]
+        while current:
+            if current.key == key:
+                return current.value
+            current = current.next
+        return None
+
+
+def run(table_cls, keys, probes):
+    table = table_cls()
+
+    def insert_all():
+        for k in keys:
+            table.insert(k, k)
+
+    def get_all():
+        for k in probes:
+            table.get(k)
+
+    insert_time, _ = bench_util.timed(insert_all)
+    get_time, _ = bench_util.timed(get_all)
+    return insert_time, get_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000])
+    parser.add_argument('--probes', type=int, default=10000, help="lookups timed per size")
+    parser.add_argument('--legacy-max', type=int, default=100000,
+                        help="skip the legacy table above this size (its inserts are quadratic)")
+    args = parser.parse_args()
+
+    print(f"{'Keys':>10} | {'Table':<8} | {'insert total':>12} | {'get (us/op)':>11}")
+    print("-" * 52)
+    for n in args.sizes:
+        keys = list(range(n))
+        random.shuffle(keys)
+        probes = random.choices(keys, k=args.probes)
+        for name, cls in (('new', data_structures.HashTable), ('legacy', LegacyHashTable)):
+            if cls is LegacyHashTable and n > args.legacy_max:
+                print(f"{n:>10} | {name:<8} | {'skipped':>12} | {'-':>11}")
+                continue
+            insert_time, get_time = run(cls, keys, probes)
+            print(f"{n:>10} | {name:<8} | {insert_time:>11.3f}s | {get_time / len(probes) * 1e6:>11.2f}")
+
+
+if __name__ == '__main__':
+    main()
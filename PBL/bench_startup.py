@@ -0,0 +1,70 @@
+"""
+bench_startup.py
+Benchmark: opening a database from its JSON snapshot vs its page file (pagefile.py)
+
+Usage: python bench_startup.py [--rows 200000] [--tables 4]
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+
+import bench_util
+import database
+import pagefile
+import query_parser
+
+COLUMNS = "CREATE TABLE t{n} (id INT PRIMARY KEY, dept TEXT, age INT, salary FLOAT){storage}"
+
+
+def load_json(path):
+    with open(path) as f:
+        return database.Database.from_dict(json.load(f)['database'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000, help="rows per table")
+    parser.add_argument('--tables', type=int, default=4)
+    args = parser.parse_args()
+
+    depts = ['IT', 'HR', 'Ops', 'Sales', 'Legal']
+    db = database.Database('bench', 'bench')
+    db.journal = None
+    for n in range(args.tables):
+        # Alternate row and columnar tables
+        sql = COLUMNS.format(n=n, storage=' STORAGE COLUMNAR' if n % 2 else '')
+        db.create_table(f"t{n}", query_parser.QueryParser.parse(sql)['columns'], 'columnar' if n % 2 else 'row')
+        for i in range(args.rows):
+            db.insert_record(f"t{n}", [i, random.choice(depts), random.randint(18, 65),
+                                       round(random.uniform(20000, 90000), 2)])
+    query = lambda d: d.select_records('t0', [('id', '=', args.rows // 2)])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path, pages_path = os.path.join(tmp, 'bench.json'), os.path.join(tmp, 'bench.sdb')
+        with open(json_path, 'w') as f:
+            json.dump({'database': db.to_dict(), 'owner': 'bench', 'password_hash': None}, f, indent=2)
+        pagefile.write(pages_path, db)
+
+        print(f"{args.tables} tables x {args.rows} rows; JSON {os.path.getsize(json_path) / 1e6:.1f} MB, "
+              f"page file {os.path.getsize(pages_path) / 1e6:.1f} MB")
+        table = bench_util.Comparison('Step', 36, 'JSON', 'pages')
+        table.header()
+        slow, loaded = bench_util.timed(lambda: load_json(json_path))
+        fast, (opened, _) = bench_util.timed(lambda: pagefile.open_database(pages_path))
+        table.row('open', slow, fast)
+
+        first, expected = bench_util.timed(lambda: query(opened))
+        assert expected == query(loaded)
+        table.row('open + first query on one table', slow, fast + first)
+
+        rest, _ = bench_util.timed(lambda: list(opened.tables.values()))
+        total = fast + first + rest
+        assert all(list(map(dict, loaded._rows(t))) == list(map(dict, opened._rows(t))) for t in loaded.tables)
+        table.row('open + decode every table', slow, total)
+
+
+if __name__ == '__main__':
+    main()
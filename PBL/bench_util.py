@@ -0,0 +1,33 @@
+"""
+bench_util.py
+Shared timing and result-table helpers for the bench_*.py scripts
+"""
+
+import time
+
+
+def timed(fn):
+    """Call fn() once; return (seconds taken, its result)"""
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+class Comparison:
+    """Table of timings, one row per case, for a slow and a fast variant side by side;
+    widths: of the slow and fast columns; rule: length of the line under the header"""
+    def __init__(self, title, width, slow, fast, widths=(8, 8), rule=None):
+        self.width = width
+        self.rule = rule
+        self.columns = list(zip((slow, fast), widths))
+        self.title = title
+
+    def header(self):
+        names = " | ".join(f"{name:>{w}}" for name, w in self.columns)
+        line = f"{self.title:<{self.width}} | {names} | {'speedup':>7}"
+        print(line)
+        print("-" * (self.rule or len(line) + 1))
+
+    def row(self, label, slow, fast):
+        times = " | ".join(f"{t:>{w - 1}.3f}s" for t, (_, w) in zip((slow, fast), self.columns))
+        print(f"{label:<{self.width}} | {times} | {slow / fast:>6.1f}x")
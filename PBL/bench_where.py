@@ -0,0 +1,42 @@
+"""
+bench_where.py
+Benchmark: full-scan WHERE filtering, interpreted (_evaluate_where) vs compiled (predicates)
+
+Usage: python bench_where.py [--rows 200000]
+"""
+
+import argparse
+import random
+
+import bench_util
+import database
+import predicates
+
+CLAUSES = {
+    "age > 30": [('age', '>', 30)],
+    "city = 'Delhi'": [('city', '=', 'Delhi')],
+    "age >= 25 AND age < 40 AND city != 'Pune'": [('age', '>=', 25), ('age', '<', 40), ('city', '!=', 'Pune')],
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000)
+    args = parser.parse_args()
+
+    cities = ['Delhi', 'Pune', 'Bhimtal', 'Dehradun']
+    rows = [{'id': i, 'age': random.randint(18, 60), 'city': random.choice(cities)} for i in range(args.rows)]
+    db = database.Database('bench', 'bench')
+
+    print(f"{args.rows} rows")
+    table = bench_util.Comparison('WHERE', 45, 'interpreted', 'compiled', widths=(11, 9), rule=83)
+    table.header()
+    for label, where in CLAUSES.items():
+        slow, expected = bench_util.timed(lambda: [r for r in rows if db._evaluate_where(r, where)])
+        fast, got = bench_util.timed(lambda: list(filter(predicates.compile_where(where), rows)))
+        assert got == expected
+        table.row(label, slow, fast)
+
+
+if __name__ == '__main__':
+    main()
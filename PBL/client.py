@@ -0,0 +1,189 @@
+"""
+client.py
+Client library for server.py: blocking connections and a thread-safe connection pool
+
+    pool = client.ConnectionPool('127.0.0.1', 6543, 'admin', 'admin123', database='shop', size=8)
+    pool.execute("INSERT INTO items VALUES (1, 'pen')")
+    with pool.connection() as conn:
+        conn.execute("START TRANSACTION")
+        conn.pipeline(["UPDATE items SET name = 'ink' WHERE id = 1", "COMMIT"])
+        for row in conn.stream("SELECT * FROM items", batch=1000):
+            ...
+
+Errors raised by the server come back as ValueError (PermissionError for
+authentication and roles), as they do in-process.
+"""
+
+import socket
+import threading
+from contextlib import contextmanager
+
+import protocol
+
+
+def _raise(message):
+    raise (PermissionError if message.get('kind') == 'PermissionError' else ValueError)(message['error'])
+
+
+class Connection:
+    """One session on a StructDB server; use it from one thread at a time"""
+    def __init__(self, host='127.0.0.1', port=protocol.DEFAULT_PORT, user=None, password=None, database=None,
+                 timeout=None):
+        self.sock = socket.create_connection((host, port), timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.stream_file = self.sock.makefile('rb')
+        self.next_id = 0
+        self.database = None  # the session's current database (full name), as last reported
+        self.in_transaction = False
+        if user is not None:
+            self.login(user, password)
+        if database is not None:
+            self.execute(f"USE {database}")
+
+    def _send(self, op, **fields):
+        self.next_id += 1
+        self.sock.sendall(protocol.encode(dict(fields, id=self.next_id, op=op)))
+        return self.next_id
+
+    def _receive(self, request_id):
+        message = protocol.recv_frame(self.stream_file)
+        if message.get('id') != request_id:
+            raise ConnectionError(f"Reply to request {message.get('id')} while expecting {request_id}")
+        if 'transaction' in message:
+            self.database, self.in_transaction = message['database'], message['transaction']
+        return message
+
+    def _result(self, message):
+        if not message['ok']: _raise(message)
+        return message['result']
+
+    def login(self, user, password):
+        return self._result(self._receive(self._send('login', user=user, password=password)))
+
+    def ping(self):
+        return self._result(self._receive(self._send('ping')))
+
+    def execute(self, sql):
+        """Result of one statement, as DatabaseManager.execute_query returns it"""
+        return self._result(self._receive(self._send('query', sql=sql)))
+
+    def pipeline(self, statements):
+        """Send every statement before reading any reply; returns their results in order.
+        Each statement runs even if an earlier one fails; the first error is raised
+        once every reply has been read."""
+        ids = [self._send('query', sql=sql) for sql in statements]
+        replies = [self._receive(request_id) for request_id in ids]
+        return [self._result(message) for message in replies]
+
+    def stream(self, sql, batch=protocol.DEFAULT_BATCH):
+        """Rows of a SELECT, fetched `batch` at a time as the iteration goes; leaving the
+        loop early tells the server to stop reading"""
+        request_id = self._send('stream', sql=sql, batch=batch)
+        done = False
+        try:
+            while not done:
+                message = self._receive(request_id)
+                if not message['ok']:
+                    done = True
+                    _raise(message)
+                done = message['done']
+                yield from message['rows']
+        finally:
+            if not done:
+                self.sock.sendall(protocol.encode({'op': 'cancel', 'target': request_id}))
+                while not done:
+                    message = self._receive(request_id)
+                    done = not message['ok'] or message['done']
+
+    def close(self):
+        self.stream_file.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ConnectionPool:
+    """Up to `size` logged-in Connections shared by threads
+
+    A connection is handed back in the state the pool gave it out: an open
+    transaction is rolled back and the pool's database selected again. One that
+    failed with a network error is dropped and replaced on demand.
+    """
+    def __init__(self, host='127.0.0.1', port=protocol.DEFAULT_PORT, user=None, password=None, database=None,
+                 size=4, timeout=None):
+        self.address = (host, port)
+        self.credentials = (user, password)
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.idle = []  # most recently used last
+        self.opened = 0
+        self.lock = threading.Condition()
+
+    def _acquire(self):
+        with self.lock:
+            while not self.idle and self.opened >= self.size:
+                self.lock.wait()
+            if self.idle:
+                return self.idle.pop()
+            self.opened += 1
+        try:
+            conn = Connection(*self.address, *self.credentials, self.database, self.timeout)
+        except BaseException:
+            self._discard(None)
+            raise
+        conn.home = conn.database
+        return conn
+
+    def _discard(self, conn):
+        if conn is not None:
+            conn.close()
+        with self.lock:
+            self.opened -= 1
+            self.lock.notify()
+
+    def _release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            if conn.database != conn.home:
+                conn.execute(f"USE {self.database}")
+        except (OSError, ValueError):
+            return self._discard(conn)
+        with self.lock:
+            self.idle.append(conn)
+            self.lock.notify()
+
+    @contextmanager
+    def connection(self):
+        """A Connection for the duration of a with block"""
+        conn = self._acquire()
+        try:
+            yield conn
+        except OSError:  # ConnectionError included: the session is gone
+            self._discard(conn)
+            raise
+        except BaseException:
+            self._release(conn)
+            raise
+        self._release(conn)
+
+    def execute(self, sql):
+        with self.connection() as conn:
+            return conn.execute(sql)
+
+    def pipeline(self, statements):
+        with self.connection() as conn:
+            return conn.pipeline(statements)
+
+    def close(self):
+        """Close the idle connections (ones in use close when handed back)"""
+        with self.lock:
+            idle, self.idle = self.idle, []
+            self.size = 0
+        for conn in idle:
+            self._discard(conn)
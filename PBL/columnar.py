@@ -0,0 +1,370 @@
+"""
+columnar.py
+Typed column storage for tables created with STORAGE COLUMNAR
+
+Each column lives in one buffer chosen from its declared type:
+  INT family      -> array('q') of 64-bit integers
+  FLOAT family    -> array('d') of doubles (ints stored there are flagged and returned as ints)
+  other types     -> dictionary encoding: array('I') of codes into a list of distinct values
+  _created_at/_updated_at -> array('q') of microseconds, returned as ISO strings
+
+A value a typed column cannot hold exactly (e.g. text in an INT column) turns
+that column into a dictionary-encoded one, so results never differ from the
+row layout. Rows are exposed as Row views (a mapping over one position) so the
+rest of the engine, indexes included, handles them like record dicts.
+"""
+
+import operator
+from abc import ABC, abstractmethod
+from array import array
+from collections.abc import MutableMapping
+from datetime import datetime, timedelta
+from itertools import compress, repeat
+
+import predicates
+
+INT_TYPES = ('INT', 'INTEGER', 'BIGINT', 'SMALLINT', 'TINYINT')
+FLOAT_TYPES = ('FLOAT', 'REAL', 'DOUBLE', 'DECIMAL', 'NUMERIC')
+TIMESTAMP_COLUMNS = ('_created_at', '_updated_at')
+COMPARE = {'=': operator.eq, '!=': operator.ne, '>': operator.gt, '<': operator.lt,
+           '>=': operator.ge, '<=': operator.le}
+
+NULL, VALUE, INTEGRAL = 0, 1, 2  # per-row kind of a typed column slot
+EPOCH = datetime(1970, 1, 1)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+
+def _matches_null(op, value):
+    """What the row layout's WHERE semantics give for a NULL cell"""
+    return predicates.compile_where([('v', op, value)])({'v': None})
+
+
+class TypedColumn(ABC):
+    """Fixed-width values in an array.array plus one kind byte per row; subclasses pick
+    the typecode and encode"""
+    typecode = 'q'
+
+    def __init__(self):
+        self.data = array(self.typecode)
+        self.kinds = bytearray()
+
+    def __len__(self):
+        return len(self.kinds)
+
+    @abstractmethod
+    def encode(self, value):
+        """(machine value, kind) if the column holds `value` exactly, else None"""
+
+    def get(self, pos):
+        return self.data[pos] if self.kinds[pos] else None
+
+    def append(self, value):
+        encoded = self.encode(value)
+        if encoded is None: return False
+        self.data.append(encoded[0])
+        self.kinds.append(encoded[1])
+        return True
+
+    def set(self, pos, value):
+        encoded = self.encode(value)
+        if encoded is None: return False
+        self.data[pos], self.kinds[pos] = encoded
+        return True
+
+    def pop(self):
+        self.data.pop()
+        self.kinds.pop()
+
+    def take(self, positions):
+        column = self.__class__()
+        column.data = array(self.typecode, map(self.data.__getitem__, positions))
+        column.kinds = bytearray(map(self.kinds.__getitem__, positions))
+        return column
+
+    def values(self):
+        return [self.get(i) for i in range(len(self))]
+
+    def nbytes(self):
+        return len(self.data) * self.data.itemsize + len(self.kinds)
+
+    def numbers(self, positions=None):
+        """Every non-NULL value (as stored), for SUM/AVG/MIN/MAX"""
+        if positions is None:
+            return self.data if NULL not in self.kinds else list(compress(self.data, self.kinds))
+        data, kinds = self.data, self.kinds
+        return [data[i] for i in positions if kinds[i]]
+
+    def select(self, op, value, positions=None):
+        """Positions (ascending) whose value satisfies `op value`, or None if not decidable here"""
+        if op == 'IN':
+            wanted = set()
+            for v in value:
+                number = predicates._coerce(v)[0]
+                if number is not None: wanted.add(number)
+            matches = lambda data: map(wanted.__contains__, data)
+        else:
+            if op not in COMPARE: return None
+            constant = predicates._coerce(value)[0]
+            if constant is None or constant != constant: return None
+            fn = COMPARE[op]
+            matches = lambda data: map(fn, data, repeat(constant))
+        data, kinds = self.data, self.kinds
+        if positions is None:
+            positions = range(len(kinds))
+        else:
+            data = map(data.__getitem__, positions)
+            kinds = bytes(map(kinds.__getitem__, positions))
+        hits = matches(data)
+        if NULL in kinds:
+            null_match = _matches_null(op, value)
+            hits = map(lambda kind, hit: hit if kind else null_match, kinds, hits)
+        return list(compress(positions, hits))
+
+
+class IntColumn(TypedColumn):
+    typecode = 'q'
+
+    def encode(self, value):
+        if value is None: return 0, NULL
+        if value.__class__ is int and -2 ** 63 <= value < 2 ** 63: return value, VALUE
+        return None
+
+
+class FloatColumn(TypedColumn):
+    typecode = 'd'
+
+    def encode(self, value):
+        if value is None: return 0.0, NULL
+        if value.__class__ is float: return value, VALUE
+        if value.__class__ is int and -2 ** 53 <= value <= 2 ** 53: return float(value), INTEGRAL
+        return None
+
+    def get(self, pos):
+        kind = self.kinds[pos]
+        if kind == VALUE: return self.data[pos]
+        return int(self.data[pos]) if kind else None
+
+
+class TimestampColumn(TypedColumn):
+    typecode = 'q'
+
+    def encode(self, value):
+        if value is None: return 0, NULL
+        if value.__class__ is not str: return None
+        try:
+            moment = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+        if moment.tzinfo is not None or moment.isoformat() != value: return None
+        return (moment - EPOCH) // ONE_MICROSECOND, VALUE
+
+    def get(self, pos):
+        return (EPOCH + timedelta(microseconds=self.data[pos])).isoformat() if self.kinds[pos] else None
+
+    def numbers(self, positions=None):
+        return []
+
+    def select(self, op, value, positions=None):
+        return None
+
+
+class DictColumn:
+    """Dictionary-encoded values of any type: each distinct value is stored once"""
+
+    def __init__(self, values=()):
+        self.codes = array('I')
+        self.dictionary = []
+        self.lookup = {}
+        for value in values:
+            self.append(value)
+
+    def __len__(self):
+        return len(self.codes)
+
+    @staticmethod
+    def _key(value):
+        # Text is keyed by itself; other values with their type so 1, 1.0 and True stay apart
+        return value if value.__class__ is str else (value.__class__, value)
+
+    @classmethod
+    def from_codes(cls, codes, dictionary):
+        """Column over existing codes (array('I')) into a list of distinct values"""
+        column = cls()
+        column.codes = codes
+        column.dictionary = dictionary
+        column.lookup = {(value if value.__class__ is str else (value.__class__, value)): code
+                         for code, value in enumerate(dictionary)}
+        return column
+
+    def _code(self, value):
+        key = self._key(value)
+        code = self.lookup.get(key)
+        if code is None:
+            code = self.lookup[key] = len(self.dictionary)
+            self.dictionary.append(value)
+        return code
+
+    def get(self, pos):
+        return self.dictionary[self.codes[pos]]
+
+    def append(self, value):
+        self.codes.append(self._code(value))
+        return True
+
+    def set(self, pos, value):
+        self.codes[pos] = self._code(value)
+        return True
+
+    def pop(self):
+        self.codes.pop()
+
+    def take(self, positions):
+        """Re-encode the kept rows, dropping dictionary entries nothing refers to"""
+        dictionary = self.dictionary
+        return DictColumn(dictionary[self.codes[i]] for i in positions)
+
+    def values(self):
+        return list(map(self.dictionary.__getitem__, self.codes))
+
+    def nbytes(self):
+        return len(self.codes) * self.codes.itemsize
+
+    def numbers(self, positions=None):
+        """float() of each numeric value; each distinct value is converted once"""
+        converted = []
+        for value in self.dictionary:
+            try:
+                converted.append(float(value))
+            except (TypeError, ValueError):
+                converted.append(None)
+        codes = self.codes if positions is None else map(self.codes.__getitem__, positions)
+        return [v for v in map(converted.__getitem__, codes) if v is not None]
+
+    def select(self, op, value, positions=None):
+        # The predicate runs once per distinct value, then rows are matched by code
+        if op == 'OR': return None
+        predicate = predicates.compile_where([('v', op, value)])
+        wanted = {code for code, v in enumerate(self.dictionary) if predicate({'v': v})}
+        codes = self.codes
+        if positions is None:
+            positions = range(len(codes))
+        else:
+            codes = map(codes.__getitem__, positions)
+        return list(compress(positions, map(wanted.__contains__, codes)))
+
+
+def column_for(column_name, declared_type):
+    """Empty column storage for a declared SQL type"""
+    if column_name in TIMESTAMP_COLUMNS:
+        return TimestampColumn()
+    base = (declared_type or 'TEXT').split('(')[0].strip().upper()
+    if base in INT_TYPES: return IntColumn()
+    if base in FLOAT_TYPES: return FloatColumn()
+    return DictColumn()
+
+
+class ColumnStore:
+    """All columns of one table; position i across the columns is row i"""
+
+    def __init__(self, column_definitions=()):
+        self.columns = {}
+        self.length = 0
+        for col_def in column_definitions:
+            self.columns[col_def['name']] = column_for(col_def['name'], col_def.get('type'))
+        for name in TIMESTAMP_COLUMNS:
+            self.columns[name] = TimestampColumn()
+
+    def __len__(self):
+        return self.length
+
+    def _store(self, name, value, pos=None):
+        column = self.columns[name]
+        ok = column.append(value) if pos is None else column.set(pos, value)
+        if not ok:
+            # The value does not fit the declared type: keep it exactly, dictionary-encoded
+            column = self.columns[name] = DictColumn(column.values())
+            column.append(value) if pos is None else column.set(pos, value)
+
+    def append(self, record):
+        """Store a record dict as a new row and return its Row view"""
+        for name in self.columns:
+            self._store(name, record.get(name))
+        row = Row(self, self.length)
+        self.length += 1
+        return row
+
+    def set(self, name, pos, value):
+        if name not in self.columns: raise ValueError(f"Unknown column '{name}'")
+        self._store(name, value, pos)
+
+    def pop(self):
+        for column in self.columns.values():
+            column.pop()
+        self.length -= 1
+
+    def add_column(self, name, declared_type, default=None):
+        column = self.columns[name] = column_for(name, declared_type)
+        for _ in range(self.length):
+            if not column.append(default):
+                column = self.columns[name] = DictColumn([default] * self.length)
+                break
+
+    def drop_column(self, name):
+        del self.columns[name]
+
+    def compact(self, rows):
+        """Keep only `rows` (in order), repointing each view at its new position"""
+        positions = [row.pos for row in rows]
+        self.columns = {name: column.take(positions) for name, column in self.columns.items()}
+        for new_pos, row in enumerate(rows):
+            row.pos = new_pos
+        self.length = len(positions)
+
+    def select(self, condition, positions=None):
+        """Evaluate one WHERE conjunct over a column buffer; None if it needs the row path"""
+        col, op, value = condition
+        column = self.columns.get(col)
+        if column is None or op == 'OR': return None
+        return column.select(op, value, positions)
+
+    def numbers(self, name, positions=None):
+        column = self.columns.get(name)
+        return column.numbers(positions) if column is not None else []
+
+    def nbytes(self):
+        return sum(column.nbytes() for column in self.columns.values())
+
+
+class Row(MutableMapping):
+    """A record of a columnar table: a live view of one row position"""
+    __slots__ = ('store', 'pos')
+
+    def __init__(self, store, pos):
+        self.store = store
+        self.pos = pos
+
+    def __getitem__(self, key):
+        return self.store.columns[key].get(self.pos)
+
+    def get(self, key, default=None):
+        column = self.store.columns.get(key)
+        return default if column is None else column.get(self.pos)
+
+    def __setitem__(self, key, value):
+        self.store.set(key, self.pos, value)
+
+    def __delitem__(self, key):
+        raise TypeError("Columns of a columnar row cannot be removed individually")
+
+    def __iter__(self):
+        return iter(self.store.columns)
+
+    def __len__(self):
+        return len(self.store.columns)
+
+    def clear(self):
+        for name in self.store.columns:
+            self[name] = None
+
+    def __repr__(self):
+        return repr(dict(self))
@@ -1,65 +1,264 @@
 """
 data_structures.py
-Core data structures: Hash Table and Linked List
+Core data structures: Hash Table, Linked List and the column indexes built on them
 """
 
+from bisect import bisect_left, bisect_right
+
 class Node:
     """Linked List Node for collision handling in hash table"""
-    def __init__(self, key, value):
+    __slots__ = ('key', 'value', 'hash', 'next')
+
+    def __init__(self, key, value, key_hash):
         self.key = key
         self.value = value
+        self.hash = key_hash  # cached so resizing never re-hashes keys
         self.next = None
 
 
 class HashTable:
-    """Hash Table implementation for O(1) indexing"""
-    def __init__(self, size=100):
-        self.size = size
-        self.table = [None] * size
-        
+    """Hash Table implementation for O(1) indexing
+
+    Separate chaining with a bucket array that doubles when the load factor
+    passes MAX_LOAD and halves when it drops below MIN_LOAD, so chains stay
+    short at any table size.
+    """
+    MIN_SIZE = 7
+    MAX_LOAD = 0.75
+    MIN_LOAD = 0.125
+
+    def __init__(self, size=MIN_SIZE):
+        self.size = max(size, self.MIN_SIZE)
+        self.table = [None] * self.size
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, key):
+        return self._find(key) is not None
+
     def _hash(self, key):
-        """Hash function using Python's built-in hash"""
-        return hash(str(key)) % self.size
-    
+        """Hash function using Python's built-in hash on the native key"""
+        return hash(key)
+
+    def _resize(self, new_size):
+        old_table = self.table
+        self.size = new_size
+        self.table = [None] * new_size
+        for node in old_table:
+            while node:
+                nxt = node.next
+                index = node.hash % new_size
+                node.next = self.table[index]
+                self.table[index] = node
+                node = nxt
+
+    def _find(self, key):
+        h = self._hash(key)
+        current = self.table[h % self.size]
+        while current:
+            if current.hash == h and current.key == key:
+                return current
+            current = current.next
+        return None
+
     def insert(self, key, value):
         """Insert key-value pair with chaining for collision handling"""
-        index = self._hash(key)
-        if self.table[index] is None:
-            self.table[index] = Node(key, value)
-        else:
-            current = self.table[index]
-            while current:
-                if current.key == key:
-                    current.value = value
-                    return
-                if current.next is None:
-                    break
-                current = current.next
-            current.next = Node(key, value)
-    
-    def get(self, key):
-        """Retrieve value by key"""
-        index = self._hash(key)
+        h = self._hash(key)
+        index = h % self.size
         current = self.table[index]
         while current:
-            if current.key == key:
-                return current.value
+            if current.hash == h and current.key == key:
+                current.value = value
+                return
             current = current.next
-        return None
-    
+        node = Node(key, value, h)
+        node.next = self.table[index]
+        self.table[index] = node
+        self.count += 1
+        if self.count > self.size * self.MAX_LOAD:
+            # Odd sizes spread patterned integer keys better than powers of two
+            self._resize(self.size * 2 + 1)
+
+    def get(self, key):
+        """Retrieve value by key"""
+        node = self._find(key)
+        return node.value if node else None
+
     def delete(self, key):
         """Delete key-value pair"""
-        index = self._hash(key)
+        h = self._hash(key)
+        index = h % self.size
         current = self.table[index]
         prev = None
-        
+
         while current:
-            if current.key == key:
+            if current.hash == h and current.key == key:
                 if prev:
                     prev.next = current.next
                 else:
                     self.table[index] = current.next
+                self.count -= 1
+                if self.size > self.MIN_SIZE and self.count < self.size * self.MIN_LOAD:
+                    self._resize(max(self.size // 2, self.MIN_SIZE))
                 return True
             prev = current
             current = current.next
-        return False
\ No newline at end of file
+        return False
+
+    def items(self):
+        """Yield every (key, value) pair in bucket order"""
+        for node in self.table:
+            while node:
+                yield node.key, node.value
+                node = node.next
+
+
+class UniqueIndex:
+    """Column index for PRIMARY KEY / UNIQUE columns: each key maps to one record"""
+    unique = True
+
+    def __init__(self):
+        self.table = HashTable()
+
+    def __len__(self):
+        return len(self.table)
+
+    def add(self, key, record):
+        self.table.insert(key, record)
+
+    def remove(self, key, record):
+        if self.table.get(key) is record:
+            self.table.delete(key)
+
+    def replace(self, key, old, new):
+        """Point the entry of `old` under key at `new` (a new version of the same row)"""
+        self.table.insert(key, new)
+
+    def get(self, key):
+        return self.table.get(key)
+
+    def find(self, key):
+        record = self.table.get(key)
+        return [record] if record is not None else []
+
+    def load(self, pairs):
+        for key, record in pairs:
+            self.add(key, record)
+
+
+class HashIndex:
+    """Multi-valued column index: each key maps to every record holding it
+
+    Buckets are dicts keyed by id(record), so removal is O(1) and rows come
+    back in insertion order.
+    """
+    unique = False
+
+    def __init__(self):
+        self.table = HashTable()
+
+    def __len__(self):
+        return len(self.table)
+
+    def add(self, key, record):
+        bucket = self.table.get(key)
+        if bucket is None:
+            self.table.insert(key, {id(record): record})
+        else:
+            bucket[id(record)] = record
+
+    def remove(self, key, record):
+        bucket = self.table.get(key)
+        if bucket is not None and bucket.pop(id(record), None) is not None and not bucket:
+            self.table.delete(key)
+
+    def replace(self, key, old, new):
+        bucket = self.table.get(key)
+        del bucket[id(old)]
+        bucket[id(new)] = new
+
+    def find(self, key):
+        bucket = self.table.get(key)
+        return list(bucket.values()) if bucket else []
+
+    def load(self, pairs):
+        for key, record in pairs:
+            self.add(key, record)
+
+
+def order_key(key):
+    """Total order over index keys: numbers (floats) first, then text"""
+    return (0, key) if isinstance(key, float) else (1, key)
+
+
+class SortedIndex:
+    """Ordered column index (CREATE INDEX ... USING BTREE)
+
+    Parallel sorted arrays of keys and records searched with bisect: O(log n)
+    lookups and range starts, in-order iteration for ORDER BY. Equal keys keep
+    insertion order. With unique=True it can also back a PRIMARY KEY / UNIQUE column.
+    """
+    def __init__(self, unique=False):
+        self.unique = unique
+        self.keys = []
+        self.records = []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def load(self, pairs):
+        """Bulk build with one sort instead of n insertions"""
+        entries = sorted(((order_key(k), r) for k, r in pairs), key=lambda e: e[0])
+        self.keys = [k for k, _ in entries]
+        self.records = [r for _, r in entries]
+
+    def load_sorted(self, pairs):
+        """Bulk build from pairs already in key order (no sort)"""
+        self.keys = [order_key(k) for k, _ in pairs]
+        self.records = [r for _, r in pairs]
+
+    def add(self, key, record):
+        key = order_key(key)
+        i = bisect_right(self.keys, key)
+        self.keys.insert(i, key)
+        self.records.insert(i, record)
+
+    def remove(self, key, record):
+        key = order_key(key)
+        i = bisect_left(self.keys, key)
+        while i < len(self.keys) and self.keys[i] == key:
+            if self.records[i] is record:
+                del self.keys[i]
+                del self.records[i]
+                return
+            i += 1
+
+    def replace(self, key, old, new):
+        """Swap `new` in for `old` at its place among equal keys"""
+        key = order_key(key)
+        i = bisect_left(self.keys, key)
+        while self.records[i] is not old:
+            i += 1
+        self.records[i] = new
+
+    def get(self, key):
+        key = order_key(key)
+        i = bisect_left(self.keys, key)
+        return self.records[i] if i < len(self.keys) and self.keys[i] == key else None
+
+    def find(self, key):
+        key = order_key(key)
+        return self.records[bisect_left(self.keys, key):bisect_right(self.keys, key)]
+
+    def range(self, low=None, high=None, low_inclusive=True, high_inclusive=True, reverse=False):
+        """Yield records with low <(=) key <(=) high in key order; None leaves a side open"""
+        start = 0 if low is None else (bisect_left if low_inclusive else bisect_right)(self.keys, order_key(low))
+        stop = len(self.keys) if high is None else (bisect_right if high_inclusive else bisect_left)(self.keys, order_key(high))
+        if reverse:
+            for i in range(stop - 1, start - 1, -1):
+                yield self.records[i]
+        else:
+            for i in range(start, stop):
+                yield self.records[i]
@@ -1,5 +1,238 @@
+import copy
+import functools
+import heapq
+import itertools
+import operator
+import sys
+import threading
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
+import accumulators
+import columnar
 import data_structures
+import predicates
+import vectorized
+
+
+SNAPSHOT_CHUNK = 1024  # rows a snapshot scan copies per hold of the shared lock
+CANCEL_CHECK = 1024  # rows a full scan reads between looks at its cancel token
+HEAP_FRACTION = 16  # ORDER BY ... LIMIT k keeps a top-k heap while k is under 1/16 of the rows
+
+
+class QueryCancelled(Exception):
+    """Raised inside a statement whose CancelToken was cancelled"""
+
+
+class CancelToken:
+    """Lets another thread stop a running statement: full scans and INSERT batches started
+    under `with cancellable(token)` raise QueryCancelled once token.cancel() is called"""
+    def __init__(self):
+        self.event = threading.Event()
+
+    def cancel(self):
+        self.event.set()
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+    def check(self):
+        if self.event.is_set(): raise QueryCancelled("Query cancelled")
+
+
+_cancel_state = threading.local()
+
+
+@contextmanager
+def cancellable(token):
+    """Make token the one the statements this thread runs inside the block honour"""
+    previous = getattr(_cancel_state, 'token', None)
+    _cancel_state.token = token
+    try:
+        yield token
+    finally:
+        _cancel_state.token = previous
+
+
+def current_token():
+    """CancelToken of the statement running on this thread (None: not cancellable)"""
+    return getattr(_cancel_state, 'token', None)
+
+
+def check_cancelled():
+    token = current_token()
+    if token is not None: token.check()
+
+
+def _watched(rows):
+    """rows, stopping with QueryCancelled if the statement running on this thread is cancelled"""
+    token = current_token()
+    return rows if token is None else _checked(iter(rows), token)
+
+
+def _checked(rows, token):
+    """rows, looking at token every CANCEL_CHECK of them"""
+    while True:
+        token.check()
+        chunk = list(itertools.islice(rows, CANCEL_CHECK))
+        if not chunk: return
+        yield from chunk
+
+
+def index_key(value):
+    """Normalise a value so hash lookups agree with WHERE equality (numeric, else text)"""
+    try:
+        key = float(value)
+    except (TypeError, ValueError):
+        return str(value)
+    return key if key == key else str(value)
+
+
+def sort_key(value):
+    """Ordering used by ORDER BY and BTREE indexes: numbers numerically, then text"""
+    return data_structures.order_key(index_key(value))
+
+
+def numeric_sort_key(value):
+    """sort_key for columns declared INT/FLOAT: real numbers skip the parse-or-text fallback"""
+    if (value.__class__ is int or value.__class__ is float) and value == value:
+        return (0, float(value))
+    return sort_key(value)
+
+
+def aggregate_label(function, column):
+    """Result column name of an aggregate, e.g. SUM(salary) or COUNT(*)"""
+    return f"{function}({column if column else '*'})"
+
+
+def order_terms(order_by):
+    """ORDER BY as a list of (column, 'ASC'|'DESC'); a single pair may be passed as a tuple"""
+    if not order_by: return []
+    return order_by if isinstance(order_by, list) else [order_by]
+
+
+class _Descending:
+    """Sort key wrapper reversing the order, for the DESC terms of a mixed ORDER BY"""
+    __slots__ = ('key',)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+
+def _row_order(keys):
+    """(key function, reverse) sorting rows by keys [(key function, descending)]"""
+    if len(keys) == 1:
+        return keys[0]
+    if len({descending for _, descending in keys}) == 1:
+        return lambda r: tuple([k(r) for k, _ in keys]), keys[0][1]
+    return lambda r: tuple([_Descending(k(r)) if d else k(r) for k, d in keys]), False
+
+
+def order_rows(records, keys, limit=None):
+    """Sort by keys [(key function, descending)]. With a limit only the first `limit` rows
+    are kept, via a heap of that size (O(n log k)) rather than sorting everything, unless
+    the limit is a large part of the input (deep LIMIT ... OFFSET pages), where a sort is faster."""
+    key, reverse = _row_order(keys)
+    if limit:
+        records = list(records)
+        if limit * HEAP_FRACTION < len(records):
+            return (heapq.nlargest if reverse else heapq.nsmallest)(limit, records, key=key)
+        return sorted(records, key=key, reverse=reverse)[:limit]
+    return sorted(records, key=key, reverse=reverse)
+
+
+def _ordered(records, keys, limit):
+    """Sort stage: pulls its whole input, but only once the first row is asked for"""
+    yield from order_rows(records, keys, limit)
+
+
+def _keyset_sorted(keyed, reverse, limit):
+    """Sort stage of a keyset page over (key, row) pairs: with a limit, a heap holds only
+    that many (materialising every pair, as order_rows would, costs more than the sort)"""
+    first = operator.itemgetter(0)
+    if limit:
+        yield from (heapq.nlargest if reverse else heapq.nsmallest)(limit, keyed, key=first)
+    else:
+        yield from sorted(keyed, key=first, reverse=reverse)
+
+
+def _join_key(value):
+    """Hash key for JOIN equality (NULL joins nothing)"""
+    return None if value is None else index_key(value)
+
+
+def _resolve_column(ref, schema):
+    """(alias, column) for `alias.column` or an unambiguous `column`; schema maps alias -> columns"""
+    if '.' in ref:
+        alias, column = ref.split('.', 1)
+        if alias not in schema: raise ValueError(f"Unknown table '{alias}' in '{ref}'")
+        if column not in schema[alias]: raise ValueError(f"Unknown column '{ref}'")
+        return alias, column
+    owners = [alias for alias, columns in schema.items() if ref in columns]
+    if not owners: raise ValueError(f"Unknown column '{ref}'")
+    if len(owners) > 1: raise ValueError(f"Column '{ref}' is ambiguous")
+    return owners[0], ref
+
+
+def _rename_where(conditions, rename):
+    """Condition list with every column replaced by rename(column)"""
+    return [(None, op, [_rename_where(branch, rename) for branch in val]) if op == 'OR'
+            else (rename(col), op, val) for col, op, val in conditions]
+
+
+def _where_columns(conditions):
+    """Columns referred to by a condition list"""
+    columns = set()
+    for col, op, val in conditions:
+        if op == 'OR':
+            for branch in val:
+                columns |= _where_columns(branch)
+        else:
+            columns.add(col)
+    return columns
+
+
+def _aggregate_refs(conditions):
+    """(function, column) pairs a HAVING condition list refers to"""
+    refs = []
+    for col, op, val in conditions:
+        if op == 'OR':
+            refs += [ref for branch in val for ref in _aggregate_refs(branch)]
+        elif col.__class__ is tuple:
+            refs.append(col)
+    return refs
+
+
+def _autocommit(method):
+    """Run a mutation as a transaction of its own (a new txid) unless one is already open"""
+    @functools.wraps(method)
+    def run(self, *args, **kwargs):
+        if self.writer_txid is not None:
+            return method(self, *args, **kwargs)
+        self.writer_txid = self.txid + 1
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self._publish()
+    return run
+
+
+def _visible(record, position, begins, versions, txid):
+    """The version of the row at position a snapshot as of txid sees (None: no row);
+    record is the one stored there now"""
+    if begins.get(position, 0) <= txid:
+        return record
+    for version, begin, _ in reversed(versions.get(position, ())):
+        if begin <= txid:
+            return version
+    return None
+
 
 class Database:
     """Database Engine with DDL, DML, Constraint Enforcement, and Aggregates"""
@@ -8,11 +241,332 @@ class Database:
         self.owner = owner
         self.tables = {}
         self.indexes = {} 
+        self.slots = {}  # table -> {id(record): position in table['records']}; deleted rows leave None
+        self.stores = {}  # table -> columnar.ColumnStore for STORAGE COLUMNAR tables
         self.created_at = datetime.now().isoformat()
+        self.lsn = 0
+        self.journal = []  # redo records not yet written to the WAL
+        self.undo_log = None  # before-images, only kept inside a transaction
+        self.savepoints = {}
+        # MVCC: a row dict is never changed once stored (UPDATE stores a new one), and the
+        # versions it replaced are kept with their begin/end txids while a snapshot may read them
+        self.txid = 0  # last committed transaction
+        self.writer_txid = None  # transaction writing now (an open one, or one autocommit statement)
+        self.begins = {}  # table -> {position: txid that stored the current record}
+        self.versions = {}  # table -> {position: [(earlier record, begin txid, end txid), ...]}, oldest first
+        self.last_write = {}  # table -> txid of its latest change
+        self.snapshots = {}  # txid -> number of open snapshots reading as of it
+        self.snapshot_guard = threading.Lock()
+
+    def _log(self, entry):
+        """Record a mutation for the write-ahead log"""
+        if self.journal is None: return
+        self.lsn += 1
+        entry['lsn'] = self.lsn
+        self.journal.append(entry)
+
+    def _undo(self, *entry):
+        """Record how to revert a mutation while a transaction is open"""
+        if self.undo_log is not None:
+            self.undo_log.append(entry)
+
+    def begin_transaction(self):
+        self.undo_log = []
+        self.savepoints = {'': (0, len(self.journal), self.lsn)}
+        self.writer_txid = self.txid + 1
+
+    def commit(self):
+        self.undo_log = None
+        self.savepoints = {}
+        if self.writer_txid is not None:
+            self._publish()
+        pending = getattr(self.tables, 'pending', ())  # still in a page file: nothing to compact, don't decode
+        for table_name in [t for t in self.tables if t not in pending]:
+            self._maybe_compact(table_name)
+
+    def _publish(self):
+        """Make the writing transaction's changes visible to snapshots taken from now on"""
+        with self.snapshot_guard:
+            self.txid, self.writer_txid = self.writer_txid, None
+            if not self.snapshots:
+                # Nobody can read an older version: drop them now rather than at the next vacuum
+                self.begins.clear()
+                self.versions.clear()
+
+    def _supersede(self, table_name, position, record):
+        """Note that the writing transaction replaces the row at position (record: the version it
+        replaces, None for an insert) so snapshots keep seeing it; returns that version's begin txid"""
+        txid = self.writer_txid
+        if txid is None: return 0  # WAL replay: nothing reads the database yet
+        begins = self.begins.setdefault(table_name, {})
+        begin = begins.get(position, 0)
+        if record is not None:
+            self.versions.setdefault(table_name, {}).setdefault(position, []).append((record, begin, txid))
+        begins[position] = txid
+        self.last_write[table_name] = txid
+        return begin
+
+    def _unsupersede(self, table_name, position, begin, versioned=True):
+        """Revert _supersede (rollback)"""
+        if versioned:
+            chains = self.versions[table_name]
+            chains[position].pop()
+            if not chains[position]: del chains[position]
+        if begin: self.begins[table_name][position] = begin
+        else: self.begins[table_name].pop(position, None)
+
+    def snapshot(self, lock=None):
+        """Read-only view of the committed data as of now (see Snapshot); close it when done.
+        lock: the database's locks.ReadWriteLock, held briefly while the view reads live structures"""
+        with self.snapshot_guard:
+            txid = self.txid
+            self.snapshots[txid] = self.snapshots.get(txid, 0) + 1
+        return Snapshot(self, txid, lock)
+
+    def vacuum(self):
+        """Drop row versions older than every open snapshot, then squeeze out tombstones
+        where that is now possible; returns how many versions were dropped"""
+        with self.snapshot_guard:
+            horizon = min(self.snapshots) if self.snapshots else self.txid
+        dropped = 0
+        # The per-table dicts stay: a snapshot scan holds on to them
+        for chains in self.versions.values():
+            for position, chain in list(chains.items()):
+                live = [v for v in chain if v[2] > horizon]
+                dropped += len(chain) - len(live)
+                if live: chains[position] = live
+                else: del chains[position]
+        for begins in self.begins.values():
+            for position in [p for p, txid in begins.items() if txid <= horizon]:
+                del begins[position]
+        for table_name in list(self.begins):
+            if table_name in self.tables:
+                self._maybe_compact(table_name)
+        return dropped
+
+    def savepoint(self, name):
+        if self.undo_log is None: raise ValueError("SAVEPOINT requires an active transaction")
+        self.savepoints[name] = (len(self.undo_log), len(self.journal), self.lsn)
+        return f"Savepoint '{name}' created"
+
+    def release_savepoint(self, name):
+        if name not in self.savepoints or not name: raise ValueError(f"Savepoint '{name}' does not exist")
+        del self.savepoints[name]
+        return f"Savepoint '{name}' released"
+
+    def rollback(self, savepoint=None):
+        """Undo changes back to a savepoint (or the transaction start) in O(changes)"""
+        if self.undo_log is None: raise ValueError("No active transaction")
+        name = savepoint or ''
+        if name not in self.savepoints: raise ValueError(f"Savepoint '{name}' does not exist")
+        undo_mark, journal_mark, lsn = self.savepoints[name]
+        while len(self.undo_log) > undo_mark:
+            self._apply_undo(self.undo_log.pop())
+        del self.journal[journal_mark:]
+        self.lsn = lsn
+        # Savepoints set after the target are discarded; the target itself survives
+        self.savepoints = {n: m for n, m in self.savepoints.items() if m[0] <= undo_mark}
+        if savepoint is None:
+            self.commit()
+
+    def _apply_undo(self, entry):
+        op, table_name = entry[0], entry[1]
+        if op == 'create_table':
+            del self.tables[table_name]
+            del self.indexes[table_name]
+            del self.slots[table_name]
+            self.stores.pop(table_name, None)
+            self.begins.pop(table_name, None)
+            self.versions.pop(table_name, None)
+        elif op in ('drop_table', 'truncate_table'):
+            self.tables[table_name], self.indexes[table_name], self.slots[table_name] = entry[2], entry[3], entry[4]
+            self.tables[table_name]['records'] = entry[5]
+            if entry[6] is not None:
+                self.stores[table_name] = entry[6]
+            for versioning, kept in ((self.begins, entry[7]), (self.versions, entry[8])):
+                if kept is not None: versioning[table_name] = kept
+                else: versioning.pop(table_name, None)
+        elif op == 'alter_table':
+            table = self.tables[table_name]
+            table['columns'].pop()
+            table['column_definitions'].pop()
+            if table_name in self.stores:
+                self.stores[table_name].drop_column(entry[2])
+            else:
+                for record in self._rows(table_name):
+                    record.pop(entry[2], None)
+            self.indexes[table_name].pop(entry[2], None)
+        elif op == 'create_index':
+            column = self.tables[table_name]['indexes'].pop(entry[2])['column']
+            if entry[3] is not None:
+                self.indexes[table_name][column] = entry[3]
+            else:
+                del self.indexes[table_name][column]
+        elif op == 'drop_index':
+            self.tables[table_name].setdefault('indexes', {})[entry[2]] = entry[3]
+            self.indexes[table_name][entry[3]['column']] = entry[4]
+        elif op == 'insert':
+            # Undo runs newest-first and never compacts, so the row is still the last slot
+            record = entry[2]
+            self._unindex_record(table_name, record)
+            del self.slots[table_name][id(record)]
+            records = self.tables[table_name]['records']
+            records.pop()
+            if table_name in self.stores:
+                self.stores[table_name].pop()
+            self._unsupersede(table_name, len(records), 0, versioned=False)
+        elif op == 'replace':
+            old, new, position, begin = entry[2:]
+            self._reindex_record(table_name, new, old)
+            self.tables[table_name]['records'][position] = old
+            del self.slots[table_name][id(new)]
+            self.slots[table_name][id(old)] = position
+            self._unsupersede(table_name, position, begin)
+        elif op == 'update':
+            record, before, position, begin = entry[2:]
+            self._unindex_record(table_name, record)
+            record.clear()
+            record.update(before)
+            self._index_record(table_name, record)
+            self._unsupersede(table_name, position, begin)
+        elif op == 'delete':
+            record, position, begin = entry[2:]
+            self.tables[table_name]['records'][position] = record
+            self.slots[table_name][id(record)] = position
+            self._index_record(table_name, record)
+            self._unsupersede(table_name, position, begin)
+
+    def _rows(self, table_name):
+        """Live records of a table in insertion order, skipping tombstones"""
+        return (r for r in self.tables[table_name]['records'] if r is not None)
+
+    def _scan(self, table_name):
+        """Rows a full scan reads (stopping if the statement is cancelled)"""
+        token = current_token()
+        rows = self._rows(table_name)
+        return rows if token is None else _checked(rows, token)
+
+    def _store(self, table_name):
+        """Column buffers read paths may use for table_name (None: read it row by row)"""
+        return self.stores.get(table_name)
+
+    def _join_index(self, table_name, column):
+        """Index a join may probe for column (None: hash join)"""
+        return self.indexes[table_name].get(column)
+
+    def row_count(self, table_name):
+        return len(self.slots[table_name])
+
+    def estimated_size(self):
+        """Rough bytes held by table rows: a sampled row size times the row count
+        (plus the column buffers of columnar tables); indexes are not counted"""
+        total = 0
+        pending = getattr(self.tables, 'pending', ())  # tables still in a page file hold no rows yet
+        for table_name in self.tables:
+            if table_name in pending: continue
+            sample = list(itertools.islice(self._rows(table_name), 16))
+            if not sample: continue
+            if table_name in self.stores:
+                per_row = sys.getsizeof(sample[0])
+                total += self.stores[table_name].nbytes()
+            else:
+                per_row = sum(sys.getsizeof(r) + sum(map(sys.getsizeof, r.values())) for r in sample) / len(sample)
+            total += int(per_row * self.row_count(table_name))
+        return total
+
+    def _add_row(self, table_name, record):
+        """Append a record dict; returns the stored record (a Row view for columnar tables)"""
+        records = self.tables[table_name]['records']
+        if table_name in self.stores:
+            record = self.stores[table_name].append(record)
+        self._supersede(table_name, len(records), None)
+        self.slots[table_name][id(record)] = len(records)
+        records.append(record)
+        return record
+
+    def _remove_row(self, table_name, record):
+        """Tombstone a record's slot in O(1); returns the slot for undo"""
+        position = self.slots[table_name].pop(id(record))
+        self.tables[table_name]['records'][position] = None
+        return position
+
+    def _build_slots(self, table_name):
+        self.slots[table_name] = {id(r): i for i, r in enumerate(self.tables[table_name]['records'])}
+
+    def _maybe_compact(self, table_name):
+        """Squeeze out tombstones once they make up half the list (never inside a transaction,
+        where undo entries refer to slot positions, nor while a snapshot reads by position)"""
+        records = self.tables[table_name]['records']
+        dead = len(records) - len(self.slots[table_name])
+        if self.undo_log is None and not self.snapshots and dead > 32 and dead * 2 > len(records):
+            records = self.tables[table_name]['records'] = [r for r in records if r is not None]
+            if table_name in self.stores:
+                self.stores[table_name].compact(records)
+            self._build_slots(table_name)
+            # Versions are kept by position; with no snapshot open none of them is needed
+            self.begins.pop(table_name, None)
+            self.versions.pop(table_name, None)
+
+    def _unique_columns(self, table_name):
+        table = self.tables[table_name]
+        pk = table['primary_key']
+        # Older data files store column definitions without a 'constraints' dict
+        return [pk] + [c['name'] for c in table['column_definitions']
+                       if c['name'] != pk and c.get('constraints', {}).get('unique')]
+
+    def _build_index(self, table_name, column, unique=True, using='HASH', order=None):
+        if using == 'BTREE':
+            index = data_structures.SortedIndex(unique)
+            if order is not None:
+                # Row positions already in key order (saved by pagefile): no sort needed
+                records = self.tables[table_name]['records']
+                index.load_sorted([(index_key(records[i].get(column)), records[i]) for i in order])
+                return index
+        else:
+            index = data_structures.UniqueIndex() if unique else data_structures.HashIndex()
+        index.load((index_key(r.get(column)), r) for r in self._rows(table_name))
+        return index
+
+    def _build_indexes(self, table_name, orders=None):
+        """(Re)build the PRIMARY KEY / UNIQUE indexes and every CREATE INDEX secondary index
+        (orders: column -> row positions in key order, for BTREE indexes)"""
+        unique_columns = self._unique_columns(table_name)
+        indexes = {col: self._build_index(table_name, col) for col in unique_columns}
+        for meta in self.tables[table_name].get('indexes', {}).values():
+            col = meta['column']
+            indexes[col] = self._build_index(table_name, col, col in unique_columns, meta.get('using', 'HASH'),
+                                             (orders or {}).get(col))
+        self.indexes[table_name] = indexes
+
+    def _index_record(self, table_name, record):
+        for col, index in self.indexes[table_name].items():
+            index.add(index_key(record.get(col)), record)
+
+    def _unindex_record(self, table_name, record, values=None):
+        """Remove a record from the indexes, keyed by `values` (defaults to its current values)"""
+        values = record if values is None else values
+        for col, index in self.indexes[table_name].items():
+            index.remove(index_key(values.get(col)), record)
+
+    def _reindex_record(self, table_name, old, new):
+        """Move the index entries of record old to its new version new"""
+        for col, index in self.indexes[table_name].items():
+            key, new_key = index_key(old.get(col)), index_key(new.get(col))
+            if key == new_key and key.__class__ is new_key.__class__:
+                index.replace(key, old, new)
+            else:
+                index.remove(key, old)
+                index.add(new_key, new)
+
+    def _find_by_pk(self, table_name, value):
+        return self.indexes[table_name][self.tables[table_name]['primary_key']].get(index_key(value))
         
-    def create_table(self, table_name, columns_data):
+    @_autocommit
+    def create_table(self, table_name, columns_data, storage='row'):
         if table_name in self.tables:
             raise ValueError(f"Table '{table_name}' already exists")
+        if storage not in ('row', 'columnar'):
+            raise ValueError(f"Unknown storage '{storage}'")
         
         column_names = [col['name'] for col in columns_data]
         pk_column = None
@@ -30,24 +584,50 @@ class Database:
             'column_definitions': columns_data, 
             'primary_key': pk_column,
             'records': [],
+            'storage': storage,
             'created_at': datetime.now().isoformat()
         }
+        self.slots[table_name] = {}
+        if storage == 'columnar':
+            self.stores[table_name] = columnar.ColumnStore(columns_data)
         
-        self.indexes[table_name] = data_structures.HashTable()
+        self._build_indexes(table_name)
+        self._log({'op': 'create_table', 'table': table_name, 'columns': copy.deepcopy(columns_data), 'storage': storage})
+        self._undo('create_table', table_name)
         return f"Table '{table_name}' created successfully"
     
+    @_autocommit
     def drop_table(self, table_name):
         if table_name not in self.tables: raise ValueError(f"Table '{table_name}' does not exist")
+        table = self.tables[table_name]
+        self._undo('drop_table', table_name, table, self.indexes[table_name], self.slots[table_name],
+                   table['records'], self.stores.get(table_name),
+                   self.begins.pop(table_name, None), self.versions.pop(table_name, None))
         del self.tables[table_name]
         del self.indexes[table_name]
+        del self.slots[table_name]
+        self.stores.pop(table_name, None)
+        self._log({'op': 'drop_table', 'table': table_name})
         return f"Table '{table_name}' dropped successfully"
 
+    @_autocommit
     def truncate_table(self, table_name):
         if table_name not in self.tables: raise ValueError(f"Table '{table_name}' does not exist")
-        self.tables[table_name]['records'] = []
-        self.indexes[table_name] = data_structures.HashTable()
+        table = self.tables[table_name]
+        # Not versioned: the old lists (and their versions) are swapped out, not emptied, so a
+        # snapshot scan already under way finishes over them
+        self._undo('truncate_table', table_name, table, self.indexes[table_name], self.slots[table_name],
+                   table['records'], self.stores.get(table_name),
+                   self.begins.pop(table_name, None), self.versions.pop(table_name, None))
+        table['records'] = []
+        self.slots[table_name] = {}
+        if table_name in self.stores:
+            self.stores[table_name] = columnar.ColumnStore(table['column_definitions'])
+        self._build_indexes(table_name)
+        self._log({'op': 'truncate_table', 'table': table_name})
         return f"Table '{table_name}' truncated successfully"
     
+    @_autocommit
     def alter_table(self, table_name, column_def):
         if table_name not in self.tables:
             raise ValueError(f"Table '{table_name}' does not exist")
@@ -61,25 +641,74 @@ class Database:
         constraints = column_def['constraints']
         default_val = constraints['default']
 
-        if table['records']:
+        if self.row_count(table_name):
             if constraints['not_null'] and default_val is None:
                 raise ValueError(f"Cannot add NOT NULL column '{new_col_name}' to non-empty table without DEFAULT")
-            if constraints['unique'] and len(table['records']) > 1:
+            if constraints['unique'] and self.row_count(table_name) > 1:
                  raise ValueError(f"Cannot add UNIQUE column '{new_col_name}' to table with multiple records")
 
         table['columns'].append(new_col_name)
         table['column_definitions'].append(column_def)
 
-        for record in table['records']:
-            record[new_col_name] = default_val
+        if table_name in self.stores:
+            self.stores[table_name].add_column(new_col_name, column_def['type'], default_val)
+        else:
+            for record in self._rows(table_name):
+                record[new_col_name] = default_val
+        if constraints['primary_key'] or constraints['unique']:
+            self.indexes[table_name][new_col_name] = self._build_index(table_name, new_col_name)
 
+        self._log({'op': 'alter_table', 'table': table_name, 'column_def': copy.deepcopy(column_def)})
+        self._undo('alter_table', table_name, new_col_name)
         return f"Table '{table_name}' altered. Added column '{new_col_name}'."
     
+    @_autocommit
+    def create_index(self, index_name, table_name, column, using='HASH'):
+        if table_name not in self.tables: raise ValueError(f"Table '{table_name}' does not exist")
+        table = self.tables[table_name]
+        if column not in table['columns']: raise ValueError(f"Unknown column '{column}' in table '{table_name}'")
+        if using not in ('HASH', 'BTREE'): raise ValueError(f"Unknown index type '{using}'")
+        if self._find_index(index_name): raise ValueError(f"Index '{index_name}' already exists")
+
+        # A PK/UNIQUE column already has a hash index; USING BTREE swaps it for an ordered one
+        previous = self.indexes[table_name].get(column)
+        named = any(m['column'] == column for m in table.get('indexes', {}).values())
+        if named or (previous is not None and using == 'HASH'):
+            raise ValueError(f"Column '{column}' is already indexed")
+
+        table.setdefault('indexes', {})[index_name] = {'column': column, 'using': using}
+        self.indexes[table_name][column] = self._build_index(table_name, column, previous is not None, using)
+        self._log({'op': 'create_index', 'table': table_name, 'name': index_name, 'column': column, 'using': using})
+        self._undo('create_index', table_name, index_name, previous)
+        return f"Index '{index_name}' created on {table_name}({column}) using {using}"
+
+    @_autocommit
+    def drop_index(self, index_name, table_name=None):
+        found = self._find_index(index_name)
+        if not found or (table_name and found != table_name):
+            raise ValueError(f"Index '{index_name}' does not exist")
+        meta = self.tables[found]['indexes'].pop(index_name)
+        index = self.indexes[found].pop(meta['column'])
+        if index.unique:
+            self.indexes[found][meta['column']] = self._build_index(found, meta['column'])
+        self._log({'op': 'drop_index', 'table': found, 'name': index_name})
+        self._undo('drop_index', found, index_name, meta, index)
+        return f"Index '{index_name}' dropped"
+
+    def _find_index(self, index_name):
+        """Return the table owning a named index (names are unique per database)"""
+        for t_name, table in self.tables.items():
+            if index_name in table.get('indexes', {}):
+                return t_name
+        return None
+
     def describe_table(self, table_name):
         if table_name not in self.tables: raise ValueError(f"Table '{table_name}' does not exist")
         table = self.tables[table_name]
         
         output = [f"--- Table: {table_name} ---"]
+        if table.get('storage') == 'columnar':
+            output.append("Storage: COLUMNAR")
         output.append(f"{'Column':<15} | {'Type':<10} | {'Constraints'}")
         output.append("-" * 60)
         
@@ -95,14 +724,19 @@ class Database:
             
             cons_str = ", ".join(cons) if cons else ""
             output.append(f"{col['name']:<15} | {col['type']:<10} | {cons_str}")
+
+        for index_name, meta in table.get('indexes', {}).items():
+            output.append(f"INDEX {index_name} ON ({meta['column']}) USING {meta.get('using', 'HASH')}")
             
         return '\n'.join(output)
 
+    @_autocommit
     def insert_record(self, table_name, values, check_foreign_keys_callback=None):
         if table_name not in self.tables: raise ValueError(f"Table '{table_name}' does not exist")
         
         table = self.tables[table_name]
         col_defs = table['column_definitions']
+        indexes = self.indexes[table_name]
         
         if len(values) != len(col_defs):
             raise ValueError(f"Column count mismatch. Expected {len(col_defs)}, got {len(values)}")
@@ -122,11 +756,9 @@ class Database:
             if cons['not_null'] and (val is None or val == ''):
                 raise ValueError(f"Constraint Violation: Column '{name}' cannot be NULL")
 
-            if cons['primary_key'] or cons['unique']:
-                for existing in table['records']:
-                    if str(existing.get(name)) == str(val):
-                        ctype = "Primary Key" if cons['primary_key'] else "Unique"
-                        raise ValueError(f"{ctype} Constraint Violation: Duplicate value '{val}' for column '{name}'")
+            if name in indexes and indexes[name].unique and indexes[name].get(index_key(val)) is not None:
+                ctype = "Primary Key" if cons['primary_key'] else "Unique"
+                raise ValueError(f"{ctype} Constraint Violation: Duplicate value '{val}' for column '{name}'")
 
             if cons['check']:
                 try:
@@ -145,111 +777,503 @@ class Database:
         record['_created_at'] = datetime.now().isoformat()
         record['_updated_at'] = datetime.now().isoformat()
         
-        pk_val = record[table['primary_key']]
-        table['records'].append(record)
-        self.indexes[table_name].insert(pk_val, record)
+        record = self._add_row(table_name, record)
+        self._index_record(table_name, record)
+        self._log({'op': 'insert', 'table': table_name, 'record': dict(record)})
+        self._undo('insert', table_name, record)
         
         return "Record inserted successfully"
     
-    def select_records(self, table_name, where_clause=None, order_by=None, limit=None):
+    def select_records(self, table_name, where_clause=None, order_by=None, limit=None, columns=None, offset=0,
+                       after=None):
+        return list(self.iter_records(table_name, where_clause, order_by, limit, columns, offset, after))
+
+    def iter_records(self, table_name, where_clause=None, order_by=None, limit=None, columns=None, offset=0,
+                     after=None):
+        """Matching rows as an iterator: a pull-based scan -> filter -> sort -> limit -> project
+        pipeline. Each stage is a generator over the one before, so rows are only read as the
+        caller asks for them and, unless a sort has to see every row, LIMIT stops the scan early.
+        columns: list of names to return ('*': the declared columns), None for the stored rows.
+        offset: matching rows skipped before the first one returned (LIMIT ... OFFSET).
+        after: a row (of a previous page) for keyset paging: only rows sorting after it in
+        order_by order, which is made total by ordering ties by primary key."""
         if table_name not in self.tables: raise ValueError(f"Table '{table_name}' does not exist")
-        records = self.tables[table_name]['records']
-        if where_clause:
-            records = [r for r in records if self._evaluate_where(r, where_clause)]
-        if order_by:
-            col, direction = order_by
-            records = sorted(records, key=lambda x: str(x.get(col, '')), reverse=(direction == 'DESC'))
-        if limit:
-            records = records[:limit]
+        if columns is not None:
+            columns = self._projection(table_name, columns)
+        terms = order_terms(order_by)
+        if after is not None:
+            if not terms: raise ValueError("Keyset paging needs an ORDER BY")
+            pk = self.tables[table_name]['primary_key']
+            if pk not in [col for col, _ in terms]:
+                terms = terms + [(pk, terms[-1][1])]
+        candidates, remaining, ordered = self._access_path(table_name, where_clause, terms[0] if len(terms) == 1 else None)
+        records = filter(predicates.compile_where(remaining), candidates) if remaining else iter(candidates)
+        if after is not None:
+            key, reverse = _row_order([self._sort_key(table_name, col, direction) for col, direction in terms])
+            bound = key(after)
+            # Each row's key is computed once, for the bound check and the sort
+            keyed = ((key(r), r) for r in records)
+            keyed = (kr for kr in keyed if (kr[0] < bound if reverse else kr[0] > bound))
+            if not ordered:
+                keyed = _keyset_sorted(keyed, reverse, limit and offset + limit)
+                ordered = True
+            records = (r for _, r in keyed)
+        if terms and not ordered:
+            # With LIMIT this keeps a top-K heap instead of sorting every match
+            records = _ordered(records, [self._sort_key(table_name, col, direction) for col, direction in terms],
+                               limit and offset + limit)
+        if limit or offset:
+            # Rows streamed in index order stop being pulled once the limit is reached
+            records = itertools.islice(records, offset, limit and offset + limit)
+        if columns is not None:
+            # Only the requested columns are read (a columnar row touches just those buffers)
+            records = ({col: r.get(col) for col in columns} for r in records)
         return records
 
+    def _projection(self, table_name, columns):
+        """Validated column list of a SELECT; '*' is every declared column (no _created_at/_updated_at)"""
+        declared = self.tables[table_name]['columns']
+        if columns == '*':
+            return declared
+        for col in columns:
+            if col not in declared and col not in columnar.TIMESTAMP_COLUMNS:
+                raise ValueError(f"Unknown column '{col}'")
+        return columns
+
+    def join_records(self, table_name, alias, joins, columns=None, where_clause=None, order_by=None, limit=None, plan=None,
+                     offset=0):
+        """SELECT over `table_name alias` joined with each of joins in turn; a join is
+        {'type': 'INNER'|'LEFT', 'table', 'alias', 'on': (column, column)} with an equality ON.
+        Rows are keyed 'alias.column' for SELECT * (declared columns only), else by the
+        columns as written.
+        Each step appends a description of the strategy it chose to plan (a list) if given."""
+        sources = [(alias, table_name)] + [(j['alias'], j['table']) for j in joins]
+        schema = {}
+        for a, t in sources:
+            if t not in self.tables: raise ValueError(f"Table '{t}' does not exist")
+            if a in schema: raise ValueError(f"Table or alias '{a}' is used twice")
+            schema[a] = self.tables[t]['columns'] + ['_created_at', '_updated_at']
+        resolve = lambda ref: _resolve_column(ref, schema)
+        # WHERE conjuncts on a single table that is never NULL-extended filter its scan
+        nullable = {j['alias'] for j in joins if j['type'] == 'LEFT'}
+        pushed = {a: [] for a in schema}
+        residual = []
+        for condition in where_clause or []:
+            qualified = _rename_where([condition], lambda ref: '.'.join(resolve(ref)))[0]
+            used = {col.split('.', 1)[0] for col in _where_columns([qualified])}
+            if len(used) == 1 and not used & nullable:
+                pushed[used.pop()].append(_rename_where([condition], lambda ref: resolve(ref)[1])[0])
+            else:
+                residual.append(qualified)
+        if plan is None: plan = []
+
+        rows = [(r,) for r in self._matching_records(table_name, pushed[alias])]
+        plan.append({'step': 1, 'operation': 'SCAN', 'table': f"{table_name} {alias}",
+                     'detail': f"{self._describe_access(table_name, pushed[alias])}, {len(rows)} rows"})
+        for step, join in enumerate(joins, 1):
+            check_cancelled()
+            a = join['alias']
+            (left_alias, left_col), (right_alias, right_col) = map(resolve, join['on'])
+            if left_alias == a:
+                (left_alias, left_col), (right_alias, right_col) = (right_alias, right_col), (left_alias, left_col)
+            if right_alias != a or [s[0] for s in sources].index(left_alias) >= step:
+                raise ValueError(f"JOIN {join['table']} ON must compare a column of '{a}' with an earlier table")
+            rows, detail = self._join(rows, [s[0] for s in sources].index(left_alias), left_col,
+                                      join['table'], right_col, pushed[a], join['type'] == 'LEFT')
+            plan.append({'step': step + 1, 'operation': f"{join['type']} JOIN", 'table': f"{join['table']} {a}",
+                         'detail': f"{detail} for {left_alias}.{left_col} = {a}.{right_col}, {len(rows)} rows"})
+
+        # Only the columns the output, the remaining WHERE and ORDER BY use are copied out
+        if columns is None:
+            output = [(f"{a}.{col}",) * 2 for a, t in sources for col in self.tables[t]['columns']]
+        else:
+            output = [(c, '.'.join(resolve(c))) for c in columns]
+        terms = [('.'.join(resolve(col)), direction) for col, direction in order_terms(order_by)]
+        needed = set(q for _, q in output) | _where_columns(residual) | {q for q, _ in terms}
+        layout = [(pos, a, col) for pos, a in enumerate(schema) for col in schema[a] if f"{a}.{col}" in needed]
+        records = [{f"{a}.{col}": (row[pos].get(col) if row[pos] is not None else None) for pos, a, col in layout}
+                   for row in rows]
+        if residual:
+            records = list(filter(predicates.compile_where(residual), records))
+        if terms:
+            keys = []
+            for q, direction in terms:
+                a, name = q.split('.', 1)
+                value_key = self._value_key(dict(sources)[a], name)
+                keys.append((lambda x, k=value_key, q=q: k(x.get(q, '')), direction == 'DESC'))
+            records = order_rows(records, keys, limit and offset + limit)
+        if limit or offset:
+            records = records[offset:limit and offset + limit]
+        return [{name: r[q] for name, q in output} for r in records]
+
+    def _join(self, rows, pos, left_col, table_name, right_col, filters, outer):
+        """Extend each row (tuple of records) with the matching records of table_name;
+        returns (rows, strategy). NULL never matches; keys compare like WHERE equality."""
+        keys = [None if row[pos] is None else _join_key(row[pos].get(left_col)) for row in rows]
+        index = self._join_index(table_name, right_col)
+        if index is not None and len(rows) <= self.row_count(table_name):
+            # Fewer probes than rows on the right: look each key up in the index
+            predicate = predicates.compile_where(filters) if filters else None
+            matches = [() if k is None else [r for r in index.find(k) if predicate is None or predicate(r)]
+                       for k in keys]
+            strategy = f"index nested loop using the index on {table_name}.{right_col}"
+        else:
+            right = self._matching_records(table_name, filters)
+            if len(right) <= len(rows):
+                built = {}
+                for r in right:
+                    k = _join_key(r.get(right_col))
+                    if k is not None: built.setdefault(k, []).append(r)
+                matches = [() if k is None else built.get(k, ()) for k in keys]
+                strategy = f"hash join building on {table_name} ({len(right)} rows)"
+            else:
+                # Fewer rows on the left: hash those and stream the right side past them
+                built = {}
+                for i, k in enumerate(keys):
+                    if k is not None: built.setdefault(k, []).append(i)
+                matches = [[] for _ in rows]
+                for r in right:
+                    for i in built.get(_join_key(r.get(right_col)), ()):
+                        matches[i].append(r)
+                strategy = f"hash join building on the left input ({len(rows)} rows)"
+        joined = []
+        for row, found in zip(rows, matches):
+            if found:
+                joined.extend([row + (r,) for r in found])
+            elif outer:
+                joined.append(row + (None,))
+        return joined, strategy
+
+    def _describe_access(self, table_name, where_clause, order_by=None):
+        """How _access_path reads table_name for where_clause, for EXPLAIN"""
+        where_clause = where_clause or []
+        _, remaining, ordered = self._access_path(table_name, where_clause, order_by)
+        used = [c for c in where_clause if c not in remaining]
+        if used:
+            col, op, val = used[0]
+            if op == '=': access = f"index lookup on {col}"
+            elif op == 'IN': access = f"index probe on {col} ({len(val)} values)"
+            else: access = f"BTREE range on {col}"
+        elif ordered: access = f"BTREE scan in {order_by[0]} order"
+        elif self._store(table_name) is not None and where_clause: access = "columnar scan"
+        else: access = "full scan"
+        return access + (f", filter {len(remaining)} condition(s)" if remaining else "")
+
+    def explain(self, query):
+        """Plan of a parsed SELECT/aggregate: one dict per step (JOINs run to pick their strategy)"""
+        table_name = query['table']
+        if query.get('joins'):
+            plan = []
+            self.join_records(table_name, query['alias'], query['joins'], query['columns'], query['where'],
+                              query['order_by'], query['limit'], plan, query.get('offset', 0))
+            return plan
+        if table_name not in self.tables: raise ValueError(f"Table '{table_name}' does not exist")
+        terms = order_terms(query['order_by'])
+        offset = query.get('offset', 0)
+        order_by = terms[0] if query['type'] == 'SELECT' and len(terms) == 1 else None
+        plan = [{'step': 1, 'operation': 'SCAN', 'table': table_name,
+                 'detail': self._describe_access(table_name, query['where'], order_by)}]
+        if query['type'] == 'AGGREGATE':
+            how = 'vectorized' if self._store(table_name) is not None and vectorized.np is not None else 'single pass'
+            groups = f" by {', '.join(query['group_by'])}" if query['group_by'] else ""
+            plan.append({'step': 2, 'operation': 'AGGREGATE', 'table': table_name, 'detail': how + groups})
+        if terms and (query['type'] == 'AGGREGATE' or not self._access_path(table_name, query['where'], order_by)[2]):
+            detail = ', '.join(f"{col if col.__class__ is str else aggregate_label(*col)} {direction}"
+                               for col, direction in terms)
+            if query['limit']:
+                plan.append({'step': len(plan) + 1, 'operation': 'TOP-K', 'table': table_name,
+                             'detail': f"{query['limit'] + offset} rows by {detail} (heap)"})
+                if not offset: return plan
+            else:
+                plan.append({'step': len(plan) + 1, 'operation': 'SORT', 'table': table_name, 'detail': detail})
+        if query['limit'] or offset:
+            detail = f"{query['limit']} OFFSET {offset}" if offset else str(query['limit'])
+            plan.append({'step': len(plan) + 1, 'operation': 'LIMIT', 'table': table_name, 'detail': detail})
+        return plan
+
     def execute_aggregate(self, table_name, function, column, where_clause=None, group_by=None):
         """Execute aggregate functions: COUNT, SUM, AVG, MIN, MAX with optional GROUP BY"""
+        return self.aggregate(table_name, [(function, column)], where_clause, [group_by] if group_by else None)
+
+    def aggregate(self, table_name, aggregates, where_clause=None, group_by=None, having=None, order_by=None, limit=None,
+                  offset=0):
+        """Several aggregates [(function, column or None)] per group of the group_by columns.
+        Each result row holds the group columns, then one "FUNC(col)" entry per aggregate.
+        having is a condition list over group columns and (function, column) pairs,
+        order_by is a list of (column or (function, column), 'ASC'|'DESC')."""
         if table_name not in self.tables: raise ValueError(f"Table '{table_name}' does not exist")
-        
-        records = self.tables[table_name]['records']
-        if where_clause:
-            records = [r for r in records if self._evaluate_where(r, where_clause)]
-
-        # --- Grouping Logic ---
-        groups = {}
-        if group_by:
-            if group_by not in self.tables[table_name]['columns']:
-                raise ValueError(f"Unknown column '{group_by}' in GROUP BY")
-            
-            for r in records:
-                key = r.get(group_by)
-                if key not in groups: groups[key] = []
-                groups[key].append(r)
+        group_by = list(group_by or [])
+        for col in group_by:
+            if col not in self.tables[table_name]['columns']:
+                raise ValueError(f"Unknown column '{col}' in GROUP BY")
+        # Aggregates only used by HAVING/ORDER BY are computed too but not returned
+        terms = order_terms(order_by)
+        specs = list(dict.fromkeys(list(aggregates) + _aggregate_refs(having or []) +
+                                   [col for col, _ in terms if col.__class__ is tuple]))
+        for function, column in specs:
+            if function != 'COUNT' and column is None: raise ValueError(f"{function} requires a column name")
+
+        store = self._store(table_name)
+        if store is not None and vectorized.np is not None:
+            positions = self._vector_positions(table_name, where_clause)
+            groups = vectorized.aggregate(store, specs, group_by, positions, check_cancelled)
         else:
-            groups['ALL'] = records
+            groups = self._stream_aggregate(table_name, specs, where_clause, group_by)
 
-        # --- Aggregation Logic ---
-        results = []
-        for key, group_records in groups.items():
-            val = 0
-            
-            if function == 'COUNT':
-                val = len(group_records)
-            
-            elif function in ('SUM', 'AVG', 'MIN', 'MAX'):
-                if column is None: raise ValueError(f"{function} requires a column name")
-                
-                # Extract numeric values
-                values = []
-                for r in group_records:
-                    v = r.get(column)
-                    try:
-                        values.append(float(v))
-                    except (ValueError, TypeError):
-                        continue # Skip non-numeric for math ops
-                
-                if not values:
-                    val = 0 if function == 'SUM' else None
-                else:
-                    if function == 'SUM': val = sum(values)
-                    elif function == 'AVG': val = sum(values) / len(values)
-                    elif function == 'MIN': val = min(values)
-                    elif function == 'MAX': val = max(values)
-            
-            # Format result
-            row = {}
-            if group_by:
-                row[group_by] = key
-            
-            # Create a nice label like "SUM(salary)"
-            col_label = f"{function}({column if column else '*'})"
-            row[col_label] = val
-            results.append(row)
+        rows = []
+        for key, values in groups:
+            row = dict(zip(group_by, key))
+            row.update(zip(specs, values))
+            rows.append(row)
+        if having:
+            rows = list(filter(predicates.compile_where(having), rows))
+        if terms:
+            rows = order_rows(rows, [(lambda x, col=col: sort_key(x.get(col, '')), direction == 'DESC')
+                                     for col, direction in terms], limit and offset + limit)
+        if limit or offset:
+            rows = rows[offset:limit and offset + limit]
+        return [dict({col: row[col] for col in group_by}, **{aggregate_label(*spec): row[spec] for spec in aggregates})
+                for row in rows]
+
+    def _stream_aggregate(self, table_name, specs, where_clause, group_by):
+        """[(group key tuple, [value per spec])] in one pass, keeping running totals per group"""
+        numeric = list(dict.fromkeys(column for function, column in specs if function != 'COUNT'))
+        records = self._matching_records(table_name, where_clause)
+        groups = {} if group_by else {(): accumulators.new_state(len(numeric))}
+        store = self._store(table_name)
+        if store is not None and not group_by:
+            # One group over a columnar table: read each column buffer once
+            whole = len(records) == len(self.tables[table_name]['records'])
+            positions = None if whole else [r.pos for r in records]
+            state = groups[()]
+            state[0] = len(records)
+            for j, column in enumerate(numeric):
+                check_cancelled()
+                values = store.numbers(column, positions)
+                if values:
+                    b = accumulators.block(j)
+                    state[b:b + 4] = len(values), sum(values), min(values), max(values)
+        else:
+            accumulate = accumulators.compile_accumulator(len(group_by), len(numeric))
+            accumulate(_watched(records), groups, group_by, numeric)
 
+        slot = {column: accumulators.block(j) for j, column in enumerate(numeric)}
+        results = []
+        for key, state in groups.items():
+            values = []
+            for function, column in specs:
+                if function == 'COUNT':
+                    values.append(state[0])
+                    continue
+                b = slot[column]
+                seen, total, low, high = state[b:b + 4]
+                if not seen: values.append(0 if function == 'SUM' else None)
+                elif function == 'SUM': values.append(float(total))
+                elif function == 'AVG': values.append(total / seen)
+                else: values.append(float(low if function == 'MIN' else high))
+            results.append(((key,) if len(group_by) == 1 else key, values))
         return results
-    
+
+    def _vector_positions(self, table_name, where_clause):
+        """Positions (ndarray) of the live rows of a columnar table matching where_clause; None for all rows"""
+        np = vectorized.np
+        records = self.tables[table_name]['records']
+        mask, remaining = vectorized.where_mask(self._store(table_name), where_clause or [])
+        if self.row_count(table_name) != len(records):
+            live = np.fromiter((r is not None for r in records), bool, len(records))
+            mask = live if mask is None else mask & live
+        if mask is None and not remaining:
+            return None  # every row
+        positions = np.arange(len(records)) if mask is None else np.flatnonzero(mask)
+        if remaining:
+            predicate = predicates.compile_where(remaining)
+            positions = np.array([i for i in _watched(positions.tolist()) if predicate(records[i])], dtype=np.intp)
+        return positions
+
+    @_autocommit
     def update_records(self, table_name, set_clause, where_clause):
         if table_name not in self.tables: raise ValueError(f"Table '{table_name}' does not exist")
-        records = self.tables[table_name]['records']
-        updated_count = 0
-        for record in records:
-            if self._evaluate_where(record, where_clause):
+        table = self.tables[table_name]
+        pk = table['primary_key']
+        indexes = self.indexes[table_name]
+        matches = self._matching_records(table_name, where_clause)
+
+        # Every matched row receives the same values, so a UNIQUE/PK column may only be
+        # set on a single row, and only to a value no other row holds
+        for col, val in set_clause.items():
+            if col in indexes and indexes[col].unique and matches:
+                existing = indexes[col].get(index_key(val))
+                if len(matches) > 1 or (existing is not None and existing is not matches[0]):
+                    ctype = "Primary Key" if col == pk else "Unique"
+                    raise ValueError(f"{ctype} Constraint Violation: Duplicate value '{val}' for column '{col}'")
+        reindex = any(col in indexes for col in set_clause)
+        records, slots = table['records'], self.slots[table_name]
+        columnar_table = table_name in self.stores
+
+        for record in matches:
+            position = slots[id(record)]
+            if columnar_table:
+                # Column buffers are updated in place; snapshots get a copy of the old values
+                before = dict(record)
+                begin = self._supersede(table_name, position, before)
+                self._undo('update', table_name, record, before, position, begin)
                 for col, val in set_clause.items():
                     record[col] = val
                 record['_updated_at'] = datetime.now().isoformat()
-                updated_count += 1
-        return f"{updated_count} record(s) updated"
+                if reindex:
+                    self._unindex_record(table_name, record, before)
+                    self._index_record(table_name, record)
+            else:
+                # Copy on write: the old dict stays as it is for snapshots still reading it
+                before = record
+                record = dict(before)
+                record.update(set_clause)
+                record['_updated_at'] = datetime.now().isoformat()
+                begin = self._supersede(table_name, position, before)
+                self._undo('replace', table_name, before, record, position, begin)
+                records[position] = record
+                del slots[id(before)]
+                slots[id(record)] = position
+                self._reindex_record(table_name, before, record)
+            changes = dict(set_clause)
+            changes['_updated_at'] = record['_updated_at']
+            self._log({'op': 'update', 'table': table_name, 'pk': before[pk], 'set': changes})
+        return f"{len(matches)} record(s) updated"
     
+    @_autocommit
     def delete_records(self, table_name, where_clause):
         if table_name not in self.tables: raise ValueError(f"Table '{table_name}' does not exist")
-        records = self.tables[table_name]['records']
-        initial_len = len(records)
-        remaining = [r for r in records if not self._evaluate_where(r, where_clause)]
-        self.tables[table_name]['records'] = remaining
-        self.indexes[table_name] = data_structures.HashTable()
-        for r in remaining:
-            pk = r[self.tables[table_name]['primary_key']]
-            self.indexes[table_name].insert(pk, r)
-        return f"{initial_len - len(remaining)} record(s) deleted"
+        pk = self.tables[table_name]['primary_key']
+        matches = self._matching_records(table_name, where_clause)
+        for r in matches:
+            self._unindex_record(table_name, r)
+            position = self._remove_row(table_name, r)
+            begin = self._supersede(table_name, position, r)
+            self._log({'op': 'delete', 'table': table_name, 'pk': r[pk]})
+            self._undo('delete', table_name, r, position, begin)
+        self._maybe_compact(table_name)
+        return f"{len(matches)} record(s) deleted"
     
+    def _value_key(self, table_name, column):
+        """Sort key function for values of a column, picked from its declared type"""
+        for col_def in self.tables[table_name]['column_definitions']:
+            if col_def['name'] == column:
+                base = (col_def.get('type') or '').split('(')[0].strip().upper()
+                if base in columnar.INT_TYPES or base in columnar.FLOAT_TYPES:
+                    return numeric_sort_key
+        return sort_key
+
+    def _sort_key(self, table_name, column, direction):
+        """(record -> sort key, descending) for one ORDER BY term"""
+        value_key = self._value_key(table_name, column)
+        return (lambda x: value_key(x.get(column, ''))), direction == 'DESC'
+
+    def _access_path(self, table_name, where_clause, order_by=None):
+        """Choose how to fetch candidate rows, cheapest first:
+          1. `col = value` on an indexed column (unique indexes preferred), then `col IN (...)`
+          2. range conjuncts (>, >=, <, <=) with numeric bounds on a BTREE column
+          3. a BTREE index on the ORDER BY column, read in order
+          4. full scan (column buffer at a time for columnar tables)
+        Returns (candidate rows, conjuncts still to be checked, whether rows follow order_by)."""
+        indexes = self.indexes[table_name]
+        where_clause = where_clause or []
+        best = None
+        probe = None
+        ranges = {}
+        for i, (col, op, val) in enumerate(where_clause):
+            if op == '=' and col in indexes:
+                if indexes[col].unique:
+                    best = i
+                    break
+                if best is None:
+                    best = i
+            elif op == 'IN' and col in indexes and probe is None:
+                probe = i
+            elif op in ('>', '>=', '<', '<=') and isinstance(indexes.get(col), data_structures.SortedIndex) \
+                    and isinstance(index_key(val), float):
+                ranges.setdefault(col, []).append(i)
+        if best is not None:
+            col, _, val = where_clause[best]
+            return indexes[col].find(index_key(val)), where_clause[:best] + where_clause[best + 1:], False
+        if probe is not None:
+            col, _, values = where_clause[probe]
+            rows = {}
+            for key in dict.fromkeys(map(index_key, values)):
+                for record in indexes[col].find(key):
+                    rows[id(record)] = record
+            return list(rows.values()), where_clause[:probe] + where_clause[probe + 1:], False
+
+        order_col, reverse = (order_by[0], order_by[1] == 'DESC') if order_by else (None, False)
+        if ranges:
+            col = order_col if order_col in ranges else max(ranges, key=lambda c: len(ranges[c]))
+            used = ranges[col]
+            conditions = [where_clause[i] for i in used]
+            remaining = [c for i, c in enumerate(where_clause) if i not in used]
+            return self._range_scan(table_name, col, conditions, reverse), remaining, col == order_col
+        if isinstance(indexes.get(order_col), data_structures.SortedIndex):
+            return _watched(indexes[order_col].range(reverse=reverse)), where_clause, True
+        if self._store(table_name) is not None and where_clause:
+            return self._columnar_scan(table_name, where_clause) + (False,)
+        return self._scan(table_name), where_clause, False
+
+    def _columnar_scan(self, table_name, where_clause):
+        """Evaluate conjuncts over column buffers, narrowing a position list; conjuncts a
+        column cannot decide are returned for the row predicate"""
+        store = self._store(table_name)
+        records = self.tables[table_name]['records']
+        if vectorized.np is not None:
+            mask, remaining = vectorized.where_mask(store, where_clause)
+            if mask is None:
+                return self._scan(table_name), remaining
+            positions = vectorized.np.flatnonzero(mask).tolist()
+            return _watched(r for r in map(records.__getitem__, positions) if r is not None), remaining
+        positions, remaining = None, []
+        for condition in where_clause:
+            selected = store.select(condition, positions)
+            if selected is None:
+                remaining.append(condition)
+            else:
+                positions = selected
+        if positions is None:
+            return self._scan(table_name), remaining
+        return _watched(r for r in map(records.__getitem__, positions) if r is not None), remaining
+
+    def _range_scan(self, table_name, column, conditions, reverse=False):
+        """Rows of a BTREE column satisfying every numeric range condition, in key order"""
+        low, high, low_inclusive, high_inclusive = float('-inf'), float('inf'), True, True
+        for _, op, val in conditions:
+            bound = index_key(val)
+            if op in ('>', '>='):
+                if bound > low: low, low_inclusive = bound, op == '>='
+                elif bound == low and op == '>': low_inclusive = False
+            else:
+                if bound < high: high, high_inclusive = bound, op == '<='
+                elif bound == high and op == '<': high_inclusive = False
+        index = self.indexes[table_name][column]
+        numeric = index.range(low, high, low_inclusive, high_inclusive, reverse)
+        # Text values are compared against a numeric bound as strings, so check those row by row
+        text = filter(predicates.compile_where(conditions), index.range('', None, reverse=reverse))
+        return _watched(itertools.chain(text, numeric) if reverse else itertools.chain(numeric, text))
+
+    def has_value(self, table_name, column, value):
+        """True if any row holds `value` in `column` (used for FOREIGN KEY checks)"""
+        candidates, remaining, _ = self._access_path(table_name, [(column, '=', value)])
+        return any(map(predicates.compile_where(remaining), candidates))
+
+    def _matching_records(self, table_name, where_clause):
+        candidates, remaining, _ = self._access_path(table_name, where_clause)
+        if not remaining: return list(candidates)
+        return list(filter(predicates.compile_where(remaining), candidates))
+
     def _evaluate_where(self, record, where_clause):
+        """Reference row-at-a-time evaluator; queries use predicates.compile_where"""
         for col, op, val in where_clause:
+            if op == 'OR':
+                if not any(self._evaluate_where(record, branch) for branch in val): return False
+                continue
+            if op == 'IN':
+                if not any(self._evaluate_where(record, [(col, '=', v)]) for v in val): return False
+                continue
             r_val = record.get(col)
             try:
                 v1, v2 = float(r_val), float(val)
@@ -263,17 +1287,168 @@ class Database:
             if op == '<=' and not (v1 <= v2): return False
         return True
 
+    def replay(self, entries):
+        """Re-apply WAL records newer than this snapshot's LSN"""
+        journal, self.journal = self.journal, None
+        try:
+            for entry in entries:
+                if entry['lsn'] <= self.lsn: continue
+                self._apply_log_entry(entry)
+                self.lsn = entry['lsn']
+        finally:
+            self.journal = journal
+
+    def _apply_log_entry(self, entry):
+        op, table_name = entry['op'], entry['table']
+        if op == 'create_table':
+            self.create_table(table_name, entry['columns'], entry.get('storage', 'row'))
+        elif op == 'drop_table':
+            self.drop_table(table_name)
+        elif op == 'truncate_table':
+            self.truncate_table(table_name)
+        elif op == 'alter_table':
+            self.alter_table(table_name, entry['column_def'])
+        elif op == 'create_index':
+            self.create_index(entry['name'], table_name, entry['column'], entry.get('using', 'HASH'))
+        elif op == 'drop_index':
+            self.drop_index(entry['name'], table_name)
+        elif op == 'insert':
+            record = self._add_row(table_name, entry['record'])
+            self._index_record(table_name, record)
+        elif op == 'update':
+            record = self._find_by_pk(table_name, entry['pk'])
+            if record is None: return
+            before = dict(record)
+            record.update(entry['set'])
+            self._unindex_record(table_name, record, before)
+            self._index_record(table_name, record)
+        elif op == 'delete':
+            record = self._find_by_pk(table_name, entry['pk'])
+            if record is None: return
+            self._remove_row(table_name, record)
+            self._unindex_record(table_name, record)
+            self._maybe_compact(table_name)
+
     def to_dict(self):
-        return {'name': self.name, 'owner': self.owner, 'tables': self.tables, 'created_at': self.created_at}
+        tables = {name: dict(table, records=list(map(dict, self._rows(name))) if name in self.stores else list(self._rows(name)))
+                  for name, table in self.tables.items()}
+        return {'name': self.name, 'owner': self.owner, 'tables': tables, 'created_at': self.created_at, 'lsn': self.lsn}
 
     @staticmethod
     def from_dict(data):
         db = Database(data['name'], data['owner'])
         db.tables = data.get('tables', {})
         db.created_at = data.get('created_at', datetime.now().isoformat())
+        db.lsn = data.get('lsn', 0)
         for t_name, t_data in db.tables.items():
-            db.indexes[t_name] = data_structures.HashTable()
-            pk = t_data.get('primary_key', t_data['columns'][0])
-            for r in t_data['records']:
-                db.indexes[t_name].insert(r[pk], r)
-        return db
\ No newline at end of file
+            t_data.setdefault('primary_key', t_data['columns'][0])
+            if t_data.get('storage') == 'columnar':
+                store = db.stores[t_name] = columnar.ColumnStore(t_data['column_definitions'])
+                t_data['records'] = [store.append(r) for r in t_data['records']]
+            db._build_slots(t_name)
+            db._build_indexes(t_name)
+        return db
+
+class Snapshot(Database):
+    """Read-only view of a Database as of one committed transaction id (MVCC)
+
+    Rows written later, committed or not, read as the version the snapshot's
+    transaction saw. Candidates are collected from the live indexes under `lock`
+    and full scans copy SNAPSHOT_CHUNK rows per hold of it, so a long SELECT over
+    a row table never keeps writers waiting. Column buffers are updated in place:
+    whoever reads a columnar table keeps the shared lock for the whole statement.
+    DDL is not versioned.
+    """
+    def __init__(self, db, txid, lock=None):
+        self.db = db
+        self.txid = txid
+        self.lock = lock
+        self.name, self.owner = db.name, db.owner
+        self.tables, self.indexes, self.slots, self.stores = db.tables, db.indexes, db.slots, db.stores
+        self.closed = False
+
+    def close(self):
+        """Stop reading (versions the snapshot kept alive become reclaimable)"""
+        if self.closed: return
+        self.closed = True
+        with self.db.snapshot_guard:
+            count = self.db.snapshots[self.txid] - 1
+            if count: self.db.snapshots[self.txid] = count
+            else: del self.db.snapshots[self.txid]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _shared(self):
+        return self.lock.read() if self.lock is not None else nullcontext()
+
+    def _scan(self, table_name):
+        return _VersionScan(self, table_name)
+
+    def _store(self, table_name):
+        # The buffers only hold the newest values: usable while no row changed after the snapshot
+        if self.db.last_write.get(table_name, 0) > self.txid: return None
+        return self.stores.get(table_name)
+
+    def _join_index(self, table_name, column):
+        return None  # an index finds the newest versions only; join the snapshot's rows by hashing
+
+    def _access_path(self, table_name, where_clause, order_by=None):
+        db, txid = self.db, self.txid
+        with self._shared():
+            candidates, remaining, ordered = Database._access_path(self, table_name, where_clause, order_by)
+            if isinstance(candidates, _VersionScan):
+                return candidates, remaining, ordered
+            candidates = list(candidates)
+            begins = db.begins.get(table_name)
+            if not begins or db.last_write.get(table_name, 0) <= txid:
+                return candidates, remaining, ordered
+            changed = {p for p, begin in begins.items() if begin > txid}
+            if not changed:
+                return candidates, remaining, ordered
+            # Swap rows changed since the snapshot for the versions it saw, which the
+            # index may file under other keys: every condition is checked again
+            slots, versions = db.slots[table_name], db.versions.get(table_name, {})
+            rows = [(p, r) for p, r in ((slots[id(r)], r) for r in candidates) if p not in changed]
+            for p in changed:
+                version = _visible(None, p, begins, versions, txid)
+                if version is not None:
+                    rows.append((p, version))
+        rows.sort(key=lambda row: row[0])  # insertion order, as a scan returns them
+        return [r for _, r in rows], where_clause or [], False
+
+
+class _VersionScan:
+    """Full scan of one table as a snapshot sees it, in insertion order"""
+    def __init__(self, snapshot, table_name):
+        self.snapshot = snapshot
+        self.table_name = table_name
+        self.token = current_token()
+
+    def __iter__(self):
+        snapshot, table_name, txid = self.snapshot, self.table_name, self.snapshot.txid
+        db = snapshot.db
+        with snapshot._shared():
+            # TRUNCATE / DROP swap in new lists rather than emptying these, and compaction
+            # waits for snapshots to close, so positions stay put while the scan runs
+            records = db.tables[table_name]['records']
+            begins = db.begins.setdefault(table_name, {})
+            versions = db.versions.setdefault(table_name, {})
+        start = 0
+        while True:
+            if self.token is not None: self.token.check()
+            with snapshot._shared():
+                chunk = records[start:start + SNAPSHOT_CHUNK]
+                end = start + len(chunk)
+                if begins:
+                    changed = range(start, end) if len(begins) > len(chunk) else \
+                        [p for p in begins if start <= p < end]
+                    for p in changed:
+                        if begins.get(p, 0) > txid:
+                            chunk[p - start] = _visible(None, p, begins, versions, txid)
+            if not chunk: return
+            start = end
+            yield from (r for r in chunk if r is not None)
@@ -1,214 +1,421 @@
 import json
 import hashlib
 import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
 import csv
+import columnar
 import database
+import locks
+import pagefile
 import query_parser
+import statement_cache
+import wal
 
-class DatabaseManager:
-    """Manages databases, users, and transactions"""
-    def __init__(self, data_dir='structdb_data'):
-        self.data_dir = data_dir
-        self.users_file = os.path.join(data_dir, 'users.json')
-        self.databases = {}
-        self.users = {}
+# Statements that only read the current database: they share its lock
+READ_ONLY = ('SELECT', 'EXPLAIN', 'AGGREGATE', 'DESCRIBE_TABLE', 'SHOW_TABLES')
+# ... and of those, the ones that read a snapshot of committed data (database.Snapshot)
+SNAPSHOT_READS = ('SELECT', 'AGGREGATE')
+
+
+class PreparedStatement:
+    """A statement parsed once with `?` placeholders; execute() binds values and runs it"""
+    def __init__(self, session, query):
+        self.session = session
+        self.query = query
+        self.normalized = query_parser.QueryParser.normalize(query)
+        self.param_count = session.parse_query(query, self.normalized).get('param_count', 0)
+
+    def execute(self, *params):
+        session = self.session
+        if not session.current_user: raise ValueError("Login required")
+        parsed = query_parser.QueryParser.bind(session.parse_query(self.query, self.normalized), params)
+        return session._execute_parsed(parsed, self.query)
+
+
+class Session:
+    """One client of a DatabaseManager: logged-in user, current database, transaction,
+    prepared statements and query history
+
+    Sessions share the manager's databases and may run in different threads.
+    SELECTs and aggregates read a snapshot of the data committed when they start,
+    so they neither see uncommitted rows nor wait for transactions. Writers take
+    the database's transaction lock, for the statement or from START TRANSACTION
+    to COMMIT/ROLLBACK (one writing transaction at a time), and its exclusive lock
+    for each statement. Inside its own transaction a session reads its own
+    changes under the shared lock.
+    """
+    def __init__(self, manager):
+        self.manager = manager
         self.current_user = None
         self.current_database = None
         self.query_history = []
         self.in_transaction = False
-        
-        os.makedirs(data_dir, exist_ok=True)
-        self.load_users()
-        self.load_databases()
+        self.transaction_database = None
+        self.prepared = {}
+        self.used = set()  # databases selected with USE: logout checkpoints these
 
     def _auto_save(self):
-        # Only save to disk if NOT in a transaction
-        if not self.in_transaction and self.current_database:
-            self.save_database(self.current_database)
+        if self.current_database:
+            self.manager.flush_log(self.current_database)
+            self.manager._enforce_memory_budget(pinned=(self.current_database,))
 
     def check_fk_exists(self, table_name, column_name, value):
         db = self.get_current_database()
         if table_name not in db.tables: return False
-        records = db.tables[table_name]['records']
-        for r in records:
-            if str(r.get(column_name)) == str(value):
-                return True
-        return False
+        return db.has_value(table_name, column_name, value)
 
     def grant_role(self, user, role):
-        if self.users[self.current_user]['role'] != 'admin':
+        users = self.manager.users
+        if users[self.current_user]['role'] != 'admin':
             raise PermissionError("Only Admins can GRANT roles")
-        if user not in self.users:
-            raise ValueError(f"User '{user}' does not exist")
-        self.users[user]['role'] = role
-        self.save_users()
+        with self.manager.lock:
+            if user not in users:
+                raise ValueError(f"User '{user}' does not exist")
+            users[user]['role'] = role
+            self.manager.save_users()
         return f"Granted role '{role}' to user '{user}'"
 
     def revoke_role(self, user):
-        if self.users[self.current_user]['role'] != 'admin':
+        users = self.manager.users
+        if users[self.current_user]['role'] != 'admin':
             raise PermissionError("Only Admins can REVOKE roles")
-        if user not in self.users:
-            raise ValueError(f"User '{user}' does not exist")
-        self.users[user]['role'] = 'user' 
-        self.save_users()
+        with self.manager.lock:
+            if user not in users:
+                raise ValueError(f"User '{user}' does not exist")
+            users[user]['role'] = 'user'
+            self.manager.save_users()
         return f"Revoked roles from '{user}'"
 
-    def hash_password(self, password):
-        return hashlib.sha256(password.encode()).hexdigest()
-
-    def register_user(self, username, password):
-        if username in self.users: raise ValueError("User exists")
-        self.users[username] = {'password': self.hash_password(password), 'role': 'user', 'databases': []}
-        self.save_users()
-        return "Registered"
-
     def login(self, username, password):
-        if username not in self.users or self.users[username]['password'] != self.hash_password(password):
+        users = self.manager.users
+        if username not in users or users[username]['password'] != self.manager.hash_password(password):
             raise ValueError("Invalid credentials")
         self.current_user = username
-        self.load_databases()
-    
+
     def logout(self):
-        if self.in_transaction: 
+        if self.in_transaction:
             self.execute_query("ROLLBACK")
+        # Checkpoint the databases this session used (other sessions' are theirs to save)
+        manager = self.manager
+        for full_name in sorted(self.used):
+            if full_name in manager.transactions: continue  # another session's transaction
+            with manager.transaction_lock_for(full_name), manager.lock_for(full_name).write(), manager.lock:
+                entry = manager.databases.get(full_name)
+                if entry is not None and entry['wal'].record_count:
+                    manager.save_database(full_name)
+        self.used.clear()
         self.current_user = None
         self.current_database = None
 
-    def execute_query(self, query):
-        if not self.current_user: raise ValueError("Login required")
-        
-        try:
+    def parse_query(self, query, normalized=None):
+        """Parse through the statement cache (normalized: the query's QueryParser.normalize text)"""
+        if normalized is None:
+            if len(query) > statement_cache.MAX_KEY_LENGTH:
+                return query_parser.QueryParser.parse(query)
+            normalized = query_parser.QueryParser.normalize(query)
+        key = (self.current_database, normalized)
+        cache = self.manager.statement_cache
+        parsed = cache.get(key)
+        if parsed is None:
             parsed = query_parser.QueryParser.parse(query)
-            self.query_history.append({'query': query, 'timestamp': datetime.now().isoformat()})
-            q_type = parsed['type']
-
-            # --- Transaction Management ---
-            if q_type == 'START_TRANSACTION':
-                if self.in_transaction: return "Transaction already active"
-                self.in_transaction = True
-                return "Transaction started. Auto-save disabled."
-            
-            elif q_type == 'COMMIT':
-                if not self.in_transaction: return "No active transaction"
-                self.in_transaction = False
-                self.save_database(self.current_database) # Persist changes
-                return "Transaction committed."
-            
-            elif q_type == 'ROLLBACK':
-                if not self.in_transaction: return "No active transaction"
-                self.in_transaction = False
-                if self.current_database: 
-                    # Revert by reloading the last saved state from disk
-                    self._load_single_database(self.current_database) 
-                return "Transaction rolled back."
-
-            elif q_type == 'GRANT': return self.grant_role(parsed['user'], parsed['role'])
-            elif q_type == 'REVOKE': return self.revoke_role(parsed['user'])
-
-            elif q_type == 'CREATE_DATABASE': return self.create_database(parsed['database'])
-            elif q_type == 'USE_DATABASE': return self.use_database(parsed['database'])
-            elif q_type == 'SHOW_DATABASES': return self.list_databases_str()
-            elif q_type == 'DROP_DATABASE': return self.drop_database(parsed['database'])
-
-            # Database operations requiring a selected DB
-            db = self.get_current_database()
-            
-            if q_type == 'CREATE_TABLE':
-                res = db.create_table(parsed['table'], parsed['columns'])
-                self._auto_save()
-                return res
-            elif q_type == 'ALTER_TABLE':
-                res = db.alter_table(parsed['table'], parsed['column_def'])
-                self._auto_save()
-                return res
-            elif q_type == 'TRUNCATE_TABLE':
-                res = db.truncate_table(parsed['table'])
-                self._auto_save()
-                return res
-            elif q_type == 'DROP_TABLE':
-                res = db.drop_table(parsed['table'])
-                self._auto_save()
-                return res
-            elif q_type == 'DESCRIBE_TABLE':
-                return db.describe_table(parsed['table'])
-            elif q_type == 'SHOW_TABLES':
-                return "\n".join(db.tables.keys()) if db.tables else "No tables"
-
-            elif q_type == 'INSERT':
-                if 'values_list' in parsed:
-                    count = 0
-                    errors = []
-                    for vals in parsed['values_list']:
-                        try:
-                            db.insert_record(parsed['table'], vals, self.check_fk_exists)
-                            count += 1
-                        except Exception as e:
-                            errors.append(str(e))
-                    self._auto_save()
-                    return f"Inserted {count} records. Errors: {len(errors)}"
-            
-            elif q_type == 'SELECT':
-                return db.select_records(parsed['table'], parsed['where'], parsed['order_by'], parsed['limit'])
-            
-            # --- NEW AGGREGATE HANDLER ---
-            elif q_type == 'AGGREGATE':
-                return db.execute_aggregate(
-                    parsed['table'], 
-                    parsed['function'], 
-                    parsed['column'], 
-                    parsed['where'],
-                    parsed['group_by']
-                )
-
-            elif q_type == 'UPDATE':
-                res = db.update_records(parsed['table'], parsed['set'], parsed['where'])
-                self._auto_save()
-                return res
-            elif q_type == 'DELETE':
-                res = db.delete_records(parsed['table'], parsed['where'])
+            cache.put(key, parsed)
+        return parsed
+
+    def prepare(self, query):
+        """Parse `query` once; bind its `?` placeholders with .execute(*params)"""
+        if not self.current_user: raise ValueError("Login required")
+        return PreparedStatement(self, query)
+
+    def stream_query(self, query):
+        """Rows of a SELECT one at a time, read from the tables as they are consumed, all from
+        the snapshot taken when the first row is pulled (see _reading for the locks held)"""
+        if not self.current_user: raise ValueError("Login required")
+        parsed = self.parse_query(query)
+        if parsed['type'] != 'SELECT': raise ValueError("Only SELECT queries can be streamed")
+        if parsed.get('param_count'):
+            raise ValueError("Query has '?' placeholders: use prepare() or PREPARE ... FROM '...'")
+        if not self.current_database: raise ValueError("No DB selected")
+        return self._stream(parsed, self.current_database)
+
+    def _stream(self, parsed, full_name):
+        with self._reading(parsed, full_name) as db:
+            if parsed.get('joins'):
+                yield from db.join_records(parsed['table'], parsed['alias'], parsed['joins'], parsed['columns'],
+                                           parsed['where'], parsed['order_by'], parsed['limit'],
+                                           offset=parsed['offset'])
+            else:
+                yield from db.iter_records(parsed['table'], parsed['where'], parsed['order_by'], parsed['limit'],
+                                           parsed['columns'] or '*', parsed['offset'])
+
+    @contextmanager
+    def _locked(self, full_name, q_type):
+        """Hold the locks a q_type statement needs on database full_name: the shared lock to
+        read; to write, the transaction lock (START TRANSACTION already holds it) and the
+        exclusive lock"""
+        manager = self.manager
+        if q_type in READ_ONLY:
+            with manager.lock_for(full_name).read():
+                yield
+            return
+        own = self.in_transaction and full_name == self.transaction_database
+        with nullcontext() if own else manager.transaction_lock_for(full_name), manager.lock_for(full_name).write():
+            yield
+
+    @contextmanager
+    def _reading(self, parsed, full_name):
+        """The database a SELECT / aggregate reads: inside this session's transaction the live
+        one (its own changes included) under the shared lock, otherwise a snapshot of the
+        committed data, which takes the shared lock only for moments (row tables) or while
+        the statement runs (columnar tables, whose buffers are updated in place)"""
+        manager = self.manager
+        lock = manager.lock_for(full_name)
+        if self.in_transaction and full_name == self.transaction_database:
+            with lock.read():
+                yield manager._resident(full_name)['database']
+            return
+        db = manager._resident(full_name)['database']
+        tables = [parsed['table']] + [join['table'] for join in parsed.get('joins') or ()]
+        with db.snapshot(lock) as snapshot, \
+                lock.read() if any(t in db.stores for t in tables) else nullcontext():
+            yield snapshot
+
+    def execute_query(self, query, cancel=None):
+        """Run one statement; cancel (database.CancelToken) lets another thread stop its
+        scans, or an INSERT batch between rows, with database.QueryCancelled"""
+        if not self.current_user: raise ValueError("Login required")
+        parsed = self.parse_query(query)
+        if parsed.get('param_count'):
+            raise ValueError("Query has '?' placeholders: use prepare() or PREPARE ... FROM '...'")
+        with database.cancellable(cancel) if cancel is not None else nullcontext():
+            return self._execute_parsed(parsed, query)
+
+    def _execute_parsed(self, parsed, query):
+        manager = self.manager
+        self.query_history.append({'query': query, 'timestamp': datetime.now().isoformat()})
+        q_type = parsed['type']
+
+        # --- Transaction Management ---
+        if q_type == 'START_TRANSACTION':
+            if self.in_transaction: return "Transaction already active"
+            if not self.current_database: raise ValueError("No DB selected")
+            writer = manager.transaction_lock_for(self.current_database)
+            writer.acquire()  # released by COMMIT / ROLLBACK
+            try:
+                with manager.lock_for(self.current_database).write():
+                    self.get_current_database().begin_transaction()
+            except Exception:
+                writer.release()
+                raise
+            manager.transactions[self.current_database] = self
+            self.transaction_database = self.current_database
+            self.in_transaction = True
+            return "Transaction started. Auto-save disabled."
+
+        elif q_type == 'COMMIT':
+            if not self.in_transaction: return "No active transaction"
+            full = self.transaction_database
+            try:
+                with manager.lock_for(full).write():
+                    self._end_transaction()
+                    manager.databases[full]['database'].commit()
+                    manager.flush_log(full) # Persist changes
+            finally:
+                manager.transaction_lock_for(full).release()
+            return "Transaction committed."
+
+        elif q_type == 'ROLLBACK':
+            if not self.in_transaction: return "No active transaction"
+            # Revert in memory by walking the undo log back
+            with manager.lock_for(self.transaction_database).write():
+                manager.databases[self.transaction_database]['database'].rollback(parsed.get('savepoint'))
+            if parsed.get('savepoint'):
+                return f"Rolled back to savepoint '{parsed['savepoint']}'."
+            self._end_transaction()
+            manager.transaction_lock_for(self.transaction_database).release()
+            return "Transaction rolled back."
+
+        elif q_type == 'SAVEPOINT':
+            if not self.in_transaction: raise ValueError("SAVEPOINT requires an active transaction")
+            return manager.databases[self.transaction_database]['database'].savepoint(parsed['savepoint'])
+
+        elif q_type == 'RELEASE_SAVEPOINT':
+            if not self.in_transaction: raise ValueError("No active transaction")
+            return manager.databases[self.transaction_database]['database'].release_savepoint(parsed['savepoint'])
+
+        elif q_type == 'CHECKPOINT':
+            if self.in_transaction: raise ValueError("Cannot CHECKPOINT inside a transaction")
+            if not self.current_database: raise ValueError("No DB selected")
+            with self._locked(self.current_database, q_type):
+                self.get_current_database()
+                manager.save_database(self.current_database)
+            return "Checkpoint complete."
+
+        elif q_type == 'PREPARE':
+            self.prepared[parsed['name']] = self.prepare(parsed['query'])
+            return f"Statement '{parsed['name']}' prepared."
+        elif q_type == 'EXECUTE':
+            if parsed['name'] not in self.prepared:
+                raise ValueError(f"Prepared statement '{parsed['name']}' does not exist")
+            return self.prepared[parsed['name']].execute(*parsed['params'])
+        elif q_type == 'DEALLOCATE':
+            if self.prepared.pop(parsed['name'], None) is None:
+                raise ValueError(f"Prepared statement '{parsed['name']}' does not exist")
+            return f"Statement '{parsed['name']}' deallocated."
+
+        elif q_type == 'GRANT': return self.grant_role(parsed['user'], parsed['role'])
+        elif q_type == 'REVOKE': return self.revoke_role(parsed['user'])
+
+        elif q_type == 'CREATE_DATABASE': return self.create_database(parsed['database'])
+        elif q_type == 'USE_DATABASE': return self.use_database(parsed['database'])
+        elif q_type == 'SHOW_DATABASES': return self.list_databases_str()
+        elif q_type == 'DROP_DATABASE': return self.drop_database(parsed['database'])
+
+        # Database operations requiring a selected DB
+        if not self.current_database: raise ValueError("No DB selected")
+        if q_type in SNAPSHOT_READS:
+            with self._reading(parsed, self.current_database) as db:
+                return self._execute_statement(parsed, q_type, db)
+        with self._locked(self.current_database, q_type):
+            return self._execute_statement(parsed, q_type, self.get_current_database())
+
+    def _end_transaction(self):
+        self.in_transaction = False
+        self.manager.transactions.pop(self.transaction_database, None)
+
+    def _execute_statement(self, parsed, q_type, db):
+        if q_type in ('CREATE_TABLE', 'ALTER_TABLE', 'TRUNCATE_TABLE', 'DROP_TABLE', 'CREATE_INDEX', 'DROP_INDEX'):
+            self.manager.statement_cache.invalidate(self.current_database, parsed['table'])
+
+        if q_type == 'CREATE_TABLE':
+            res = db.create_table(parsed['table'], parsed['columns'], parsed['storage'])
+            self._auto_save()
+            return res
+        elif q_type == 'ALTER_TABLE':
+            res = db.alter_table(parsed['table'], parsed['column_def'])
+            self._auto_save()
+            return res
+        elif q_type == 'TRUNCATE_TABLE':
+            res = db.truncate_table(parsed['table'])
+            self._auto_save()
+            return res
+        elif q_type == 'DROP_TABLE':
+            res = db.drop_table(parsed['table'])
+            self._auto_save()
+            return res
+        elif q_type == 'CREATE_INDEX':
+            res = db.create_index(parsed['index'], parsed['table'], parsed['column'], parsed['using'])
+            self._auto_save()
+            return res
+        elif q_type == 'DROP_INDEX':
+            res = db.drop_index(parsed['index'], parsed['table'])
+            self._auto_save()
+            return res
+        elif q_type == 'DESCRIBE_TABLE':
+            return db.describe_table(parsed['table'])
+        elif q_type == 'SHOW_TABLES':
+            return "\n".join(db.tables.keys()) if db.tables else "No tables"
+
+        elif q_type == 'INSERT':
+            if 'values_list' in parsed:
+                count = 0
+                errors = []
+                token = database.current_token()
+                for vals in parsed['values_list']:
+                    if token is not None and token.cancelled:
+                        self._auto_save()  # the rows already inserted stay, as rows before an error do
+                        raise database.QueryCancelled(f"Query cancelled after inserting {count} records")
+                    try:
+                        db.insert_record(parsed['table'], vals, self.check_fk_exists)
+                        count += 1
+                    except Exception as e:
+                        errors.append(str(e))
                 self._auto_save()
-                return res
-            return "Unknown query"
+                return f"Inserted {count} records. Errors: {len(errors)}"
+
+        elif q_type == 'SELECT':
+            if parsed.get('joins'):
+                return db.join_records(parsed['table'], parsed['alias'], parsed['joins'], parsed['columns'],
+                                       parsed['where'], parsed['order_by'], parsed['limit'], offset=parsed['offset'])
+            return db.select_records(parsed['table'], parsed['where'], parsed['order_by'], parsed['limit'],
+                                     parsed['columns'] or '*', parsed['offset'])
+        elif q_type == 'EXPLAIN':
+            return db.explain(parsed['query'])
+
+        # --- NEW AGGREGATE HANDLER ---
+        elif q_type == 'AGGREGATE':
+            return db.aggregate(
+                parsed['table'],
+                parsed['aggregates'],
+                parsed['where'],
+                parsed['group_by'],
+                parsed['having'],
+                parsed['order_by'],
+                parsed['limit'],
+                parsed['offset']
+            )
 
-        except Exception as e:
-            raise e
+        elif q_type == 'UPDATE':
+            res = db.update_records(parsed['table'], parsed['set'], parsed['where'])
+            self._auto_save()
+            return res
+        elif q_type == 'DELETE':
+            res = db.delete_records(parsed['table'], parsed['where'])
+            self._auto_save()
+            return res
+        return "Unknown query"
 
     def create_database(self, db_name):
+        manager = self.manager
         full = f"{self.current_user}_{db_name}"
-        if full in self.databases: raise ValueError("DB exists")
-        self.databases[full] = {'database': database.Database(db_name, self.current_user), 'owner': self.current_user, 'password_hash': None}
-        self.users[self.current_user]['databases'].append(full)
-        self.save_database(full)
-        self.save_users()
+        with manager.lock:
+            if full in manager.databases or full in manager.users[self.current_user]['databases']:
+                raise ValueError("DB exists")
+            manager.databases[full] = {'database': database.Database(db_name, self.current_user), 'owner': self.current_user,
+                                       'password_hash': None, 'wal': manager._open_wal(full)}
+            manager.users[self.current_user]['databases'].append(full)
+            manager.save_database(full)
+            manager.save_users()
+        manager._enforce_memory_budget(pinned=(self.current_database,))
         return "Database created"
 
     def use_database(self, db_name):
         full = f"{self.current_user}_{db_name}"
-        if full not in self.databases: self._load_single_database(full)
-        if full not in self.databases: raise ValueError("Database not found")
+        self.manager._resident(full)
         self.current_database = full
+        self.used.add(full)
+        self.manager._enforce_memory_budget(pinned=(full,))
         return f"Switched to {db_name}"
 
     def get_current_database(self):
         if not self.current_database: raise ValueError("No DB selected")
-        return self.databases[self.current_database]['database']
+        return self.manager._resident(self.current_database)['database']
 
     def drop_database(self, db_name):
+        manager = self.manager
         full = f"{self.current_user}_{db_name}"
-        if full in self.databases: del self.databases[full]
-        if full in self.users[self.current_user]['databases']:
-            self.users[self.current_user]['databases'].remove(full)
-        path = os.path.join(self.data_dir, f"{full}.json")
-        if os.path.exists(path): os.remove(path)
-        self.save_users()
+        if full in manager.transactions:
+            raise ValueError("Cannot drop a database with an open transaction")
+        with manager.transaction_lock_for(full), manager.lock_for(full).write(), manager.lock:
+            if full in manager.databases: del manager.databases[full]
+            manager.statement_cache.invalidate(full)
+            manager._open_wal(full).remove()
+            if full in manager.users[self.current_user]['databases']:
+                manager.users[self.current_user]['databases'].remove(full)
+            for path in manager._snapshot_paths(full):
+                if os.path.exists(path): os.remove(path)
+            manager.save_users()
         return "Dropped"
 
     def list_databases(self):
         """Return list of databases for current user (for GUI)"""
         if not self.current_user:
             return []
-        dbs = self.users[self.current_user]['databases']
+        dbs = self.manager.users[self.current_user]['databases']
         return [d.split('_', 1)[1] for d in dbs]
 
     def list_databases_str(self):
@@ -216,6 +423,266 @@ class DatabaseManager:
         dbs = self.list_databases()
         return "\n".join(dbs) if dbs else "No databases"
 
+    def load_databases(self):
+        """Load every database of the current user now (otherwise each loads on first use);
+        resident ones are left alone, as another session may be writing them"""
+        if self.current_user:
+            for db in self.manager.users[self.current_user]['databases']:
+                with self.manager.lock:
+                    if db not in self.manager.databases:
+                        self.manager._load_single_database(db)
+
+    def _write(self, mutate):
+        """mutate(db) on the current database under the locks an INSERT/UPDATE/DELETE takes,
+        then persisted like one (for callers holding values rather than SQL, e.g. GUI forms)"""
+        if not self.current_user: raise ValueError("Login required")
+        if not self.current_database: raise ValueError("No DB selected")
+        with self._locked(self.current_database, 'INSERT'):
+            result = mutate(self.get_current_database())
+            self._auto_save()
+        return result
+
+    def insert_record(self, table_name, values):
+        return self._write(lambda db: db.insert_record(table_name, values, self.check_fk_exists))
+
+    def update_records(self, table_name, set_clause, where_clause):
+        return self._write(lambda db: db.update_records(table_name, set_clause, where_clause))
+
+    def delete_records(self, table_name, where_clause):
+        return self._write(lambda db: db.delete_records(table_name, where_clause))
+
+    def select_page(self, table_name, limit, offset=0, order_by=None, after=None):
+        """(rows offset .. offset + limit of a table in order_by order, live row count) for a
+        paged grid: read like SELECT * ... LIMIT limit OFFSET offset, without a history entry.
+        Ties are ordered by primary key, so pages follow one order. With after (the last row
+        of the previous page) the page is the rows sorting after it instead (keyset paging:
+        no rows are skipped over, see Database.iter_records)."""
+        if not self.current_user: raise ValueError("Login required")
+        if not self.current_database: raise ValueError("No DB selected")
+        db = self.get_current_database()
+        if table_name not in db.tables: raise ValueError(f"Table '{table_name}' does not exist")
+        parsed = {'type': 'SELECT', 'table': table_name}
+        columns = db.tables[table_name]['columns'] + list(columnar.TIMESTAMP_COLUMNS)
+        pk = db.tables[table_name]['primary_key']
+        if order_by and pk not in [col for col, _ in order_by]:
+            order_by = order_by + [(pk, order_by[-1][1])]
+        with self._reading(parsed, self.current_database) as db:
+            return db.select_records(table_name, None, order_by, limit, columns, offset, after), db.row_count(table_name)
+
+    def export_to_csv(self, table_name, filename):
+        db = self.get_current_database()
+        if table_name not in db.tables: raise ValueError("Table not found")
+        with self._locked(self.current_database, 'SELECT'):
+            records = db.select_records(table_name)
+        if not records: raise ValueError("No records")
+        filepath = os.path.join(self.manager.data_dir, filename)
+        with open(filepath, 'w', newline='') as f:
+             writer = csv.DictWriter(f, fieldnames=records[0].keys())
+             writer.writeheader()
+             writer.writerows(records)
+        return "Exported"
+
+
+def _vacuum_loop(manager_ref, interval):
+    """Background vacuum of a manager's databases; ends once the manager is gone"""
+    while True:
+        time.sleep(interval)
+        manager = manager_ref()
+        if manager is None: return
+        try:
+            manager.vacuum()
+        except Exception:
+            pass  # a database dropped or evicted mid-pass: the next pass sees the new state
+        del manager
+
+
+def _session_property(name):
+    """Attribute of the manager's default session"""
+    return property(lambda self: getattr(self.session, name),
+                    lambda self, value: setattr(self.session, name, value))
+
+
+class DatabaseManager:
+    """Manages databases, users, and transactions
+
+    The manager is the engine shared by every Session: resident databases, users,
+    WAL files, the statement cache, one ReadWriteLock and one transaction lock per
+    database, and a background thread vacuuming old row versions. connect()
+    opens a new Session (one per thread or client); the manager's own query methods
+    and current_user/current_database use a default session, so single-user callers
+    (GUI, scripts) work with the manager directly.
+    """
+    def __init__(self, data_dir='structdb_data', fsync_policy='commit', checkpoint_interval=1000,
+                 statement_cache_size=256, memory_budget=None, storage_format='json', vacuum_interval=1.0):
+        if storage_format not in ('json', 'pages'): raise ValueError("storage_format must be 'json' or 'pages'")
+        self.data_dir = data_dir
+        self.storage_format = storage_format  # snapshot files written: <db>.json or <db>.sdb (pagefile)
+        self.fsync_policy = fsync_policy
+        self.checkpoint_interval = checkpoint_interval
+        self.users_file = os.path.join(data_dir, 'users.json')
+        # Resident databases, least recently used first; others are loaded on first use
+        self.databases = OrderedDict()
+        self.memory_budget = memory_budget  # bytes (Database.estimated_size), None: no limit
+        self.evictions = 0
+        self.sizes = {}  # full name -> estimated_size() when last measured
+        self.users = {}
+        self.statement_cache = statement_cache.StatementCache(statement_cache_size)
+        # Guards databases, users and locks; taken after a database lock, never before one
+        self.lock = threading.RLock()
+        self.locks = {}  # database -> locks.ReadWriteLock
+        self.transaction_locks = {}  # database -> threading.Lock held by the transaction writing it
+        self.transactions = {}  # database -> Session with an open transaction on it
+        self.session = Session(self)
+
+        os.makedirs(data_dir, exist_ok=True)
+        self.load_users()
+        if vacuum_interval:
+            threading.Thread(target=_vacuum_loop, args=(weakref.ref(self), vacuum_interval),
+                             name='structdb-vacuum', daemon=True).start()
+
+    current_user = _session_property('current_user')
+    current_database = _session_property('current_database')
+    in_transaction = _session_property('in_transaction')
+    transaction_database = _session_property('transaction_database')
+    query_history = _session_property('query_history')
+    prepared = _session_property('prepared')
+
+    def connect(self, username, password):
+        """New Session logged in as username"""
+        session = Session(self)
+        session.login(username, password)
+        return session
+
+    def lock_for(self, full_name):
+        """The ReadWriteLock of a database (kept across eviction and reload)"""
+        with self.lock:
+            lock = self.locks.get(full_name)
+            if lock is None:
+                lock = self.locks[full_name] = locks.ReadWriteLock()
+            return lock
+
+    def transaction_lock_for(self, full_name):
+        """The lock serializing writing transactions on a database (a plain Lock: COMMIT may
+        release it from another thread than START TRANSACTION took it in)"""
+        with self.lock:
+            lock = self.transaction_locks.get(full_name)
+            if lock is None:
+                lock = self.transaction_locks[full_name] = threading.Lock()
+            return lock
+
+    def vacuum(self):
+        """Reclaim the row versions no open snapshot can read in every resident database;
+        returns how many were dropped"""
+        with self.lock:
+            entries = list(self.databases.items())
+        dropped = 0
+        for full_name, entry in entries:
+            db = entry['database']
+            if not (db.begins or db.versions): continue
+            with self.lock_for(full_name).write():
+                dropped += db.vacuum()
+        return dropped
+
+    # --- Default session ---
+    def login(self, username, password): return self.session.login(username, password)
+    def logout(self): return self.session.logout()
+    def parse_query(self, query, normalized=None): return self.session.parse_query(query, normalized)
+    def prepare(self, query): return self.session.prepare(query)
+    def stream_query(self, query): return self.session.stream_query(query)
+    def execute_query(self, query, cancel=None): return self.session.execute_query(query, cancel)
+    def check_fk_exists(self, table_name, column_name, value):
+        return self.session.check_fk_exists(table_name, column_name, value)
+    def grant_role(self, user, role): return self.session.grant_role(user, role)
+    def revoke_role(self, user): return self.session.revoke_role(user)
+    def create_database(self, db_name): return self.session.create_database(db_name)
+    def use_database(self, db_name): return self.session.use_database(db_name)
+    def get_current_database(self): return self.session.get_current_database()
+    def drop_database(self, db_name): return self.session.drop_database(db_name)
+    def list_databases(self): return self.session.list_databases()
+    def list_databases_str(self): return self.session.list_databases_str()
+    def load_databases(self): return self.session.load_databases()
+    def insert_record(self, table_name, values): return self.session.insert_record(table_name, values)
+    def update_records(self, table_name, set_clause, where_clause):
+        return self.session.update_records(table_name, set_clause, where_clause)
+    def delete_records(self, table_name, where_clause): return self.session.delete_records(table_name, where_clause)
+    def select_page(self, table_name, limit, offset=0, order_by=None, after=None):
+        return self.session.select_page(table_name, limit, offset, order_by, after)
+    def export_to_csv(self, table_name, filename): return self.session.export_to_csv(table_name, filename)
+
+    def flush_log(self, full_name):
+        """Append pending mutations to the WAL; checkpoint once the log grows large"""
+        if full_name in self.transactions: return
+        entry = self.databases[full_name]
+        db = entry['database']
+        entry['wal'].append(db.journal)
+        db.journal = []
+        if entry['wal'].record_count >= self.checkpoint_interval:
+            self.save_database(full_name)
+
+    def hash_password(self, password):
+        return hashlib.sha256(password.encode()).hexdigest()
+
+    def register_user(self, username, password):
+        with self.lock:
+            if username in self.users: raise ValueError("User exists")
+            self.users[username] = {'password': self.hash_password(password), 'role': 'user', 'databases': []}
+            self.save_users()
+        return "Registered"
+
+    def _resident(self, full_name):
+        """Entry of a database, loading it from disk on first use"""
+        with self.lock:
+            if full_name not in self.databases:
+                self._load_single_database(full_name)
+                if full_name not in self.databases: raise ValueError("Database not found")
+            self.databases.move_to_end(full_name)
+            return self.databases[full_name]
+
+    def _enforce_memory_budget(self, pinned=()):
+        """Evict least recently used databases while the resident ones exceed memory_budget.
+        Pinned databases, ones a statement is using and ones with an open transaction stay.
+        A database is sized under its shared lock; one being written counts its last size."""
+        if self.memory_budget is None: return
+        with self.lock:
+            sizes = {}
+            for name, entry in self.databases.items():
+                lock = self.lock_for(name)
+                if lock.acquire_read(blocking=False):
+                    try:
+                        self.sizes[name] = entry['database'].estimated_size()
+                    finally:
+                        lock.release_read()
+                sizes[name] = self.sizes.get(name, 0)
+            total = sum(sizes.values())
+            for name in list(self.databases):
+                if total <= self.memory_budget: break
+                if name in pinned or name in self.transactions or self.databases[name]['database'].snapshots:
+                    continue
+                writer, lock = self.transaction_lock_for(name), self.lock_for(name)
+                if not writer.acquire(blocking=False): continue
+                try:
+                    if not lock.acquire_write(blocking=False): continue
+                    try:
+                        self.evict_database(name)
+                    finally:
+                        lock.release_write()
+                finally:
+                    writer.release()
+                total -= sizes[name]
+
+    def evict_database(self, full_name):
+        """Checkpoint a resident database and drop it from memory; its next use reloads it"""
+        with self.lock:
+            if full_name in self.transactions:
+                raise ValueError("Cannot evict a database with an open transaction")
+            entry = self.databases[full_name]
+            if entry['database'].journal or entry['wal'].record_count:
+                self.save_database(full_name)
+            entry['wal'].close()
+            del self.databases[full_name]
+            self.sizes.pop(full_name, None)
+            self.evictions += 1
+
     def save_users(self):
         with open(self.users_file, 'w') as f: json.dump(self.users, f, indent=2)
 
@@ -226,39 +693,53 @@ class DatabaseManager:
             self.users = {'admin': {'password': self.hash_password('admin123'), 'role': 'admin', 'databases': []}}
             self.save_users()
 
+    def _snapshot_paths(self, full_name):
+        """(page file, JSON file) snapshot paths of a database"""
+        base = os.path.join(self.data_dir, full_name)
+        return base + '.sdb', base + '.json'
+
     def save_database(self, full_name):
-        path = os.path.join(self.data_dir, f"{full_name}.json")
-        data = {
-            'database': self.databases[full_name]['database'].to_dict(),
-            'owner': self.databases[full_name]['owner'],
-            'password_hash': self.databases[full_name]['password_hash']
-        }
-        with open(path, 'w') as f: json.dump(data, f, indent=2)
+        """Checkpoint: write the full snapshot and discard the WAL it supersedes"""
+        pages_path, json_path = self._snapshot_paths(full_name)
+        entry = self.databases[full_name]
+        if self.storage_format == 'pages':
+            pagefile.write(pages_path, entry['database'],
+                           {'owner': entry['owner'], 'password_hash': entry['password_hash']})
+            stale = json_path
+        else:
+            data = {
+                'database': entry['database'].to_dict(),
+                'owner': entry['owner'],
+                'password_hash': entry['password_hash']
+            }
+            tmp_path = json_path + '.tmp'
+            with open(tmp_path, 'w') as f: json.dump(data, f, indent=2)
+            os.replace(tmp_path, json_path)
+            stale = pages_path
+        # Loading prefers the page file, so never leave an older snapshot of the other format behind
+        if os.path.exists(stale): os.remove(stale)
+        entry['database'].journal = []
+        entry['wal'].truncate()
 
-    def _load_single_database(self, full_name):
-        path = os.path.join(self.data_dir, f"{full_name}.json")
-        if os.path.exists(path):
-            with open(path) as f:
-                data = json.load(f)
-                self.databases[full_name] = {
-                    'database': database.Database.from_dict(data['database']),
-                    'owner': data['owner'],
-                    'password_hash': data.get('password_hash')
-                }
+    def _open_wal(self, full_name):
+        return wal.WriteAheadLog(os.path.join(self.data_dir, f"{full_name}.wal"), self.fsync_policy)
 
-    def load_databases(self):
-        if self.current_user:
-            for db in self.users[self.current_user]['databases']:
-                self._load_single_database(db)
-    
-    def export_to_csv(self, table_name, filename):
-        db = self.get_current_database()
-        if table_name not in db.tables: raise ValueError("Table not found")
-        records = db.select_records(table_name)
-        if not records: raise ValueError("No records")
-        filepath = os.path.join(self.data_dir, filename)
-        with open(filepath, 'w', newline='') as f:
-             writer = csv.DictWriter(f, fieldnames=records[0].keys())
-             writer.writeheader()
-             writer.writerows(records)
-        return "Exported"
\ No newline at end of file
+    def _load_single_database(self, full_name):
+        pages_path, json_path = self._snapshot_paths(full_name)
+        if os.path.exists(pages_path) or os.path.exists(json_path):
+            if full_name in self.databases:
+                self.databases[full_name]['wal'].close()
+            if os.path.exists(pages_path):
+                # Only the catalog is read here; tables decode from the mapped file on first use
+                db, data = pagefile.open_database(pages_path)
+            else:
+                data = pagefile.read_json(json_path)
+                db = database.Database.from_dict(data['database'])
+            log = self._open_wal(full_name)
+            db.replay(log.read())
+            self.databases[full_name] = {
+                'database': db,
+                'owner': data['owner'],
+                'password_hash': data.get('password_hash'),
+                'wal': log
+            }
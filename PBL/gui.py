@@ -3,11 +3,102 @@ gui.py
 Tkinter-based GUI for StructDB - COMPLETE FIXED VERSION WITH AUTO-REFRESH INFO
 """
 
+import queue
+import re
+import threading
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
 from datetime import datetime
+import database
 import database_manager
 
+QUERY_POLL_MS = 50  # how often the main loop picks up what the query thread reported
+RECORDS_PAGE = 200  # rows the records grid fetches at a time
+RECORDS_WINDOW = 5  # pages the records grid keeps; scrolling further drops the far end
+LOAD_MORE_AT = 0.9  # scroll position (fraction of the rows held) that fetches the next page
+
+
+class RecordPages:
+    """Which rows of a table the records grid holds: a window of at most `max_pages`
+    consecutive pages, moved a page at a time as the view scrolls
+
+    In insertion order pages are read by OFFSET (a skip over the table, no sort). In a
+    sorted view they are read by keyset, the rows sorting after the last row held (or,
+    reading the order backwards, before the first), so a page never re-sorts the rows
+    before it into a growing heap. fetch() runs on a grid worker thread, the rest on the
+    Tk thread.
+    """
+    def __init__(self, table, order=None, page_size=RECORDS_PAGE, max_pages=RECORDS_WINDOW):
+        self.table = table
+        self.order = order  # (column, 'ASC'|'DESC'); None: insertion order
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.pages = []  # {'offset', 'rows' (first and last row), 'count', 'items'} in display order
+        self.at_end = False
+        self.total = 0
+
+    @property
+    def at_start(self):
+        return not self.pages or self.pages[0]['offset'] == 0
+
+    @property
+    def first_row(self):
+        return self.pages[0]['offset'] if self.pages else 0
+
+    @property
+    def row_count(self):
+        return sum(page['count'] for page in self.pages)
+
+    def request(self, forward):
+        """Page to read next to the window (forward: after it, else before it); None if there is none"""
+        order_by = [self.order] if self.order else None
+        if not self.pages:
+            return {'limit': self.page_size, 'offset': 0, 'order_by': order_by, 'backward': False}
+        if forward:
+            if self.at_end: return None
+            last = self.pages[-1]
+            if self.order is None:
+                return {'limit': self.page_size, 'offset': last['offset'] + last['count'], 'backward': False}
+            return {'limit': self.page_size, 'order_by': order_by, 'after': last['rows'][1], 'backward': False}
+        if self.at_start: return None
+        first = self.pages[0]
+        if self.order is None:
+            offset = max(first['offset'] - self.page_size, 0)
+            return {'limit': first['offset'] - offset, 'offset': offset, 'backward': False}
+        column, direction = self.order
+        backwards = [(column, 'DESC' if direction == 'ASC' else 'ASC')]
+        return {'limit': self.page_size, 'order_by': backwards, 'after': first['rows'][0], 'backward': True}
+
+    def fetch(self, manager, request):
+        """(rows in display order, live row count) of a request()"""
+        rows, total = manager.select_page(self.table, request['limit'], request.get('offset', 0),
+                                          request.get('order_by'), request.get('after'))
+        if request['backward']:
+            rows.reverse()
+        return rows, total
+
+    def add(self, forward, request, rows, total):
+        """Take in a fetched page; returns (the page or None if it was empty, pages dropped
+        from the other end of the window)"""
+        self.total = total
+        short = len(rows) < request['limit']
+        if forward:
+            self.at_end = short
+        if not rows:
+            if not forward and self.pages: self.pages[0]['offset'] = 0  # rows before were deleted
+            return None, []
+        page = {'rows': (rows[0], rows[-1]), 'count': len(rows), 'items': []}
+        if forward:
+            page['offset'] = self.pages[-1]['offset'] + self.pages[-1]['count'] if self.pages else 0
+            self.pages.append(page)
+            dropped, self.pages = self.pages[:-self.max_pages], self.pages[-self.max_pages:]
+        else:
+            page['offset'] = 0 if short else max(self.pages[0]['offset'] - len(rows), 0)
+            self.pages.insert(0, page)
+            dropped, self.pages = self.pages[self.max_pages:], self.pages[:self.max_pages]
+            if dropped: self.at_end = False
+        return page, dropped
+
 
 class StructDBGUI:
     """Main GUI application"""
@@ -19,6 +110,20 @@ class StructDBGUI:
         self.db_manager = database_manager.DatabaseManager()
         self.current_table = None
         
+        # Queries run on a worker thread; it hands (callback, args) to the Tk thread here
+        self.query_thread = None
+        self.query_events = queue.Queue()
+        self.cancel_token = None
+        self.polling = False
+        
+        # Records grid: a window of pages (RecordPages), fetched on threads of its own so
+        # scrolling never takes the query slot (or its Cancel button)
+        self.records_sort = None  # (column, 'ASC'|'DESC')
+        self.record_pages = None
+        self.records_loading = False
+        self.records_token = None  # cancels the page fetch of the current grid
+        self.records_fetches = 0  # grid page threads still running
+        
         self.set_theme()
         
         self.show_login_screen()
@@ -269,9 +374,12 @@ class StructDBGUI:
         tree_frame.pack(side='right', fill='both', expand=True)
         tree_scroll_y = ttk.Scrollbar(tree_frame, orient='vertical')
         tree_scroll_x = ttk.Scrollbar(tree_frame, orient='horizontal')
-        self.tree = ttk.Treeview(tree_frame, yscrollcommand=tree_scroll_y.set, xscrollcommand=tree_scroll_x.set, selectmode='browse')
+        self.tree_scroll_y = tree_scroll_y
+        self.tree = ttk.Treeview(tree_frame, yscrollcommand=self.on_tree_scroll, xscrollcommand=tree_scroll_x.set, selectmode='browse')
         tree_scroll_y.config(command=self.tree.yview)
         tree_scroll_x.config(command=self.tree.xview)
+        self.records_status = ttk.Label(tree_frame, text="", foreground=self.fg_grey)
+        self.records_status.pack(side='bottom', fill='x', padx=5)
         tree_scroll_y.pack(side='right', fill='y')
         tree_scroll_x.pack(side='bottom', fill='x')
         self.tree.pack(fill='both', expand=True)
@@ -306,9 +414,16 @@ class StructDBGUI:
         btn_frame = ttk.Frame(input_frame)
         btn_frame.pack(fill='x', padx=5, pady=5)
         
-        ttk.Button(btn_frame, text="Execute All Queries", command=self.execute_query).pack(side='left', padx=5)
+        self.execute_button = ttk.Button(btn_frame, text="Execute All Queries", command=self.execute_query)
+        self.execute_button.pack(side='left', padx=5)
+        self.cancel_button = ttk.Button(btn_frame, text="Cancel", command=self.cancel_query, state='disabled')
+        self.cancel_button.pack(side='left', padx=5)
         ttk.Button(btn_frame, text="Clear", command=lambda: self.query_text.delete('1.0', 'end')).pack(side='left', padx=5)
         ttk.Button(btn_frame, text="History", command=self.show_query_history).pack(side='left', padx=5)
+        self.query_progress = ttk.Progressbar(btn_frame, mode='indeterminate', length=160)
+        self.query_progress.pack(side='left', padx=5)
+        self.query_status = ttk.Label(btn_frame, text="", foreground=self.fg_grey)
+        self.query_status.pack(side='left', padx=5)
         
         # Results section
         results_frame = ttk.LabelFrame(main_query_frame, text=" [ RESULTS ] ")
@@ -341,6 +456,7 @@ class StructDBGUI:
     def on_table_select(self, event=None):
         """Handle table selection in GUI mode combobox"""
         self.current_table = self.table_combo.get()
+        self.records_sort = None
         if self.current_table:
             self.load_table_structure()
             self.show_all_records()
@@ -378,36 +494,119 @@ class StructDBGUI:
             messagebox.showerror("Error", f"Failed to load table structure: {e}")
     
     def show_all_records(self):
-        """Display all records of the selected table in the TreeView"""
+        """Show the selected table in the TreeView from its first row. Only a window of
+        RECORDS_WINDOW pages is held: pages are fetched as the view nears either end and
+        the ones furthest away dropped, so the scrollbar spans the window and the status
+        line tells where it is in the table."""
         if not self.current_table: return
         
         try:
             db = self.db_manager.get_current_database()
-            records = db.select_records(self.current_table)
-            
-            self.tree.delete(*self.tree.get_children())
-            
-            columns_to_display = []
-            if records:
-                 columns_to_display = list(records[0].keys())
-            elif self.current_table in db.tables:
-                 columns_to_display = db.tables[self.current_table]['columns'] + ['_created_at', '_updated_at']
-
-            if not columns_to_display: return
-
-            self.tree['columns'] = columns_to_display
-            self.tree['show'] = 'headings'
-            for col in columns_to_display:
-                self.tree.heading(col, text=col)
-                self.tree.column(col, width=100)
-            
-            if records:
-                for record in records:
-                    values = [str(record.get(col, '')).replace('\n', '\\n') for col in columns_to_display]
-                    self.tree.insert('', 'end', values=values)
-        
+            columns_to_display = db.tables[self.current_table]['columns'] + ['_created_at', '_updated_at']
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load records: {e}")
+            return
+        
+        self.tree.delete(*self.tree.get_children())
+        self.tree['columns'] = columns_to_display
+        self.tree['show'] = 'headings'
+        sort_column, direction = self.records_sort or (None, None)
+        for col in columns_to_display:
+            arrow = '' if col != sort_column else (' \u25b2' if direction == 'ASC' else ' \u25bc')
+            self.tree.heading(col, text=col + arrow, command=lambda c=col: self.sort_records(c))
+            self.tree.column(col, width=100)
+        
+        self.drop_record_pages()
+        self.record_pages = RecordPages(self.current_table, self.records_sort)
+        self.fetch_records(True)
+    
+    def drop_record_pages(self):
+        """Forget the grid's pages, cancelling a fetch still reading them"""
+        if self.records_token is not None:
+            self.records_token.cancel()
+        self.record_pages = None
+        self.records_loading = False
+    
+    def fetch_records(self, forward):
+        """Read the page after (forward) or before the rows shown, on a grid worker thread"""
+        pages = self.record_pages
+        if pages is None or self.records_loading: return
+        request = pages.request(forward)
+        if request is None: return
+        columns = list(self.tree['columns'])
+        
+        def work(token):
+            try:
+                with database.cancellable(token):
+                    rows, total = pages.fetch(self.db_manager, request)
+                values = [[str(record.get(col, '')).replace('\n', '\\n') for col in columns] for record in rows]
+            except Exception as e:
+                self._post(self._records_failed, pages, e)
+                return
+            self._post(self._records_arrived, pages, forward, request, rows, values, total)
+        
+        def run(token):
+            try:
+                work(token)
+            finally:
+                self._post(self._records_finished)
+        
+        self.records_loading = True
+        self.records_token = database.CancelToken()
+        self.records_fetches += 1
+        threading.Thread(target=run, args=(self.records_token,), daemon=True).start()
+        self._start_polling()
+    
+    def _records_finished(self):
+        self.records_fetches -= 1
+    
+    def _records_arrived(self, pages, forward, request, rows, values, total):
+        if pages is not self.record_pages: return  # the grid was reset meanwhile
+        self.records_loading = False
+        
+        children = self.tree.get_children()
+        top = children[min(int(self.tree.yview()[0] * len(children)), len(children) - 1)] if children else None
+        page, dropped = pages.add(forward, request, rows, total)
+        if page is not None:
+            # A page read backwards goes above the rows held, in display order
+            page['items'] = [self.tree.insert('', 'end' if forward else i, values=v) for i, v in enumerate(values)]
+        for old in dropped:
+            self.tree.delete(*old['items'])
+        # Keep the rows on screen where they were
+        children = self.tree.get_children()
+        if top is not None and self.tree.exists(top) and children:
+            self.tree.yview_moveto(self.tree.index(top) / len(children))
+        
+        if pages.pages:
+            first = pages.first_row + 1
+            self.records_status.config(text=f"Rows {first}-{first + pages.row_count - 1} of {pages.total}")
+        else:
+            self.records_status.config(text=f"No rows (0 of {pages.total})")
+    
+    def _records_failed(self, pages, error):
+        if pages is not self.record_pages: return
+        self.records_loading = False
+        if isinstance(error, database.QueryCancelled): return
+        self.record_pages = None
+        messagebox.showerror("Error", f"Failed to load records: {error}")
+    
+    def on_tree_scroll(self, first, last):
+        """Scrollbar update from the TreeView; near either end of the rows held, fetch the next page"""
+        self.tree_scroll_y.set(first, last)
+        pages = self.record_pages
+        if pages is None or self.records_loading: return
+        if float(last) >= LOAD_MORE_AT and not pages.at_end:
+            self.root.after_idle(self.fetch_records, True)
+        elif float(first) <= 1 - LOAD_MORE_AT and not pages.at_start:
+            self.root.after_idle(self.fetch_records, False)
+    
+    def sort_records(self, column):
+        """Header click: sort by column (again: reverse it), done by the engine, from the first row"""
+        if self.records_sort and self.records_sort[0] == column:
+            self.records_sort = (column, 'DESC' if self.records_sort[1] == 'ASC' else 'ASC')
+        else:
+            self.records_sort = (column, 'ASC')
+        self.show_all_records()
     
     def on_tree_select(self, event):
         """Fill the form fields when a record is selected in the TreeView"""
@@ -426,6 +625,7 @@ class StructDBGUI:
     
     def insert_record(self):
         """Insert a new record using data from the form"""
+        if self._query_running(): return
         if not self.current_table:
             messagebox.showerror("Error", "Please select a table")
             return
@@ -435,8 +635,7 @@ class StructDBGUI:
             columns = db.tables[self.current_table]['columns']
             values = [self.form_fields[col].get() for col in columns]
             
-            db.insert_record(self.current_table, values)
-            self.db_manager.save_database(self.db_manager.current_database)
+            self.db_manager.insert_record(self.current_table, values)
             
             messagebox.showinfo("Success", "Record inserted successfully")
             self.show_all_records()
@@ -447,6 +646,7 @@ class StructDBGUI:
     
     def update_record(self):
         """Update the selected record using data from the form"""
+        if self._query_running(): return
         if not self.current_table:
             messagebox.showerror("Error", "Please select a table")
             return
@@ -469,8 +669,7 @@ class StructDBGUI:
             
             where_clause = [(pk_column, '=', pk_value)]
             
-            db.update_records(self.current_table, set_clause, where_clause)
-            self.db_manager.save_database(self.db_manager.current_database)
+            self.db_manager.update_records(self.current_table, set_clause, where_clause)
             
             messagebox.showinfo("Success", "Record updated successfully")
             self.show_all_records()
@@ -480,6 +679,7 @@ class StructDBGUI:
     
     def delete_record(self):
         """Delete the selected record"""
+        if self._query_running(): return
         if not self.current_table:
             messagebox.showerror("Error", "Please select a table")
             return
@@ -500,8 +700,7 @@ class StructDBGUI:
             
             where_clause = [(pk_column, '=', pk_value)]
             
-            db.delete_records(self.current_table, where_clause)
-            self.db_manager.save_database(self.db_manager.current_database)
+            self.db_manager.delete_records(self.current_table, where_clause)
             
             messagebox.showinfo("Success", "Record deleted successfully")
             self.show_all_records()
@@ -528,8 +727,92 @@ class StructDBGUI:
         except Exception as e:
             messagebox.showerror("Error", str(e))
     
+    def _run_query(self, work, steps=None):
+        """Start work(token) on a worker thread, with the progress bar running and Cancel
+        enabled; steps: number of statements for a determinate bar. work reports back
+        through _post. False if a query is already running."""
+        if self.query_thread is not None:
+            return False
+        self.cancel_token = database.CancelToken()
+        self.execute_button.state(['disabled'])
+        self.cancel_button.state(['!disabled'])
+        if steps:
+            self.query_progress.config(mode='determinate', maximum=steps, value=0)
+        else:
+            self.query_progress.config(mode='indeterminate')
+            self.query_progress.start(10)
+        self.query_status.config(text="Running...")
+        
+        def run(token):
+            try:
+                work(token)
+            finally:
+                self._post(self._query_finished)
+        
+        self.query_thread = threading.Thread(target=run, args=(self.cancel_token,), daemon=True)
+        self.query_thread.start()
+        self._start_polling()
+        return True
+    
+    def _post(self, callback, *args):
+        """Called from the worker thread: run callback(*args) on the Tk thread"""
+        self.query_events.put((callback, args))
+    
+    def _start_polling(self):
+        if not self.polling:
+            self.polling = True
+            self.root.after(QUERY_POLL_MS, self._poll_query)
+    
+    def _poll_query(self):
+        """Run what the worker threads posted, and keep polling while any of them runs"""
+        while True:
+            try:
+                callback, args = self.query_events.get_nowait()
+            except queue.Empty:
+                break
+            callback(*args)
+        if self.query_thread is not None or self.records_fetches:
+            self.root.after(QUERY_POLL_MS, self._poll_query)
+        else:
+            self.polling = False
+    
+    def _query_finished(self):
+        self.query_thread = None
+        self.query_progress.stop()
+        self.query_progress.config(mode='determinate', value=0)
+        self.query_status.config(text="Cancelled" if self.cancel_token.cancelled else "")
+        self.execute_button.state(['!disabled'])
+        self.cancel_button.state(['disabled'])
+    
+    def _query_running(self):
+        """True (after telling the user) while a query runs: the form edits the same session's data"""
+        if self.query_thread is None:
+            return False
+        messagebox.showinfo("Busy", "A query is running. Wait for it or cancel it first.")
+        return True
+    
+    def _query_step(self, done, total):
+        self.query_progress.config(value=done)
+        self.query_status.config(text=f"{done}/{total} queries")
+    
+    def _refresh_after_query(self):
+        self.refresh_gui()
+        self.refresh_info()  # Auto-refresh info tab after query execution
+    
+    def cancel_query(self):
+        """Stop the running query: the engine gives up at its next check"""
+        if self.query_thread is not None:
+            self.cancel_token.cancel()
+            self.query_status.config(text="Cancelling...")
+    
+    def _results_insert(self, text, tag):
+        self.results_text.insert('end', text, tag)
+    
     def execute_current_line(self, event=None):
         """Execute only the current line where cursor is positioned - MySQL style with smart template"""
+        if self.query_thread is not None:
+            return "break"  # one query at a time
+        
         # Get cursor position
         cursor_pos = self.query_text.index(tk.INSERT)
         line_num = cursor_pos.split('.')[0]
@@ -548,62 +831,27 @@ class StructDBGUI:
         insert_template = None
         if current_line.upper().startswith('INSERT INTO'):
             # Extract "INSERT INTO table_name VALUES" part
-            import re
             match = re.match(r'(INSERT\s+INTO\s+\w+\s+VALUES)\s*\(.*\)', current_line, re.IGNORECASE)
             if match:
                 insert_template = match.group(1) + '()'
         
-        # Execute the current line query
-        try:
-            result = self.db_manager.execute_query(current_line)
-            
-            # Show result in a compact MySQL-style format
-            self.results_text.delete('1.0', 'end')
-            self.results_text.tag_config('success', foreground='#2FFF00')  # Green like MySQL
-            self.results_text.tag_config('line_info', foreground='#00BFFF', font=('Consolas', 9, 'bold'))
-            
-            self.results_text.insert('end', f"mysql> {current_line}\n", 'line_info')
-            
-            if isinstance(result, list):
-                if result:
-                    columns = list(result[0].keys())
-                    
-                    # MySQL-style table output
-                    col_widths = {}
-                    for col in columns:
-                        col_widths[col] = max(len(str(col)), 
-                                             max(len(str(r.get(col, ''))) for r in result))
-                    
-                    # Top border
-                    border = '+' + '+'.join('-' * (col_widths[col] + 2) for col in columns) + '+'
-                    self.results_text.insert('end', border + '\n', 'success')
-                    
-                    # Headers
-                    header = '|' + '|'.join(f" {col:<{col_widths[col]}} " for col in columns) + '|'
-                    self.results_text.insert('end', header + '\n', 'success')
-                    self.results_text.insert('end', border + '\n', 'success')
-                    
-                    # Rows
-                    for record in result:
-                        row = '|' + '|'.join(f" {str(record.get(col, '')):<{col_widths[col]}} " for col in columns) + '|'
-                        self.results_text.insert('end', row + '\n', 'success')
-                    
-                    # Bottom border
-                    self.results_text.insert('end', border + '\n', 'success')
-                    self.results_text.insert('end', f"{len(result)} row(s) in set\n", 'success')
-                else:
-                    self.results_text.insert('end', "Empty set\n", 'success')
-            else:
-                self.results_text.insert('end', f"{result}\n", 'success')
-            
-            self.refresh_gui()
-            self.refresh_info()  # Auto-refresh info tab after query execution
-            
-        except Exception as e:
-            self.results_text.delete('1.0', 'end')
-            self.results_text.tag_config('error', foreground='red', font=('Consolas', 10, 'bold'))
-            self.results_text.insert('end', f"mysql> {current_line}\n", 'line_info')
-            self.results_text.insert('end', f"ERROR: {str(e)}\n", 'error')
+        self.results_text.delete('1.0', 'end')
+        self.results_text.tag_config('success', foreground='#2FFF00')  # Green like MySQL
+        self.results_text.tag_config('line_info', foreground='#00BFFF', font=('Consolas', 9, 'bold'))
+        self.results_text.tag_config('error', foreground='red', font=('Consolas', 10, 'bold'))
+        self.results_text.insert('end', f"mysql> {current_line}\n", 'line_info')
+        
+        # Execute the current line query on the worker thread; the table is formatted there too
+        def work(token):
+            try:
+                result = self.db_manager.execute_query(current_line, token)
+            except Exception as e:
+                self._post(self._results_insert, f"ERROR: {str(e)}\n", 'error')
+                return
+            self._post(self._results_insert, self._format_table(result), 'success')
+            self._post(self._refresh_after_query)
+        
+        self._run_query(work)
         
         # *** SMART MOVE: Move cursor to next line with template ***
         # Move to end of current line first
@@ -635,8 +883,47 @@ class StructDBGUI:
         
         return "break"  # Prevent default newline insertion
     
+    @staticmethod
+    def _format_table(result):
+        """A query result as MySQL-style text"""
+        if not isinstance(result, list):
+            return f"{result}\n"
+        if not result:
+            return "Empty set\n"
+        columns = list(result[0].keys())
+        
+        # MySQL-style table output
+        col_widths = {}
+        for col in columns:
+            col_widths[col] = max(len(str(col)), 
+                                 max(len(str(r.get(col, ''))) for r in result))
+        
+        border = '+' + '+'.join('-' * (col_widths[col] + 2) for col in columns) + '+'
+        header = '|' + '|'.join(f" {col:<{col_widths[col]}} " for col in columns) + '|'
+        lines = [border, header, border]
+        for record in result:
+            lines.append('|' + '|'.join(f" {str(record.get(col, '')):<{col_widths[col]}} " for col in columns) + '|')
+        lines.append(border)
+        lines.append(f"{len(result)} row(s) in set")
+        return '\n'.join(lines) + '\n'
+    
+    @staticmethod
+    def _format_rows(result):
+        """A query result as the pipe-separated text of Execute All"""
+        if not isinstance(result, list):
+            return str(result) + '\n\n'
+        if not result:
+            return "No records found\n\n"
+        columns = list(result[0].keys())
+        lines = [' | '.join(columns), '-' * 80]
+        for record in result:
+            lines.append(' | '.join(str(record.get(col, '')).replace('\n', '\\n') for col in columns))
+        return '\n'.join(lines) + f"\n\n{len(result)} row(s) returned\n\n"
+    
     def execute_query(self):
-        """Execute ALL queries in the text box"""
+        """Execute ALL queries in the text box, one after another on the worker thread"""
+        if self.query_thread is not None:
+            return
         full_query_text = self.query_text.get('1.0', 'end').strip()
         if not full_query_text:
             messagebox.showerror("Error", "Please enter a query")
@@ -645,48 +932,47 @@ class StructDBGUI:
         queries = [q.strip() for q in full_query_text.split(';') if q.strip()]
         
         self.results_text.delete('1.0', 'end')
-        all_success = True
         
         self.results_text.tag_config('query_header', foreground='yellow', font=('Consolas', 10, 'bold'))
         self.results_text.tag_config('success_query', foreground=self.fg_white)
         self.results_text.tag_config('error_query', foreground='red', font=('Consolas', 10, 'bold'))
         
-        for i, query in enumerate(queries):
-            query_number = i + 1
-            self.results_text.insert('end', f"--- Query {query_number}: {query} ---\n", 'query_header')
-            
-            try:
-                result = self.db_manager.execute_query(query)
-                
-                if isinstance(result, list):
-                    if result:
-                        columns = list(result[0].keys())
-                        self.results_text.insert('end', ' | '.join(columns) + '\n', 'success_query')
-                        self.results_text.insert('end', '-' * 80 + '\n', 'success_query')
-                        for record in result:
-                            values = [str(record.get(col, '')).replace('\n', '\\n') for col in columns] 
-                            self.results_text.insert('end', ' | '.join(values) + '\n', 'success_query')
-                        self.results_text.insert('end', f"\n{len(result)} row(s) returned\n\n", 'success_query')
-                    else:
-                        self.results_text.insert('end', "No records found\n\n", 'success_query')
-                else:
-                    self.results_text.insert('end', str(result) + '\n\n', 'success_query')
+        def work(token):
+            all_success = True
+            for i, query in enumerate(queries):
+                query_number = i + 1
+                if token.cancelled:
+                    self._post(self._results_insert, f"Cancelled before Query {query_number}\n\n", 'error_query')
+                    all_success = False
+                    break
+                self._post(self._results_insert, f"--- Query {query_number}: {query} ---\n", 'query_header')
                 
-            except ValueError as ve:
-                error_message = f"Error in Query {query_number}: {str(ve)}\n\n"
-                self.results_text.insert('end', error_message, 'error_query')
-                all_success = False
-                continue
+                try:
+                    result = self.db_manager.execute_query(query, token)
+                    self._post(self._results_insert, self._format_rows(result), 'success_query')
                 
-            except Exception as e:
-                error_message = f"Fatal Error in Query {query_number}: {str(e)}\n\n"
-                self.results_text.insert('end', error_message, 'error_query')
-                all_success = False
-                break
-
-        if all_success:
-             self.refresh_gui()
-             self.refresh_info()  # Auto-refresh info tab after batch execution
+                except ValueError as ve:
+                    error_message = f"Error in Query {query_number}: {str(ve)}\n\n"
+                    self._post(self._results_insert, error_message, 'error_query')
+                    all_success = False
+                    
+                except database.QueryCancelled as qc:
+                    self._post(self._results_insert, f"Query {query_number}: {str(qc)}\n\n", 'error_query')
+                    all_success = False
+                    break
+                    
+                except Exception as e:
+                    error_message = f"Fatal Error in Query {query_number}: {str(e)}\n\n"
+                    self._post(self._results_insert, error_message, 'error_query')
+                    all_success = False
+                    break
+                finally:
+                    self._post(self._query_step, query_number, len(queries))
+            
+            if all_success:
+                self._post(self._refresh_after_query)
+        
+        self._run_query(work, steps=len(queries))
     
     def show_query_history(self):
         """Show the recent query history in a new window"""
@@ -708,7 +994,7 @@ class StructDBGUI:
     def refresh_gui(self):
         """Refresh GUI elements like current DB label and table list"""
         if self.db_manager.current_database:
-            db_name = self.db_manager.databases[self.db_manager.current_database]['database'].name
+            db_name = self.db_manager.get_current_database().name
             self.current_db_label.config(text=db_name, foreground=self.fg_white) 
             
             try:
@@ -719,6 +1005,8 @@ class StructDBGUI:
                 self.current_table = None
                 if hasattr(self, 'form_fields') and self.form_fields: self.clear_form()
                 self.tree.delete(*self.tree.get_children())
+                self.drop_record_pages()
+                self.records_status.config(text="")
             except Exception:
                  self.current_db_label.config(text="None", foreground='red') 
                  self.table_combo['values'] = []
@@ -751,7 +1039,7 @@ class StructDBGUI:
                 info += f"Created: {db.created_at}\n"
                 info += f"Total Tables: {len(db.tables)}\n"
                 for table_name, table in db.tables.items():
-                    records_count = len(table['records'])
+                    records_count = db.row_count(table_name)
                     info += f"\n  Table: {table_name}\n"
                     col_info = [f"{c['name']} ({c['definition']})" for c in table['column_definitions']]
                     info += f"    Columns: {', '.join(col_info)}\n"
@@ -808,6 +1096,8 @@ class StructDBGUI:
     
     def logout(self):
         """Logout current user and return to login screen"""
+        if self._query_running(): return
         if messagebox.askyesno("Confirm", "Are you sure you want to logout?"):
+            self.drop_record_pages()
             self.db_manager.logout()
             self.show_login_screen()
\ No newline at end of file
@@ -0,0 +1,80 @@
+"""
+locks.py
+Reader/writer lock guarding one database: many concurrent readers or one writer
+"""
+
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """Shared (read) / exclusive (write) lock
+
+    A waiting writer keeps new readers out, so a stream of SELECTs cannot starve
+    writers; a thread that already holds a read lock may take it again (nested
+    reads never wait for a writer that is itself waiting for them). The write
+    lock is not owned by a thread: it may be released by another thread than
+    the one that took it.
+    """
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = {}  # thread ident -> read depth
+        self._writer = False
+        self._waiting_writers = 0
+
+    def acquire_read(self, blocking=True):
+        """Take the lock shared; with blocking=False return False instead of waiting"""
+        me = threading.get_ident()
+        with self._cond:
+            if me not in self._readers:
+                while self._writer or self._waiting_writers:
+                    if not blocking: return False
+                    self._cond.wait()
+            self._readers[me] = self._readers.get(me, 0) + 1
+            return True
+
+    def release_read(self):
+        me = threading.get_ident()
+        with self._cond:
+            depth = self._readers[me] - 1
+            if depth: self._readers[me] = depth
+            else: del self._readers[me]
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self, blocking=True):
+        """Take the lock exclusively; with blocking=False return False instead of waiting"""
+        with self._cond:
+            if not blocking:
+                if self._writer or self._readers: return False
+                self._writer = True
+                return True
+            self._waiting_writers += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = True
+            return True
+
+    def release_write(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+    @contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
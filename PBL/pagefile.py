@@ -0,0 +1,313 @@
+"""
+pagefile.py
+Binary page-based database files (<user>_<db>.sdb), opened with mmap
+
+Layout (PAGE_SIZE-byte pages, every extent starts on a page boundary):
+  page 0          header: magic, version, page size, catalog extent
+  column pages    one extent per buffer of each table column:
+                    'q' / 'd' / 'ts'  int64 / float64 / timestamp values + one kind byte per row
+                    'dict'            uint32 codes + JSON list of the distinct values
+  index pages     row positions in key order for each BTREE index
+  catalog         JSON: database metadata, table definitions and the extents above
+
+Opening a file reads only the header and catalog. A table is decoded the first
+time it is looked up (db.tables[name], `name in db.stores`, ...); numeric
+columns are copied straight out of the map into arrays, so columnar tables
+need no per-value work at all. The map is closed once every table is decoded.
+
+Usage: python pagefile.py convert [data_dir]   # write a .sdb next to each database .json
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+
+import columnar
+import database
+
+PAGE_SIZE = 4096
+MAGIC = b'STRUCTDB'
+VERSION = 1
+HEADER = struct.Struct('<8sIIQQ')  # magic, version, page size, catalog page, catalog bytes
+ENCODINGS = {columnar.IntColumn: 'q', columnar.FloatColumn: 'd', columnar.TimestampColumn: 'ts'}
+TYPED = {'q': columnar.IntColumn, 'd': columnar.FloatColumn, 'ts': columnar.TimestampColumn}
+
+
+class _Writer:
+    """Appends page-aligned extents to an in-memory image of the file"""
+    def __init__(self):
+        self.image = bytearray(PAGE_SIZE)  # page 0 is the header, filled in last
+
+    def extent(self, data):
+        self.image.extend(bytes(-len(self.image) % PAGE_SIZE))
+        first = len(self.image) // PAGE_SIZE
+        self.image.extend(data)
+        return [first, len(data)]
+
+
+def _row_columns(table, records):
+    """Typed columns holding a row table's records, or None when the rows do not share one key layout"""
+    fields = list(records[0]) if records else table['columns'] + list(columnar.TIMESTAMP_COLUMNS)
+    if any(len(r) != len(fields) or list(r) != fields for r in records):
+        return None
+    store = columnar.ColumnStore()
+    types = {c['name']: c.get('type') for c in table['column_definitions']}
+    # Timestamps stay text: rebuilding ISO strings per row would cost more than it saves
+    store.columns = {f: columnar.DictColumn() if f in columnar.TIMESTAMP_COLUMNS else columnar.column_for(f, types.get(f))
+                     for f in fields}
+    for record in records:
+        store.append(record)
+    return store.columns
+
+
+def _write_column(writer, column):
+    if isinstance(column, columnar.DictColumn):
+        return {'encoding': 'dict', 'extents': [writer.extent(column.codes.tobytes()),
+                                                writer.extent(json.dumps(column.dictionary).encode())]}
+    return {'encoding': ENCODINGS[type(column)],
+            'extents': [writer.extent(column.data.tobytes()), writer.extent(bytes(column.kinds))]}
+
+
+def write(path, db, extra=None):
+    """Write db (every table is decoded first) to path atomically; extra: JSON metadata kept alongside"""
+    writer = _Writer()
+    tables = {}
+    for name, table in db.tables.items():
+        records = list(db._rows(name))
+        meta = {key: value for key, value in table.items() if key != 'records'}
+        entry = {'meta': meta, 'rows': len(records)}
+        if name in db.stores:
+            store = db.stores[name]
+            positions = [r.pos for r in records]
+            columns = store.columns if positions == list(range(len(store))) else \
+                {col: column.take(positions) for col, column in store.columns.items()}
+        else:
+            columns = _row_columns(table, records)
+        if columns is None:
+            entry['json'] = writer.extent(json.dumps(records).encode())
+        else:
+            entry['columns'] = {col: _write_column(writer, column) for col, column in columns.items()}
+        position = {id(r): i for i, r in enumerate(records)}
+        entry['orders'] = {col: writer.extent(array('I', [position[id(r)] for r in index.records]).tobytes())
+                           for col, index in db.indexes[name].items() if hasattr(index, 'load_sorted')}
+        tables[name] = entry
+    catalog = {'name': db.name, 'owner': db.owner, 'created_at': db.created_at, 'lsn': db.lsn,
+               'byteorder': sys.byteorder, 'tables': tables, 'extra': extra or {}}
+    page, length = writer.extent(json.dumps(catalog).encode())
+    writer.image[:HEADER.size] = HEADER.pack(MAGIC, VERSION, PAGE_SIZE, page, length)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(writer.image)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class LazyTables(dict):
+    """A per-table dict of a Database (tables, indexes, slots, stores) whose entries for
+    tables still in the file are decoded on first lookup. Only `tables` (names=True) lists
+    undecoded tables by name without decoding them."""
+    def __init__(self, pending, load, names=False):
+        super().__init__()
+        self.pending = pending
+        self.load = load
+        self.names = names
+
+    def _need(self, key):
+        if key in self.pending:
+            self.load(key)
+
+    def _need_all(self):
+        for key in list(self.pending):
+            self.load(key)
+
+    def __missing__(self, key):
+        self.load(key)
+        return dict.__getitem__(self, key)
+
+    def __contains__(self, key):
+        self._need(key)
+        return dict.__contains__(self, key)
+
+    def get(self, key, default=None):
+        self._need(key)
+        return dict.get(self, key, default)
+
+    def pop(self, key, *default):
+        self._need(key)
+        return dict.pop(self, key, *default)
+
+    def __delitem__(self, key):
+        self._need(key)
+        dict.__delitem__(self, key)
+
+    def keys(self):
+        if self.names: return list(dict.keys(self)) + [k for k in self.pending if not dict.__contains__(self, k)]
+        self._need_all()
+        return dict.keys(self)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def items(self):
+        self._need_all()
+        return dict.items(self)
+
+    def values(self):
+        self._need_all()
+        return dict.values(self)
+
+
+def _buffer(view, extent, typecode, byteorder):
+    values = array(typecode)
+    first, length = extent
+    values.frombytes(view[first * PAGE_SIZE:first * PAGE_SIZE + length])
+    if byteorder != sys.byteorder:
+        values.byteswap()
+    return values
+
+
+def _read_column(view, spec, byteorder):
+    """Column object for a columnar table"""
+    data, extra = spec['extents']
+    if spec['encoding'] == 'dict':
+        first, length = extra
+        dictionary = json.loads(bytes(view[first * PAGE_SIZE:first * PAGE_SIZE + length]))
+        return columnar.DictColumn.from_codes(_buffer(view, data, 'I', byteorder), dictionary)
+    column = TYPED[spec['encoding']]()
+    column.data = _buffer(view, data, column.typecode, byteorder)
+    first, length = extra
+    column.kinds = bytearray(view[first * PAGE_SIZE:first * PAGE_SIZE + length])
+    return column
+
+
+def _column_values(column):
+    """Python values of a column for a row table, decoded a buffer at a time"""
+    if isinstance(column, columnar.DictColumn):
+        return list(map(column.dictionary.__getitem__, column.codes))
+    values = column.data.tolist()
+    kinds = column.kinds
+    if columnar.INTEGRAL in kinds:
+        values = [int(v) if k == columnar.INTEGRAL else v for v, k in zip(values, kinds)]
+    if columnar.NULL in kinds:
+        values = [v if k else None for v, k in zip(values, kinds)]
+    return values
+
+
+class PageFile:
+    """An open .sdb file: the catalog plus the map the tables are decoded from"""
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, page_size, page, length = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION or page_size != PAGE_SIZE:
+            self.close()
+            raise ValueError(f"'{path}' is not a version {VERSION} database page file")
+        self.catalog = json.loads(self.map[page * page_size:page * page_size + length])
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def load_table(self, db, name):
+        """Decode one table into db's tables/stores/slots/indexes"""
+        entry = self.catalog['tables'][name]
+        byteorder = self.catalog['byteorder']
+        view = memoryview(self.map)
+        try:
+            table = dict(entry['meta'])
+            if 'json' in entry:
+                first, length = entry['json']
+                records = json.loads(bytes(view[first * PAGE_SIZE:first * PAGE_SIZE + length]))
+            else:
+                columns = {col: _read_column(view, spec, byteorder) for col, spec in entry['columns'].items()}
+                if table.get('storage') == 'columnar':
+                    store = columnar.ColumnStore()
+                    store.columns, store.length = columns, entry['rows']
+                    records = [columnar.Row(store, i) for i in range(store.length)]
+                    dict.__setitem__(db.stores, name, store)
+                elif columns:
+                    fields = list(columns)
+                    records = [dict(zip(fields, row)) for row in zip(*map(_column_values, columns.values()))]
+                else:
+                    records = []
+            orders = {col: _buffer(view, extent, 'I', byteorder) for col, extent in entry.get('orders', {}).items()}
+        finally:
+            view.release()
+        table['records'] = records
+        dict.__setitem__(db.tables, name, table)
+        db._build_slots(name)
+        db._build_indexes(name, orders)
+
+
+def open_database(path):
+    """(Database whose tables decode lazily from the mapped file, extra metadata)"""
+    pages = PageFile(path)
+    catalog = pages.catalog
+    db = database.Database(catalog['name'], catalog['owner'])
+    db.created_at = catalog['created_at']
+    db.lsn = catalog['lsn']
+    pending = set(catalog['tables'])
+    loading = set()
+    lock = threading.RLock()  # concurrent readers (sessions sharing a read lock) decode a table once
+
+    def load(name):
+        with lock:
+            # The decoding thread looks its own table up again (slots, indexes): let it through
+            if name not in pending or name in loading: return
+            loading.add(name)
+            try:
+                pages.load_table(db, name)
+            finally:
+                loading.discard(name)
+            pending.discard(name)
+            if not pending:
+                pages.close()
+
+    if pending:
+        db.tables = LazyTables(pending, load, names=True)
+        db.indexes, db.slots, db.stores = (LazyTables(pending, load) for _ in range(3))
+    else:
+        pages.close()
+    return db, catalog['extra']
+
+
+def read_json(path):
+    """Contents of a .json database snapshot: {'database', 'owner', 'password_hash'}. Older
+    files hold the bare database dict (name, owner, tables, created_at) and are wrapped."""
+    with open(path) as f:
+        data = json.load(f)
+    if 'database' not in data and 'tables' in data:
+        data = {'database': data, 'owner': data['owner']}
+    return data
+
+
+def convert(data_dir):
+    """Write a .sdb page file next to every database .json snapshot in data_dir (the .json is kept)"""
+    converted = []
+    for filename in sorted(os.listdir(data_dir)):
+        if not filename.endswith('.json') or filename == 'users.json':
+            continue
+        data = read_json(os.path.join(data_dir, filename))
+        db = database.Database.from_dict(data['database'])
+        target = os.path.join(data_dir, filename[:-len('.json')] + '.sdb')
+        write(target, db, {'owner': data['owner'], 'password_hash': data.get('password_hash')})
+        converted.append(target)
+    return converted
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] != 'convert':
+        sys.exit(__doc__.strip().splitlines()[-1].strip())
+    for target in convert(sys.argv[2] if len(sys.argv) > 2 else 'structdb_data'):
+        print(f"Wrote {target}")
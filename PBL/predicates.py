@@ -0,0 +1,119 @@
+"""
+predicates.py
+Compiles WHERE condition lists into specialised Python functions
+
+A condition list [(column, op, value), ...] (all ANDed) becomes one generated
+function with the comparisons inlined, so a full scan no longer walks the
+condition list and an if-chain of operators for every row. Comparison rules
+are the same as Database._evaluate_where: numeric when both sides parse as
+numbers, otherwise as strings. (col, 'IN', [values]) tests membership with the
+same rules, and (None, 'OR', [condition lists]) matches when any branch does.
+
+Generated code only depends on the *shape* of the clause (columns, operators
+and whether each constant is numeric); the shape is compiled once and cached,
+and constants are bound per query after being coerced a single time.
+"""
+
+OPERATORS = {'=': '==', '!=': '!=', '>': '>', '<': '<', '>=': '>=', '<=': '<='}
+
+_factories = {}
+
+
+def _coerce(value):
+    """Pre-coerce a constant once: (float or None, text form)"""
+    try:
+        number = float(value)
+    except Exception:
+        number = None
+    return number, str(value)
+
+
+def _build_factory(shape):
+    params = []
+    lines = ["    def predicate(r):"]
+    for i, (col, op, numeric) in enumerate(shape):
+        if op == 'OR':
+            params.append(f"p{i}")
+            lines += [f"        for p in p{i}:",
+                      f"            if p(r): break",
+                      f"        else:",
+                      f"            return False"]
+            continue
+        lines.append(f"        v = r.get({col!r})")
+        if op == 'IN':
+            # n: numeric constants as floats, t: text of the non-numeric ones, a: text of all
+            params += [f"n{i}", f"t{i}", f"a{i}"]
+            test = f"x not in n{i} and str(v) not in t{i}" if numeric else f"x not in n{i}"
+            lines += [f"        try:",
+                      f"            x = float(v)",
+                      f"        except Exception:",
+                      f"            if (v if v.__class__ is str else str(v)) not in a{i}: return False",
+                      f"        else:",
+                      f"            if {test}: return False"]
+            continue
+        py_op = OPERATORS[op]
+        if numeric:
+            params += [f"n{i}", f"s{i}"]
+            fallback = [
+                f"try:",
+                f"    x = float(v)",
+                f"except Exception:",
+                f"    if not (str(v) {py_op} s{i}): return False",
+                f"else:",
+                f"    if not (x {py_op} n{i}): return False",
+            ]
+            if op in ('=', '!='):
+                # '5' == 5.0 is False in Python, so only real numbers take the direct path
+                lines += [f"        if v.__class__ is int or v.__class__ is float:",
+                          f"            if not (v {py_op} n{i}): return False",
+                          f"        else:"]
+            else:
+                # Ordering a number against text/None raises TypeError: fall back then
+                lines += [f"        try:",
+                          f"            if not (v {py_op} n{i}): return False",
+                          f"        except TypeError:"]
+            lines += ["            " + line for line in fallback]
+        else:
+            # A non-numeric constant always compares as text
+            params.append(f"s{i}")
+            lines.append(f"        if not ((v if v.__class__ is str else str(v)) {py_op} s{i}): return False")
+    lines.append("        return True")
+    lines.append("    return predicate")
+    source = f"def factory({', '.join(params)}):\n" + "\n".join(lines) + "\n"
+    namespace = {}
+    exec(compile(source, '<where>', 'exec'), namespace)
+    return namespace['factory']
+
+
+def compile_where(where_clause):
+    """Return a function record -> bool for an AND-ed condition list (None/empty matches all)"""
+    if not where_clause:
+        return lambda r: True
+    shape = []
+    args = []
+    for col, op, val in where_clause:
+        if op == 'OR':
+            shape.append((None, op, len(val)))
+            args.append(tuple(compile_where(branch) for branch in val))
+            continue
+        if op == 'IN':
+            coerced = [_coerce(v) for v in val]
+            texts = frozenset(text for number, text in coerced if number is None)
+            shape.append((col, op, bool(texts)))
+            args += [frozenset(number for number, _ in coerced if number is not None),
+                     texts, frozenset(text for _, text in coerced)]
+            continue
+        if op not in OPERATORS:
+            raise ValueError(f"Unsupported operator '{op}'")
+        number, text = _coerce(val)
+        shape.append((col, op, number is not None))
+        if number is not None:
+            args.append(number)
+        args.append(text)
+    shape = tuple(shape)
+    factory = _factories.get(shape)
+    if factory is None:
+        if len(_factories) >= 256:
+            _factories.clear()
+        factory = _factories[shape] = _build_factory(shape)
+    return factory(*args)
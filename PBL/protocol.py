@@ -0,0 +1,61 @@
+"""
+protocol.py
+Wire protocol shared by server.py and client.py: length-prefixed JSON frames
+
+Every message is a 4-byte big-endian length followed by that many bytes of
+UTF-8 JSON (one object). Requests carry an "id" the replies echo:
+  {"id": 1, "op": "login", "user": "admin", "password": "..."}
+  {"id": 2, "op": "query", "sql": "INSERT ..."}               -> one reply
+  {"id": 3, "op": "stream", "sql": "SELECT ...", "batch": 500} -> replies of up to 500 rows
+  {"op": "cancel", "target": 3}                                 -> ends stream 3 early (no reply of its own)
+  {"id": 4, "op": "ping"}
+Replies:
+  {"id": 2, "ok": true, "result": ..., "database": "admin_shop", "transaction": false}
+  {"id": 3, "ok": true, "rows": [...], "done": false}, ..., {"id": 3, "ok": true, "rows": [...], "done": true, ...}
+  {"id": 2, "ok": false, "error": "Table 't' does not exist", "kind": "ValueError"}
+The last reply to a request (any reply with "ok": false, or with "done" unset or
+true) also reports the session's current database and whether it is inside a
+transaction. A connection runs its requests in order, so a client may send
+several before reading any reply (pipelining).
+"""
+
+import json
+import struct
+
+HEADER = struct.Struct('>I')
+MAX_FRAME = 64 * 1024 * 1024  # bytes of JSON in one message
+DEFAULT_PORT = 6543
+DEFAULT_BATCH = 500  # rows per reply of a stream
+
+
+def encode(message):
+    """Frame bytes of one message (values JSON cannot hold are sent as text)"""
+    data = json.dumps(message, default=str).encode()
+    if len(data) > MAX_FRAME: raise ValueError(f"Message of {len(data)} bytes exceeds {MAX_FRAME}")
+    return HEADER.pack(len(data)) + data
+
+
+def decode_length(header):
+    (length,) = HEADER.unpack(header)
+    if length > MAX_FRAME: raise ValueError(f"Frame of {length} bytes exceeds {MAX_FRAME}")
+    return length
+
+
+async def read_frame(reader):
+    """Next message from an asyncio StreamReader; None once the peer has closed"""
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except EOFError as e:  # asyncio.IncompleteReadError
+        if e.partial: raise ConnectionError("Connection closed mid-frame")
+        return None
+    return json.loads(await reader.readexactly(decode_length(header)))
+
+
+def recv_frame(stream):
+    """Next message from a binary file object (socket.makefile('rb'))"""
+    header = stream.read(HEADER.size)
+    if len(header) < HEADER.size: raise ConnectionError("Connection closed by the server")
+    length = decode_length(header)
+    data = stream.read(length)
+    if len(data) < length: raise ConnectionError("Connection closed mid-frame")
+    return json.loads(data)
@@ -1,250 +1,81 @@
 import re
 
+# One pass over the text: every token is (kind, text, KEY, position); KEY is the
+# upper-cased text for words so keyword checks never re-scan the query.
+TOKEN_RE = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<string>'(?:[^']|'')*'|"(?:[^"]|"")*")
+  | (?P<op><=|>=|!=|<>|=|<|>)
+  | (?P<punct>[(),*;?])
+  | (?P<word>[^\s,()'"=<>!;*?]+)
+""", re.VERBOSE)
+
+IDENT_RE = re.compile(r'\w+$')
+COLUMN_RE = re.compile(r'\w+(\.\w+)?$')  # column, or table.column / alias.column
+CLAUSES = ('WHERE', 'GROUP', 'HAVING', 'ORDER', 'LIMIT', 'JOIN', 'INNER', 'LEFT', 'ON')
+AGGREGATES = ('COUNT', 'SUM', 'AVG', 'MIN', 'MAX')
+COMPARISONS = {'=': '=', '!=': '!=', '<>': '!=', '>': '>', '<': '<', '>=': '>=', '<=': '<='}
+
+
+class Placeholder:
+    """A `?` parameter in a prepared statement, filled in by QueryParser.bind"""
+    __slots__ = ('index',)
+
+    def __init__(self, index):
+        self.index = index
+
+    def __repr__(self):
+        return '?'
+
+
+def tokenize(text):
+    tokens = []
+    pos = 0
+    end = len(text)
+    match = TOKEN_RE.match
+    while pos < end:
+        m = match(text, pos)
+        if m is None:
+            raise ValueError(f"Unexpected character {text[pos]!r} at position {pos}")
+        kind = m.lastgroup
+        if kind != 'space':
+            tok = m.group()
+            tokens.append((kind, tok, tok.upper() if kind == 'word' else tok, pos))
+        pos = m.end()
+    return tokens
+
+
 class QueryParser:
-    """SQL-like query parser with support for DDL, DML, TCL, DCL and Constraints"""
-    
+    """SQL-like query parser with support for DDL, DML, TCL, DCL and Constraints
+
+    A single-pass tokenizer feeds a recursive-descent parser. WHERE clauses are
+    parsed into an expression tree (supporting AND, OR, parentheses, IN and
+    BETWEEN) and lowered to the condition lists the engine consumes:
+    [(column, op, value), ...] ANDed together, where op may also be 'IN'
+    (value is a list) or 'OR' (column is None, value is a list of condition lists).
+    """
+
     @staticmethod
     def parse(query):
-        """Parse SQL-like query"""
-        query = query.strip().rstrip(';')
-        
-        # --- TCL COMMANDS ---
-        if query.upper() in ('START TRANSACTION', 'BEGIN'):
-            return {'type': 'START_TRANSACTION'}
-        if query.upper() == 'COMMIT':
-            return {'type': 'COMMIT'}
-        if query.upper() == 'ROLLBACK':
-            return {'type': 'ROLLBACK'}
-
-        # --- DCL COMMANDS ---
-        if query.upper().startswith('GRANT'):
-            match = re.match(r'GRANT\s+(\w+)\s+TO\s+(\w+)', query, re.IGNORECASE)
-            if match:
-                return {'type': 'GRANT', 'role': match.group(1), 'user': match.group(2)}
-        
-        if query.upper().startswith('REVOKE'):
-            match = re.match(r'REVOKE\s+(\w+)\s+FROM\s+(\w+)', query, re.IGNORECASE)
-            if match:
-                return {'type': 'REVOKE', 'role': match.group(1), 'user': match.group(2)}
-
-        # --- DDL COMMANDS ---
-        if query.upper().startswith('CREATE DATABASE'):
-            match = re.match(r'CREATE DATABASE\s+(\w+)', query, re.IGNORECASE)
-            if match:
-                return {'type': 'CREATE_DATABASE', 'database': match.group(1)}
-        
-        if query.upper().startswith('DROP DATABASE'):
-            match = re.match(r'DROP DATABASE\s+(\w+)', query, re.IGNORECASE)
-            if match:
-                return {'type': 'DROP_DATABASE', 'database': match.group(1)}
-        
-        if query.upper().startswith('USE'):
-            match = re.match(r'USE\s+(\w+)', query, re.IGNORECASE)
-            if match:
-                return {'type': 'USE_DATABASE', 'database': match.group(1)}
-        
-        if re.match(r'SHOW\s+DATABASES', query, re.IGNORECASE):
-            return {'type': 'SHOW_DATABASES'}
-        
-        if re.match(r'SHOW\s+TABLES', query, re.IGNORECASE):
-            return {'type': 'SHOW_TABLES'}
-        
-        if query.upper().startswith(('DESC ', 'DESCRIBE ')):
-            match = re.match(r'(?:DESCRIBE|DESC)\s+(\w+)', query, re.IGNORECASE)
-            if match:
-                return {'type': 'DESCRIBE_TABLE', 'table': match.group(1)}
-        
-        # CREATE TABLE
-        if query.upper().startswith('CREATE TABLE'):
-            match = re.match(r'CREATE TABLE\s+(\w+)\s*\((.*)\)', query, re.IGNORECASE | re.DOTALL)
-            if match:
-                table_name = match.group(1)
-                columns_str = match.group(2)
-                columns_data = QueryParser._parse_column_definitions(columns_str)
-                if not columns_data:
-                    raise ValueError("CREATE TABLE must define at least one column.")
-                return {'type': 'CREATE_TABLE', 'table': table_name, 'columns': columns_data}
-        
-        # DROP TABLE
-        if query.upper().startswith('DROP TABLE'):
-            match = re.match(r'DROP TABLE\s+(\w+)', query, re.IGNORECASE)
-            if match:
-                return {'type': 'DROP_TABLE', 'table': match.group(1)}
-        
-        # TRUNCATE TABLE
-        if query.upper().startswith('TRUNCATE TABLE'):
-            match = re.match(r'TRUNCATE TABLE\s+(\w+)', query, re.IGNORECASE)
-            if match:
-                return {'type': 'TRUNCATE_TABLE', 'table': match.group(1)}
-
-        # ALTER TABLE (ADD COLUMN)
-        if query.upper().startswith('ALTER TABLE'):
-            match = re.match(r'ALTER TABLE\s+(\w+)\s+ADD\s+(.+)', query, re.IGNORECASE)
-            if match:
-                table_name = match.group(1)
-                col_def_str = match.group(2)
-                column_def = QueryParser._parse_single_column(col_def_str)
-                return {'type': 'ALTER_TABLE', 'table': table_name, 'column_def': column_def}
-        
-        # --- DML COMMANDS ---
-        if query.upper().startswith('INSERT'):
-            return QueryParser._parse_insert(query)
-        if query.upper().startswith('SELECT'):
-            return QueryParser._parse_select(query)
-        if query.upper().startswith('UPDATE'):
-            return QueryParser._parse_update(query)
-        if query.upper().startswith('DELETE'):
-            return QueryParser._parse_delete(query)
-        
-        raise ValueError("Invalid query syntax")
-    
-    @staticmethod
-    def _parse_insert(query):
-        match = re.match(r'INSERT\s+INTO\s+(\w+)\s+VALUES\s*(.+)', query, re.IGNORECASE | re.DOTALL)
-        if not match:
-            raise ValueError("Invalid INSERT syntax")
-        table_name = match.group(1)
-        values_section = match.group(2).strip()
-        all_values = QueryParser._parse_multiple_value_sets(values_section)
-        if not all_values:
-            raise ValueError("No values provided for INSERT")
-        return {'type': 'INSERT', 'table': table_name, 'values_list': all_values}
-    
-    @staticmethod
-    def _parse_multiple_value_sets(values_section):
-        all_values = []
-        current_set = ''
-        paren_level = 0
-        in_quotes = False
-        quote_char = None
-        for char in values_section:
-            if char in ('"', "'") and (quote_char is None or quote_char == char):
-                if in_quotes and quote_char == char:
-                    in_quotes = False
-                    quote_char = None
-                elif not in_quotes:
-                    in_quotes = True
-                    quote_char = char
-            if not in_quotes:
-                if char == '(':
-                    paren_level += 1
-                    if paren_level == 1:
-                        current_set = ''
-                        continue
-                elif char == ')':
-                    paren_level -= 1
-                    if paren_level == 0:
-                        if current_set.strip():
-                            values = QueryParser._parse_values(current_set)
-                            all_values.append(values)
-                        current_set = ''
-                        continue
-                elif char == ',' and paren_level == 0:
-                    continue
-            if paren_level > 0:
-                current_set += char
-        return all_values
-    
-    @staticmethod
-    def _parse_select(query):
-        # Improved Regex to handle SELECT col, AGG(col) FROM ... GROUP BY col
-        # Capture groups: 1=OptCol, 2=Func, 3=AggCol, 4=Table, 5=Where, 6=GroupBy, 7=Order, 8=Limit
-        agg_match = re.match(r'SELECT\s+(?:(\w+)\s*,\s*)?(COUNT|SUM|AVG|MIN|MAX)\((\*|\w+)\)\s+FROM\s+(\w+)(?:\s+WHERE\s+(.+?))?(?:\s+GROUP\s+BY\s+(\w+))?(?:\s+ORDER\s+BY\s+(.+?))?(?:\s+LIMIT\s+(\d+))?$', query, re.IGNORECASE | re.DOTALL)
-        
-        if agg_match:
-            leading_col, function, column, table, where_str, group_by_col, order_str, limit_str = agg_match.groups()
-            
-            where_clause = QueryParser._parse_where(where_str) if where_str else None
-            
-            return {
-                'type': 'AGGREGATE', 
-                'function': function.upper(), 
-                'column': column if column != '*' else None, 
-                'table': table, 
-                'where': where_clause,
-                'group_by': group_by_col
-            }
-
-        # Standard SELECT (Fallback)
-        match = re.match(r'SELECT\s+(.+?)\s+FROM\s+(\w+)(?:\s+WHERE\s+(.+?))?(?:\s+ORDER\s+BY\s+(.+?))?(?:\s+LIMIT\s+(\d+))?$', query, re.IGNORECASE | re.DOTALL)
-        if match:
-            columns_str, table, where_str, order_str, limit_str = match.groups()
-            columns = [col.strip() for col in columns_str.split(',')] if columns_str != '*' else None
-            where_clause = QueryParser._parse_where(where_str) if where_str else None
-            order_by = QueryParser._parse_order_by(order_str) if order_str else None
-            limit = int(limit_str) if limit_str else None
-            return {'type': 'SELECT', 'columns': columns, 'table': table, 'where': where_clause, 'order_by': order_by, 'limit': limit}
-        
-        raise ValueError("Invalid SELECT syntax")
-    
-    @staticmethod
-    def _parse_update(query):
-        match = re.match(r'UPDATE\s+(\w+)\s+SET\s+(.+?)\s+WHERE\s+(.+?)$', query, re.IGNORECASE | re.DOTALL)
-        if match:
-            table, set_str, where_str = match.groups()
-            set_clause = QueryParser._parse_set(set_str)
-            where_clause = QueryParser._parse_where(where_str)
-            return {'type': 'UPDATE', 'table': table, 'set': set_clause, 'where': where_clause}
-        raise ValueError("Invalid UPDATE syntax - missing WHERE clause")
-    
-    @staticmethod
-    def _parse_delete(query):
-        match = re.match(r'DELETE\s+FROM\s+(\w+)\s+WHERE\s+(.+?)$', query, re.IGNORECASE | re.DOTALL)
-        if match:
-            table, where_str = match.groups()
-            where_clause = QueryParser._parse_where(where_str)
-            return {'type': 'DELETE', 'table': table, 'where': where_clause}
-        raise ValueError("Invalid DELETE syntax - missing WHERE clause")
-    
-    @staticmethod
-    def _parse_where(where_str):
-        if not where_str: return None
-        conditions = []
-        parts = re.split(r'\s+AND\s+', where_str.strip(), flags=re.IGNORECASE)
-        for part in parts:
-            match = re.match(r'(\w+)\s*(=|!=|>|<|>=|<=)\s*(.+)', part.strip())
-            if match:
-                column, operator, value = match.groups()
-                value = QueryParser._clean_value(value.strip())
-                conditions.append((column, operator, value))
-        return conditions
-    
-    @staticmethod
-    def _parse_set(set_str):
-        set_clause = {}
-        parts = re.split(r',\s*(?=\w+\s*=)', set_str.strip())
-        for part in parts:
-            match = re.match(r'(\w+)\s*=\s*(.+)', part.strip())
-            if match:
-                column, value = match.groups()
-                set_clause[column] = QueryParser._clean_value(value.strip())
-        return set_clause
-    
+        """Parse SQL-like query; 'param_count' holds the number of `?` placeholders, if any"""
+        return _Parser(query.strip().rstrip(';')).statement()
+
     @staticmethod
-    def _parse_order_by(order_str):
-        match = re.match(r'(\w+)\s*(ASC|DESC)?', order_str.strip(), re.IGNORECASE)
-        if match:
-            column, direction = match.groups()
-            return (column, direction.upper() if direction else 'ASC')
-        return None
+    def normalize(query):
+        """Canonical text of a query for cache keys: whitespace-insensitive, literals untouched"""
+        return ' '.join(tok[1] for tok in tokenize(query.strip().rstrip(';')))
 
     @staticmethod
-    def _parse_column_definitions(columns_str):
-        definitions = []
-        current_def = ''
-        paren_level = 0
-        for char in columns_str:
-            if char == '(': paren_level += 1
-            elif char == ')': paren_level -= 1
-            if char == ',' and paren_level == 0:
-                if current_def.strip():
-                    definitions.append(QueryParser._parse_single_column(current_def.strip()))
-                current_def = ''
-            else:
-                current_def += char
-        if current_def.strip():
-            definitions.append(QueryParser._parse_single_column(current_def.strip()))
-        return definitions
+    def bind(parsed, params):
+        """Copy of a parsed statement with its placeholders replaced by params"""
+        expected = parsed.get('param_count', 0)
+        if len(params) != expected:
+            raise ValueError(f"Statement expects {expected} parameter(s), got {len(params)}")
+        if not expected:
+            return parsed
+        bound = _substitute(parsed, params)
+        del bound['param_count']
+        return bound
 
     @staticmethod
     def _parse_single_column(col_def_str):
@@ -281,29 +112,6 @@ class QueryParser:
         if not data_type: data_type = 'TEXT'
         return {'name': name, 'definition': col_def_str, 'type': data_type, 'constraints': constraints}
 
-    @staticmethod
-    def _parse_values(values_str):
-        values = []
-        current = ''
-        in_quotes = False
-        quote_char = None
-        for char in values_str:
-            if char in ('"', "'") and (quote_char is None or quote_char == char):
-                if in_quotes and quote_char == char:
-                    in_quotes = False
-                    quote_char = None
-                elif not in_quotes:
-                    in_quotes = True
-                    quote_char = char
-                continue
-            elif char == ',' and not in_quotes:
-                if current.strip(): values.append(QueryParser._clean_value(current.strip()))
-                current = ''
-                continue
-            current += char
-        if current.strip(): values.append(QueryParser._clean_value(current.strip()))
-        return values
-    
     @staticmethod
     def _clean_value(value):
         value = str(value).strip()
@@ -314,4 +122,481 @@ class QueryParser:
             if '.' in value: return float(value)
             return int(value)
         except ValueError:
-            return value
\ No newline at end of file
+            return value
+
+
+class _Parser:
+    """Recursive-descent parser over the token list of one statement"""
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.pos = 0
+        self.param_count = 0
+        self.allow_aggregates = False
+
+    # --- Token helpers ---
+    def peek(self, offset=0):
+        i = self.pos + offset
+        return self.tokens[i] if i < len(self.tokens) else None
+
+    def at(self, *keys):
+        for offset, key in enumerate(keys):
+            tok = self.peek(offset)
+            if tok is None or tok[2] != key:
+                return False
+        return True
+
+    def accept(self, *keys):
+        if self.at(*keys):
+            self.pos += len(keys)
+            return True
+        return False
+
+    def expect(self, *keys):
+        if not self.accept(*keys):
+            self.error(f"expected {' '.join(keys)}")
+
+    def error(self, message):
+        tok = self.peek()
+        near = f" near '{tok[1]}'" if tok else " at end of query"
+        raise ValueError(f"Invalid {self.statement_name} syntax: {message}{near}")
+
+    def ident(self):
+        tok = self.peek()
+        if tok is None or tok[0] != 'word' or not IDENT_RE.match(tok[1]):
+            self.error("expected a name")
+        self.pos += 1
+        return tok[1]
+
+    def literal(self):
+        tok = self.peek()
+        if tok is None:
+            self.error("expected a value")
+        kind, text = tok[0], tok[1]
+        self.pos += 1
+        if kind == 'string':
+            quote = text[0]
+            return text[1:-1].replace(quote * 2, quote)
+        if kind == 'word':
+            return QueryParser._clean_value(text)
+        if text == '?':
+            self.param_count += 1
+            return Placeholder(self.param_count - 1)
+        self.pos -= 1
+        self.error("expected a value")
+
+    def integer(self):
+        tok = self.peek()
+        if tok is None or tok[0] != 'word' or not tok[1].isdigit():
+            self.error("expected a number")
+        self.pos += 1
+        return int(tok[1])
+
+    def end(self):
+        if self.pos != len(self.tokens):
+            self.error("unexpected trailing input")
+
+    # --- Statements ---
+    def statement(self):
+        self.statement_name = 'query'
+        tok = self.peek()
+        handler = tok and tok[0] == 'word' and getattr(self, 'stmt_' + tok[2].lower(), None)
+        if not handler:
+            raise ValueError("Invalid query syntax")
+        self.statement_name = tok[2]
+        self.pos += 1
+        result = handler()
+        self.end()
+        if self.param_count:
+            result['param_count'] = self.param_count
+        return result
+
+    def stmt_start(self):
+        self.expect('TRANSACTION')
+        return {'type': 'START_TRANSACTION'}
+
+    def stmt_begin(self):
+        return {'type': 'START_TRANSACTION'}
+
+    def stmt_commit(self):
+        return {'type': 'COMMIT'}
+
+    def stmt_rollback(self):
+        if self.accept('TO'):
+            self.accept('SAVEPOINT')
+            return {'type': 'ROLLBACK', 'savepoint': self.ident()}
+        return {'type': 'ROLLBACK'}
+
+    def stmt_savepoint(self):
+        return {'type': 'SAVEPOINT', 'savepoint': self.ident()}
+
+    def stmt_release(self):
+        self.accept('SAVEPOINT')
+        return {'type': 'RELEASE_SAVEPOINT', 'savepoint': self.ident()}
+
+    def stmt_prepare(self):
+        name = self.ident()
+        if not self.accept('FROM'): self.expect('AS')
+        tok = self.peek()
+        if tok is None or tok[0] != 'string':
+            self.error("expected the statement as a quoted string")
+        return {'type': 'PREPARE', 'name': name, 'query': self.literal()}
+
+    def stmt_execute(self):
+        name = self.ident()
+        params = []
+        if self.accept('USING'):
+            params.append(self.literal())
+            while self.accept(','):
+                params.append(self.literal())
+        return {'type': 'EXECUTE', 'name': name, 'params': params}
+
+    def stmt_deallocate(self):
+        self.accept('PREPARE')
+        return {'type': 'DEALLOCATE', 'name': self.ident()}
+
+    def stmt_checkpoint(self):
+        return {'type': 'CHECKPOINT'}
+
+    def stmt_grant(self):
+        role = self.ident()
+        self.expect('TO')
+        return {'type': 'GRANT', 'role': role, 'user': self.ident()}
+
+    def stmt_revoke(self):
+        role = self.ident()
+        self.expect('FROM')
+        return {'type': 'REVOKE', 'role': role, 'user': self.ident()}
+
+    def stmt_use(self):
+        return {'type': 'USE_DATABASE', 'database': self.ident()}
+
+    def stmt_show(self):
+        if self.accept('DATABASES'): return {'type': 'SHOW_DATABASES'}
+        if self.accept('TABLES'): return {'type': 'SHOW_TABLES'}
+        self.error("expected DATABASES or TABLES")
+
+    def stmt_describe(self):
+        return {'type': 'DESCRIBE_TABLE', 'table': self.ident()}
+
+    stmt_desc = stmt_describe
+
+    def stmt_create(self):
+        if self.accept('DATABASE'):
+            return {'type': 'CREATE_DATABASE', 'database': self.ident()}
+        if self.accept('INDEX'):
+            index = self.ident()
+            self.expect('ON')
+            table = self.ident()
+            self.expect('(')
+            column = self.ident()
+            self.expect(')')
+            using = 'HASH'
+            if self.accept('USING'):
+                if self.accept('BTREE'): using = 'BTREE'
+                else: self.expect('HASH')
+            return {'type': 'CREATE_INDEX', 'index': index, 'table': table, 'column': column, 'using': using}
+        self.expect('TABLE')
+        table = self.ident()
+        columns = [QueryParser._parse_single_column(d) for d in self.column_definition_texts()]
+        if not columns:
+            raise ValueError("CREATE TABLE must define at least one column.")
+        storage = 'row'
+        if self.accept('STORAGE'):
+            self.accept('=')
+            if self.accept('COLUMNAR'): storage = 'columnar'
+            else: self.expect('ROW')
+        return {'type': 'CREATE_TABLE', 'table': table, 'columns': columns, 'storage': storage}
+
+    def column_definition_texts(self):
+        """Slice '( def, def(...), ... )' into the source text of each definition"""
+        self.expect('(')
+        texts = []
+        depth = 0
+        start = self.peek()[3] if self.peek() else len(self.text)
+        while True:
+            tok = self.peek()
+            if tok is None:
+                self.error("missing ')'")
+            if tok[1] == '(':
+                depth += 1
+            elif tok[1] == ')' and depth:
+                depth -= 1
+            elif tok[1] in (',', ')') and tok[0] == 'punct':
+                texts.append(self.text[start:tok[3]].strip())
+                self.pos += 1
+                if tok[1] == ')':
+                    return [t for t in texts if t]
+                start = self.peek()[3] if self.peek() else len(self.text)
+                continue
+            self.pos += 1
+
+    def stmt_drop(self):
+        if self.accept('DATABASE'):
+            return {'type': 'DROP_DATABASE', 'database': self.ident()}
+        if self.accept('INDEX'):
+            index = self.ident()
+            table = self.ident() if self.accept('ON') else None
+            return {'type': 'DROP_INDEX', 'index': index, 'table': table}
+        self.expect('TABLE')
+        return {'type': 'DROP_TABLE', 'table': self.ident()}
+
+    def stmt_truncate(self):
+        self.expect('TABLE')
+        return {'type': 'TRUNCATE_TABLE', 'table': self.ident()}
+
+    def stmt_alter(self):
+        self.expect('TABLE')
+        table = self.ident()
+        self.expect('ADD')
+        self.accept('COLUMN')
+        tok = self.peek()
+        if tok is None:
+            self.error("expected a column definition")
+        column_def = QueryParser._parse_single_column(self.text[tok[3]:].strip())
+        self.pos = len(self.tokens)
+        return {'type': 'ALTER_TABLE', 'table': table, 'column_def': column_def}
+
+    def stmt_insert(self):
+        self.expect('INTO')
+        table = self.ident()
+        self.expect('VALUES')
+        tokens, literal = self.tokens, self.literal
+        n = len(tokens)
+        all_values = []
+        while self.pos < n and tokens[self.pos][1] == '(':
+            self.pos += 1
+            values = []
+            while True:
+                values.append(literal())
+                tok = tokens[self.pos] if self.pos < n else None
+                if tok is None:
+                    self.error("missing ')'")
+                self.pos += 1
+                if tok[1] == ')': break
+                if tok[1] != ',':
+                    self.pos -= 1
+                    self.error("expected ',' or ')'")
+            all_values.append(values)
+            if self.pos < n and tokens[self.pos][1] == ',':
+                self.pos += 1
+        if not all_values:
+            raise ValueError("No values provided for INSERT")
+        return {'type': 'INSERT', 'table': table, 'values_list': all_values}
+
+    def stmt_select(self):
+        columns, aggregates = self.select_list()
+        self.expect('FROM')
+        table, alias = self.table_ref()
+        joins = []
+        while self.at('JOIN') or self.at('INNER') or self.at('LEFT'):
+            kind = 'LEFT' if self.accept('LEFT') else 'INNER'
+            if kind == 'LEFT': self.accept('OUTER')
+            else: self.accept('INNER')
+            self.expect('JOIN')
+            join_table, join_alias = self.table_ref()
+            self.expect('ON')
+            left = self.column_ref()
+            self.expect('=')
+            joins.append({'type': kind, 'table': join_table, 'alias': join_alias, 'on': (left, self.column_ref())})
+        where = self.where() if self.accept('WHERE') else None
+        group_by = None
+        if self.accept('GROUP', 'BY'):
+            if columns is None: self.error("GROUP BY cannot be used with SELECT *")
+            group_by = [self.column_ref()]
+            while self.accept(','):
+                group_by.append(self.column_ref())
+        grouped = bool(aggregates or group_by)
+        if grouped and joins: raise ValueError("Aggregate functions cannot be used with JOIN")
+        having = None
+        if self.accept('HAVING'):
+            if not grouped: self.error("HAVING requires GROUP BY or an aggregate function")
+            self.allow_aggregates = True
+            having = self.where()
+            self.allow_aggregates = False
+        order_by = None
+        if self.accept('ORDER', 'BY'):
+            order_by = []
+            while True:
+                column = (grouped and self.aggregate_call()) or self.column_ref()
+                direction = 'DESC' if self.accept('DESC') else 'ASC'
+                if direction == 'ASC': self.accept('ASC')
+                order_by.append((column, direction))
+                if not self.accept(','):
+                    break
+        limit = self.integer() if self.accept('LIMIT') else None
+        offset = self.integer() if limit is not None and self.accept('OFFSET') else 0
+
+        if joins:
+            return {'type': 'SELECT', 'columns': columns, 'table': table, 'alias': alias, 'joins': joins,
+                    'where': where, 'order_by': order_by, 'limit': limit, 'offset': offset}
+        # One table: `t.col` (or `alias.col`) is just col
+        names = (table, alias)
+        columns = columns and [_unqualify(c, names) for c in columns]
+        where = where and _unqualify_where(where, names)
+        order_by = order_by and [(_unqualify(column, names), direction) for column, direction in order_by]
+        if grouped:
+            group_by = group_by and [_unqualify(c, names) for c in group_by]
+            for column in columns:
+                if column not in (group_by or []):
+                    raise ValueError(f"Column '{column}' must appear in GROUP BY")
+            aggregates = [_unqualify(a, names) for a in aggregates]
+            having = having and _unqualify_where(having, names)
+            function, column = aggregates[0] if aggregates else (None, None)
+            return {'type': 'AGGREGATE', 'function': function, 'column': column, 'aggregates': aggregates,
+                    'table': table, 'where': where, 'group_by': group_by, 'having': having,
+                    'order_by': order_by, 'limit': limit, 'offset': offset}
+        return {'type': 'SELECT', 'columns': columns, 'table': table, 'where': where, 'order_by': order_by,
+                'limit': limit, 'offset': offset}
+
+    def stmt_explain(self):
+        if not self.accept('SELECT'): self.error("expected SELECT")
+        self.statement_name = 'SELECT'
+        return {'type': 'EXPLAIN', 'query': self.stmt_select()}
+
+    def table_ref(self):
+        """(table, alias) for `t`, `t alias` or `t AS alias` (alias defaults to the table name)"""
+        table = self.ident()
+        if self.accept('AS'):
+            return table, self.ident()
+        tok = self.peek()
+        if tok and tok[0] == 'word' and tok[2] not in CLAUSES and IDENT_RE.match(tok[1]):
+            self.pos += 1
+            return table, tok[1]
+        return table, table
+
+    def column_ref(self):
+        tok = self.peek()
+        if tok is None or tok[0] != 'word' or not COLUMN_RE.match(tok[1]):
+            self.error("expected a column name")
+        self.pos += 1
+        return tok[1]
+
+    def select_list(self):
+        """Returns (plain columns or None for *, [(function, column or None), ...])"""
+        if self.accept('*'):
+            return None, []
+        columns, aggregates = [], []
+        while True:
+            call = self.aggregate_call()
+            if call:
+                aggregates.append(call)
+            else:
+                columns.append(self.column_ref())
+            if not self.accept(','):
+                return columns, aggregates
+
+    def aggregate_call(self):
+        """(function, column or None) if an aggregate call like SUM(x) or COUNT(*) is next, else None"""
+        tok = self.peek()
+        if not (tok and tok[2] in AGGREGATES and self.peek(1) and self.peek(1)[1] == '('):
+            return None
+        self.pos += 2
+        column = None if self.accept('*') else self.column_ref()
+        self.expect(')')
+        return (tok[2], column)
+
+    def stmt_update(self):
+        table = self.ident()
+        self.expect('SET')
+        set_clause = {}
+        while True:
+            column = self.ident()
+            self.expect('=')
+            set_clause[column] = self.literal()
+            if not self.accept(','):
+                break
+        if not self.accept('WHERE'):
+            raise ValueError("Invalid UPDATE syntax - missing WHERE clause")
+        return {'type': 'UPDATE', 'table': table, 'set': set_clause, 'where': _unqualify_where(self.where(), (table,))}
+
+    def stmt_delete(self):
+        self.expect('FROM')
+        table = self.ident()
+        if not self.accept('WHERE'):
+            raise ValueError("Invalid DELETE syntax - missing WHERE clause")
+        return {'type': 'DELETE', 'table': table, 'where': _unqualify_where(self.where(), (table,))}
+
+    # --- WHERE expressions ---
+    def where(self):
+        return _lower(self.or_expr())
+
+    def or_expr(self):
+        terms = [self.and_expr()]
+        while self.accept('OR'):
+            terms.append(self.and_expr())
+        return terms[0] if len(terms) == 1 else ('OR', terms)
+
+    def and_expr(self):
+        terms = [self.predicate()]
+        while self.accept('AND'):
+            terms.append(self.predicate())
+        return terms[0] if len(terms) == 1 else ('AND', terms)
+
+    def predicate(self):
+        if self.accept('('):
+            expr = self.or_expr()
+            self.expect(')')
+            return expr
+        # HAVING compares aggregates too: their column is the (function, column) pair
+        column = (self.allow_aggregates and self.aggregate_call()) or self.column_ref()
+        tok = self.peek()
+        if tok and tok[0] == 'op':
+            self.pos += 1
+            return ('CMP', column, COMPARISONS[tok[1]], self.literal())
+        if self.accept('IN'):
+            self.expect('(')
+            values = [self.literal()]
+            while self.accept(','):
+                values.append(self.literal())
+            self.expect(')')
+            return ('IN', column, values)
+        if self.accept('BETWEEN'):
+            low = self.literal()
+            self.expect('AND')
+            return ('BETWEEN', column, low, self.literal())
+        self.error("expected a comparison, IN or BETWEEN")
+
+
+def _substitute(node, params):
+    if node.__class__ is Placeholder:
+        return params[node.index]
+    if node.__class__ is list:
+        return [_substitute(n, params) for n in node]
+    if node.__class__ is tuple:
+        return tuple(_substitute(n, params) for n in node)
+    if node.__class__ is dict:
+        return {k: _substitute(v, params) for k, v in node.items()}
+    return node
+
+
+def _unqualify(ref, names):
+    """`t.col` -> `col` when t is one of names (the table and its alias); aggregates (f, col) too"""
+    if ref.__class__ is tuple:
+        return (ref[0], ref[1] and _unqualify(ref[1], names))
+    if ref is None or '.' not in ref:
+        return ref
+    qualifier, column = ref.split('.', 1)
+    if qualifier not in names:
+        raise ValueError(f"Unknown table '{qualifier}' in '{ref}'")
+    return column
+
+
+def _unqualify_where(conditions, names):
+    return [(None, op, [_unqualify_where(branch, names) for branch in val]) if op == 'OR'
+            else (_unqualify(col, names), op, val) for col, op, val in conditions]
+
+
+def _lower(expr):
+    """Expression tree -> AND-ed condition list understood by the engine"""
+    kind = expr[0]
+    if kind == 'CMP':
+        return [expr[1:]]
+    if kind == 'IN':
+        return [(expr[1], 'IN', expr[2])]
+    if kind == 'BETWEEN':
+        return [(expr[1], '>=', expr[2]), (expr[1], '<=', expr[3])]
+    if kind == 'AND':
+        return [cond for term in expr[1] for cond in _lower(term)]
+    return [(None, 'OR', [_lower(term) for term in expr[1]])]
@@ -0,0 +1,175 @@
+"""
+server.py
+StructDB over TCP: an asyncio server sharing one DatabaseManager between clients
+
+Each connection is a Session of the manager (login with a users.json account
+first) and speaks the framed JSON protocol of protocol.py. Statements run on a
+thread of the connection's own, one after another in the order they arrived,
+while the event loop keeps reading requests (pipelining) and serving other
+connections. SELECTs sent as "stream" return their rows in batches as they
+are read, so the server never holds a large result in memory. A connection
+that drops inside a transaction is rolled back.
+
+Usage: python server.py [--host 127.0.0.1] [--port 6543] [--data-dir structdb_data]
+"""
+
+import argparse
+import asyncio
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+import database_manager
+import protocol
+
+PIPELINE_DEPTH = 64  # requests read ahead per connection before the server stops reading
+
+
+class _Connection:
+    """One client: its session, the requests read ahead and the streams it cancelled"""
+    def __init__(self, manager, reader, writer):
+        self.manager = manager
+        self.reader = reader
+        self.writer = writer
+        self.session = None
+        self.requests = asyncio.Queue(PIPELINE_DEPTH)
+        self.cancelled = set()
+        # One thread per connection: a session, and the locks a stream holds, stay on it
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def _call(self, fn, *args):
+        return asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def run(self):
+        worker = asyncio.create_task(self._work())
+        try:
+            while True:
+                message = await protocol.read_frame(self.reader)
+                if message is None: break
+                if message.get('op') == 'cancel':
+                    self.cancelled.add(message.get('target'))
+                    continue
+                await self.requests.put(message)
+        except (ConnectionError, ValueError):
+            pass  # dropped connection or a malformed frame: nothing more can be read
+        finally:
+            await self.requests.put(None)
+            await worker
+            await self._call(self._end_session)
+            self.executor.shutdown(wait=False)
+            self.writer.close()
+
+    def _end_session(self):
+        if self.session is not None and self.session.in_transaction:
+            self.session.execute_query("ROLLBACK")
+
+    async def _work(self):
+        broken = False
+        while True:
+            message = await self.requests.get()
+            if message is None: return
+            if broken: continue  # keep draining so the reader never blocks on a full queue
+            try:
+                await self._handle(message)
+            except ConnectionError:
+                broken = True
+
+    async def _reply(self, message, final=True):
+        if final and self.session is not None:
+            message['database'] = self.session.current_database
+            message['transaction'] = self.session.in_transaction
+        self.writer.write(protocol.encode(message))
+        await self.writer.drain()
+
+    async def _handle(self, message):
+        request_id, op = message.get('id'), message.get('op')
+        try:
+            if op == 'login':
+                self.session = await self._call(self.manager.connect, message.get('user'), message.get('password'))
+                result = f"Logged in as {message.get('user')}"
+            elif op == 'ping':
+                result = 'pong'
+            elif self.session is None:
+                raise PermissionError("Login required")
+            elif op == 'query':
+                result = await self._call(self.session.execute_query, message['sql'])
+            elif op == 'stream':
+                return await self._stream(request_id, message['sql'], message.get('batch') or protocol.DEFAULT_BATCH)
+            else:
+                raise ValueError(f"Unknown op '{op}'")
+        except ConnectionError:
+            raise
+        except Exception as e:
+            return await self._reply({'id': request_id, 'ok': False, 'error': str(e), 'kind': type(e).__name__})
+        await self._reply({'id': request_id, 'ok': True, 'result': result})
+
+    async def _stream(self, request_id, sql, batch):
+        rows = await self._call(self.session.stream_query, sql)
+        try:
+            while True:
+                chunk = await self._call(lambda: list(itertools.islice(rows, batch)))
+                done = len(chunk) < batch or request_id in self.cancelled
+                await self._reply({'id': request_id, 'ok': True, 'rows': chunk, 'done': done}, final=done)
+                if done: return
+        finally:
+            self.cancelled.discard(request_id)
+            await self._call(rows.close)
+
+
+class Server:
+    """Serves a DatabaseManager on host:port (port 0: any free port, see .port once started)"""
+    def __init__(self, manager, host='127.0.0.1', port=protocol.DEFAULT_PORT):
+        self.manager = manager
+        self.host = host
+        self.port = port
+        self.server = None
+        self.connections = set()  # tasks serving the open connections
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        if self.server is None: await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def stop(self):
+        """Stop accepting connections and wait for the open ones to end"""
+        self.server.close()
+        await self.server.wait_closed()
+        if self.connections:
+            await asyncio.wait(self.connections)
+
+    async def _serve(self, reader, writer):
+        task = asyncio.current_task()
+        self.connections.add(task)
+        try:
+            await _Connection(self.manager, reader, writer).run()
+        finally:
+            self.connections.discard(task)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=protocol.DEFAULT_PORT)
+    parser.add_argument('--data-dir', default='structdb_data')
+    parser.add_argument('--storage-format', default='json', choices=('json', 'pages'))
+    args = parser.parse_args()
+    manager = database_manager.DatabaseManager(args.data_dir, storage_format=args.storage_format)
+    server = Server(manager, args.host, args.port)
+
+    async def serve():
+        await server.start()
+        print(f"StructDB serving {args.data_dir} on {args.host}:{server.port}")
+        await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
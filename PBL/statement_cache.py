@@ -0,0 +1,67 @@
+"""
+statement_cache.py
+LRU cache of parsed statements, keyed by (database, normalised query text)
+"""
+
+import threading
+from collections import OrderedDict
+
+# Only DML is cached: it is what repeats, and its parsed form is never mutated by execution
+CACHEABLE = ('SELECT', 'AGGREGATE', 'INSERT', 'UPDATE', 'DELETE')
+MAX_KEY_LENGTH = 4096  # bulk INSERTs are parsed once and never repeat verbatim
+
+
+class StatementCache:
+    """Least-recently-used cache with hit/miss counters
+
+    Entries remember the tables they read or write (JOINed ones included), so
+    DDL on one of them (or dropping its database) drops them. Safe to share
+    between sessions in different threads.
+    """
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        with self.lock:
+            parsed = self.entries.get(key)
+            if parsed is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return parsed
+
+    def put(self, key, parsed):
+        if self.capacity <= 0 or parsed['type'] not in CACHEABLE:
+            return
+        with self.lock:
+            self.entries[key] = parsed
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, database, table=None):
+        """Drop entries for `table` in `database` (every table when table is None)"""
+        with self.lock:
+            stale = [key for key, parsed in self.entries.items()
+                     if key[0] == database and (table is None or parsed['table'] == table
+                                                or any(join['table'] == table for join in parsed.get('joins', ())))]
+            for key in stale:
+                del self.entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries),
+                'capacity': self.capacity, 'invalidations': self.invalidations}
@@ -0,0 +1,855 @@
+import pytest
+
+import database
+import database_manager
+import predicates
+from query_parser import QueryParser
+
+
+def make_manager(data_dir, **kwargs):
+    manager = database_manager.DatabaseManager(str(data_dir), **kwargs)
+    manager.login('admin', 'admin123')
+    manager.execute_query("CREATE DATABASE testdb")
+    manager.execute_query("USE testdb")
+    return manager
+
+
+def reopen(data_dir):
+    manager = database_manager.DatabaseManager(str(data_dir))
+    manager.login('admin', 'admin123')
+    manager.execute_query("USE testdb")
+    return manager
+
+
+def test_wal_replay_after_restart(tmp_path):
+    m = make_manager(tmp_path)
+    m.execute_query("CREATE TABLE users (id INT, name TEXT)")
+    m.execute_query("INSERT INTO users VALUES (1, 'Alice'), (2, 'Bob'), (3, 'Cara')")
+    m.execute_query("UPDATE users SET name = 'Bobby' WHERE id = 2")
+    m.execute_query("DELETE FROM users WHERE id = 3")
+    m.execute_query("START TRANSACTION")
+    m.execute_query("INSERT INTO users VALUES (4, 'Dan')")
+
+    # Nothing was checkpointed, so the state lives only in the snapshot + WAL
+    rows = reopen(tmp_path).execute_query("SELECT * FROM users")
+    assert [(r['id'], r['name']) for r in rows] == [(1, 'Alice'), (2, 'Bobby')]
+
+
+def test_checkpoint_truncates_wal(tmp_path):
+    m = make_manager(tmp_path, checkpoint_interval=3)
+    m.execute_query("CREATE TABLE t (id INT)")
+    for i in range(5):
+        m.execute_query(f"INSERT INTO t VALUES ({i})")
+    assert m.databases['admin_testdb']['wal'].record_count < 3
+    assert len(reopen(tmp_path).execute_query("SELECT * FROM t")) == 5
+
+
+def test_rollback_and_savepoints_undo_in_memory(tmp_path):
+    m = make_manager(tmp_path)
+    m.execute_query("CREATE TABLE t (id INT, name TEXT)")
+    m.execute_query("INSERT INTO t VALUES (1, 'a'), (2, 'b'), (3, 'c'), (4, 'd')")
+    before = [dict(r) for r in m.execute_query("SELECT * FROM t")]
+
+    m.execute_query("START TRANSACTION")
+    m.execute_query("DELETE FROM t WHERE id < 3")
+    m.execute_query("SAVEPOINT sp1")
+    m.execute_query("UPDATE t SET id = 10 WHERE id = 4")
+    m.execute_query("INSERT INTO t VALUES (5, 'e')")
+    m.execute_query("ROLLBACK TO SAVEPOINT sp1")
+    assert [r['id'] for r in m.execute_query("SELECT * FROM t")] == [3, 4]
+
+    m.execute_query("ALTER TABLE t ADD age INT DEFAULT 1")
+    m.execute_query("TRUNCATE TABLE t")
+    m.execute_query("ROLLBACK")
+
+    assert m.execute_query("SELECT * FROM t") == before
+    db = m.get_current_database()
+    assert db._find_by_pk('t', 10) is None and db._find_by_pk('t', 4)['name'] == 'd'
+    assert reopen(tmp_path).execute_query("SELECT * FROM t") == before
+
+
+def test_hash_table_matches_a_dict_through_grow_and_shrink():
+    import random
+    from data_structures import HashTable
+    rng = random.Random(4)
+    table, expected = HashTable(), {}
+    for cycle in range(3):
+        # Grow to a few thousand keys (ints and strings), then shrink back to none
+        for _ in range(4000):
+            key = rng.choice([rng.randrange(3000), f"k{rng.randrange(3000)}"])
+            if rng.random() < 0.75:
+                table.insert(key, (cycle, key))
+                expected[key] = (cycle, key)
+            else:
+                assert table.delete(key) == (expected.pop(key, None) is not None)
+            assert len(table) == len(expected)
+        assert table.size > 1000
+        for key in rng.sample(sorted(expected, key=str), 200) + ['missing', -1]:
+            assert table.get(key) == expected.get(key) and (key in table) == (key in expected)
+        assert dict(table.items()) == expected
+        for key in list(expected):
+            assert table.delete(key)
+            del expected[key]
+            if rng.random() < 0.01:
+                assert dict(table.items()) == expected
+        assert len(table) == 0 and table.size == HashTable.MIN_SIZE
+        assert not table.delete('missing')
+
+def test_primary_key_and_unique_enforced_through_indexes(tmp_path):
+    m = make_manager(tmp_path)
+    m.execute_query("CREATE TABLE u (id INT PRIMARY KEY, email TEXT UNIQUE)")
+    assert m.execute_query("INSERT INTO u VALUES (1, 'a@x'), (2, 'b@x'), (1, 'c@x'), (3, 'a@x')") == "Inserted 2 records. Errors: 2"
+    with pytest.raises(ValueError, match="Unique Constraint Violation"):
+        m.execute_query("UPDATE u SET email = 'a@x' WHERE id = 2")
+    with pytest.raises(ValueError, match="Primary Key Constraint Violation"):
+        m.execute_query("UPDATE u SET id = 7 WHERE id > 0")
+
+    m.execute_query("UPDATE u SET email = 'z@x' WHERE id = 1")
+    m.execute_query("DELETE FROM u WHERE id = 2")
+    m.execute_query("INSERT INTO u VALUES (2, 'a@x'), (4, 'b@x')")
+    m.execute_query("TRUNCATE TABLE u")
+    m.execute_query("INSERT INTO u VALUES (1, 'z@x')")
+    m.execute_query("ALTER TABLE u ADD code TEXT UNIQUE")
+    m.execute_query("INSERT INTO u VALUES (2, 'y@x', 'K1')")
+    with pytest.raises(ValueError, match="Unique Constraint Violation"):
+        m.get_current_database().insert_record('u', [3, 'w@x', 'K1'])
+
+
+def test_point_queries_use_the_primary_key_index(tmp_path):
+    m = make_manager(tmp_path)
+    m.execute_query("CREATE TABLE t (id INT, name TEXT)")
+    m.execute_query("INSERT INTO t VALUES " + ", ".join(f"({i}, 'n{i}')" for i in range(200)))
+    db = m.get_current_database()
+
+    candidates, remaining, _ = db._access_path('t', [('name', '=', 'n5'), ('id', '=', '5')])
+    assert [r['id'] for r in candidates] == [5] and remaining == [('name', '=', 'n5')]
+
+    assert m.execute_query("SELECT * FROM t WHERE id = 7 AND name = 'n7'")[0]['name'] == 'n7'
+    assert m.execute_query("SELECT * FROM t WHERE id = 7 AND name = 'x'") == []
+    assert m.execute_query("UPDATE t SET name = 'seven' WHERE id = 7") == "1 record(s) updated"
+    assert m.execute_query("DELETE FROM t WHERE id = 8") == "1 record(s) deleted"
+    assert [r['id'] for r in m.execute_query("SELECT * FROM t WHERE id > 5 AND id < 10")] == [6, 7, 9]
+
+
+def test_secondary_index_is_maintained_and_persisted(tmp_path):
+    m = make_manager(tmp_path)
+    m.execute_query("CREATE TABLE dept (id INT, name TEXT)")
+    m.execute_query("CREATE TABLE emp (id INT, dept_id INT REFERENCES dept(id), name TEXT)")
+    m.execute_query("INSERT INTO dept VALUES (1, 'IT'), (2, 'HR')")
+    m.execute_query("INSERT INTO emp VALUES (1, 1, 'a'), (2, 2, 'b'), (3, 1, 'c')")
+    assert m.execute_query("CREATE INDEX idx_emp_dept ON emp(dept_id)").startswith("Index 'idx_emp_dept' created")
+    assert m.execute_query("INSERT INTO emp VALUES (4, 9, 'x')") == "Inserted 0 records. Errors: 1"
+
+    m.execute_query("INSERT INTO emp VALUES (4, 1, 'd')")
+    m.execute_query("UPDATE emp SET dept_id = 2 WHERE id = 3")
+    m.execute_query("DELETE FROM emp WHERE id = 1")
+    db = m.get_current_database()
+    candidates, remaining, _ = db._access_path('emp', [('dept_id', '=', 1)])
+    assert [r['id'] for r in candidates] == [4] and remaining == []
+
+    rows = reopen(tmp_path).execute_query("SELECT * FROM emp WHERE dept_id = 2")
+    assert [r['id'] for r in rows] == [2, 3]
+    m2 = reopen(tmp_path)
+    assert 'dept_id' in m2.get_current_database().indexes['emp']
+    m2.execute_query("DROP INDEX idx_emp_dept")
+    assert 'dept_id' not in m2.get_current_database().indexes['emp']
+
+
+def test_btree_index_serves_ranges_and_order_by(tmp_path):
+    m = make_manager(tmp_path)
+    m.execute_query("CREATE TABLE t (id INT, score INT)")
+    m.execute_query("INSERT INTO t VALUES " + ", ".join(f"({i}, {(i * 7) % 20})" for i in range(20)))
+    m.execute_query("INSERT INTO t VALUES (20, NULL), (21, 'n/a')")
+    m.execute_query("CREATE INDEX idx_score ON t(score) USING BTREE")
+    m.execute_query("CREATE INDEX idx_id ON t(id) USING BTREE")
+    db = m.get_current_database()
+
+    def scan(where, order_by=None, limit=None):
+        return [r['id'] for r in db.select_records('t', where, order_by, limit)]
+
+    # Same rows as the full-scan evaluator, including text values compared as strings
+    full = [r['id'] for r in db._rows('t') if db._evaluate_where(r, [('score', '>', 15)])]
+    assert sorted(scan([('score', '>', 15)])) == sorted(full)
+    _, _, ordered = db._access_path('t', [('score', '>', 3)], ('score', 'ASC'))
+    assert ordered
+
+    assert scan(None, ('score', 'DESC'), 3) == [21, 20, 17]
+    assert scan([('id', '<', 5)], ('score', 'ASC')) == [0, 3, 1, 4, 2]
+    assert [r['id'] for r in m.execute_query("SELECT * FROM t WHERE id > 2 AND id < 6 ORDER BY id DESC LIMIT 2")] == [5, 4]
+    m.execute_query("UPDATE t SET id = 100 WHERE id = 4")
+    m.execute_query("DELETE FROM t WHERE id = 5")
+    assert scan([('id', '>', 2), ('id', '<', 200)], ('id', 'DESC'), 3) == [100, 21, 20]
+
+
+def test_delete_tombstones_rows_and_compacts(tmp_path):
+    m = make_manager(tmp_path)
+    m.execute_query("CREATE TABLE t (id INT, grp INT)")
+    m.execute_query("INSERT INTO t VALUES " + ", ".join(f"({i}, {i % 3})" for i in range(100)))
+    m.execute_query("CREATE INDEX idx_grp ON t(grp)")
+    db = m.get_current_database()
+    records = db.tables['t']['records']
+
+    m.execute_query("DELETE FROM t WHERE id = 10")
+    assert db.tables['t']['records'] is records and records[10] is None
+    assert db.row_count('t') == 99 and db._find_by_pk('t', 10) is None
+
+    m.execute_query("START TRANSACTION")
+    m.execute_query("DELETE FROM t WHERE grp = 1")
+    assert db.tables['t']['records'] is records  # no compaction while undo entries hold slots
+    m.execute_query("ROLLBACK")
+    assert db.row_count('t') == 99 and len(db._access_path('t', [('grp', '=', 1)])[0]) == 32
+
+    m.execute_query("DELETE FROM t WHERE grp < 2")
+    assert db.tables['t']['records'] is not records and None not in db.tables['t']['records']
+    assert [r['id'] for r in reopen(tmp_path).execute_query("SELECT * FROM t LIMIT 3")] == [2, 5, 8]
+
+
+def test_compiled_where_matches_reference_evaluator():
+    db = database.Database('x', 'admin')
+    values = [0, 5, 7.5, -3, '5', '10', 'abc', 'Abc', '', None, True, '1e3']
+    rows = [{'a': v, 'b': w} for v in values for w in values]
+    for op in ('=', '!=', '>', '<', '>=', '<='):
+        for const in values:
+            for where in ([('a', op, const)], [('a', op, const), ('b', '!=', 'abc')]):
+                predicate = predicates.compile_where(where)
+                assert [predicate(r) for r in rows] == [db._evaluate_where(r, where) for r in rows]
+    for where in ([('a', 'IN', [5, 'abc', None])], [('a', 'IN', ['5', 7.5])],
+                  [(None, 'OR', [[('a', '=', 0)], [('b', '>', 5), ('a', '!=', '')]])]):
+        predicate = predicates.compile_where(where)
+        assert [predicate(r) for r in rows] == [db._evaluate_where(r, where) for r in rows]
+
+
+def test_parser_supports_or_parentheses_in_and_between(tmp_path):
+    m = make_manager(tmp_path)
+    m.execute_query("CREATE TABLE t (id INT PRIMARY KEY, city TEXT, age INT)")
+    m.execute_query("INSERT INTO t VALUES (1, 'Delhi', 20), (2, 'Pune', 35), (3, 'O''Neil', 41), (4, 'Delhi', 50)")
+
+    assert QueryParser.parse("SELECT * FROM t WHERE age BETWEEN 30 AND 45 AND (city = 'Pune' OR id IN (3, 4))")['where'] == [
+        ('age', '>=', 30), ('age', '<=', 45), (None, 'OR', [[('city', '=', 'Pune')], [('id', 'IN', [3, 4])]])]
+
+    def ids(where):
+        return [r['id'] for r in m.execute_query(f"SELECT * FROM t WHERE {where}")]
+    assert ids("age >= 35") == [2, 3, 4]
+    assert ids("age <= 35 AND city <> 'Pune'") == [1]
+    assert ids("city = 'Pune' OR age > 45") == [2, 4]
+    assert ids("(city = 'Delhi' OR city = 'Pune') AND age BETWEEN 30 AND 60") == [2, 4]
+    assert sorted(ids("id IN (4, 1, 9)")) == [1, 4]
+    assert ids("city IN ('O''Neil', 'Pune')") == [2, 3]
+    with pytest.raises(ValueError):
+        QueryParser.parse("SELECT * FROM t WHERE (age > 3")
+
+
+def test_prepared_statements_and_statement_cache(tmp_path):
+    m = make_manager(tmp_path)
+    m.execute_query("CREATE TABLE t (id INT PRIMARY KEY, name TEXT)")
+    insert = m.prepare("INSERT INTO t VALUES (?, ?)")
+    assert insert.param_count == 2
+    for i, name in enumerate(["a", "b'c", "?"]):
+        insert.execute(i, name)
+    with pytest.raises(ValueError):
+        insert.execute(9)
+    with pytest.raises(ValueError):
+        m.execute_query("SELECT * FROM t WHERE id = ?")
+
+    m.execute_query("PREPARE by_id FROM 'SELECT name FROM t WHERE id = ?'")
+    assert m.execute_query("EXECUTE by_id USING 1")[0]['name'] == "b'c"
+    assert m.execute_query("SELECT * FROM t WHERE name = '?'")[0]['id'] == 2
+
+    cache = m.statement_cache
+    hits = cache.hits
+    m.execute_query("select *   FROM t WHERE id = 0;")
+    m.execute_query("select * FROM t WHERE id = 0")
+    assert cache.hits == hits + 1
+    m.execute_query("CREATE INDEX idx_name ON t(name)")
+    assert not any(parsed['table'] == 't' for parsed in cache.entries.values())
+    assert cache.invalidations > 0
+    assert m.execute_query("EXECUTE by_id USING 2")[0]['name'] == "?"
+
+
+def test_columnar_tables_match_row_tables(tmp_path):
+    m = make_manager(tmp_path)
+    for name, storage in (('r', 'ROW'), ('c', 'COLUMNAR')):
+        m.execute_query(f"CREATE TABLE {name} (id INT PRIMARY KEY, name TEXT, age INT, salary FLOAT) STORAGE {storage}")
+        m.execute_query(f"INSERT INTO {name} VALUES " + ", ".join(
+            f"({i}, 'n{i % 7}', {'NULL' if i % 11 == 0 else i % 50}, {i * 1.5 if i % 2 else i})" for i in range(120)))
+        m.execute_query(f"INSERT INTO {name} VALUES (500, 'odd', 'n/a', 2)")
+    store = m.get_current_database().stores['c']
+    assert type(store.columns['id']).__name__ == 'IntColumn' and type(store.columns['age']).__name__ == 'DictColumn'
+    assert m.get_current_database().stores.get('r') is None
+
+    queries = ["SELECT * FROM {t} WHERE age > 30 AND name = 'n3'", "SELECT * FROM {t} WHERE age IN (5, 'n/a') OR salary < 3",
+               "SELECT * FROM {t} WHERE salary >= 100 ORDER BY age DESC LIMIT 5", "SELECT SUM(salary) FROM {t}",
+               "SELECT AVG(age) FROM {t} WHERE age != 7 GROUP BY name", "SELECT * FROM {t} WHERE age > 'm'"]
+
+    def run(query):
+        result = m.execute_query(query)
+        return [{k: v for k, v in r.items() if not k.startswith('_')} for r in result]
+
+    def check():
+        for q in queries:
+            assert run(q.format(t='r')) == run(q.format(t='c')), q
+
+    check()
+    m.execute_query("START TRANSACTION")
+    for name in 'rc':
+        m.execute_query(f"UPDATE {name} SET age = 99 WHERE id < 10")
+        m.execute_query(f"DELETE FROM {name} WHERE salary > 100")
+        m.execute_query(f"ALTER TABLE {name} ADD bonus INT DEFAULT 1")
+    check()
+    m.execute_query("ROLLBACK")
+    check()
+    for name in 'rc':
+        m.execute_query(f"DELETE FROM {name} WHERE id > 20")
+    m = reopen(tmp_path)
+    check()
+    assert "Storage: COLUMNAR" in m.execute_query("DESCRIBE c")
+
+
+def test_vectorized_aggregates_match_fallback(tmp_path, monkeypatch):
+    pytest.importorskip('numpy')
+    import vectorized
+    m = make_manager(tmp_path)
+    m.execute_query("CREATE TABLE t (id INT PRIMARY KEY, dept TEXT, age INT, pay FLOAT) STORAGE COLUMNAR")
+    m.execute_query("INSERT INTO t VALUES " + ", ".join(
+        f"({i}, '{'abc'[i % 3]}', {'NULL' if i % 9 == 0 else i % 40}, {i * 0.1 if i % 4 else i})" for i in range(300)))
+    m.execute_query("INSERT INTO t VALUES (900, 'a', 'n/a', 1)")
+    m.execute_query("DELETE FROM t WHERE id < 5")
+    queries = ["SELECT COUNT(*) FROM t", "SELECT SUM(pay) FROM t WHERE age > 10", "SELECT AVG(age) FROM t GROUP BY dept",
+               "SELECT MIN(pay) FROM t WHERE dept IN ('a', 'c') OR age < 3 GROUP BY age", "SELECT MAX(age) FROM t WHERE pay > 1e9"]
+    fast = [m.execute_query(q) for q in queries]
+    monkeypatch.setattr(vectorized, 'np', None)
+    assert fast == [m.execute_query(q) for q in queries]
+
+
+def test_multiple_aggregates_group_by_and_having(tmp_path):
+    m = make_manager(tmp_path)
+    m.execute_query("CREATE TABLE emp (id INT PRIMARY KEY, dept TEXT, city TEXT, pay FLOAT)")
+    m.execute_query("INSERT INTO emp VALUES (1, 'IT', 'X', 10), (2, 'IT', 'X', 30), (3, 'IT', 'Y', 5), "
+                    "(4, 'HR', 'X', 7), (5, 'HR', 'X', 'n/a'), (6, 'Ops', 'Y', 1)")
+    result = m.execute_query("SELECT dept, city, COUNT(*), SUM(pay), AVG(pay), MAX(pay) FROM emp "
+                             "GROUP BY dept, city HAVING COUNT(*) > 1 OR SUM(pay) < 2 ORDER BY SUM(pay) DESC")
+    assert result == [{'dept': 'IT', 'city': 'X', 'COUNT(*)': 2, 'SUM(pay)': 40.0, 'AVG(pay)': 20.0, 'MAX(pay)': 30.0},
+                      {'dept': 'HR', 'city': 'X', 'COUNT(*)': 2, 'SUM(pay)': 7.0, 'AVG(pay)': 7.0, 'MAX(pay)': 7.0},
+                      {'dept': 'Ops', 'city': 'Y', 'COUNT(*)': 1, 'SUM(pay)': 1.0, 'AVG(pay)': 1.0, 'MAX(pay)': 1.0}]
+    # Aggregates used only by HAVING are not returned
+    assert m.execute_query("SELECT dept FROM emp GROUP BY dept HAVING MIN(pay) >= 5 LIMIT 1") == [{'dept': 'IT'}]
+    assert m.execute_query("SELECT COUNT(*), MIN(pay) FROM emp WHERE id > 100") == [{'COUNT(*)': 0, 'MIN(pay)': None}]
+    with pytest.raises(ValueError, match="must appear in GROUP BY"):
+        m.execute_query("SELECT city, COUNT(*) FROM emp GROUP BY dept")
+    with pytest.raises(ValueError, match="Unknown column"):
+        m.execute_query("SELECT COUNT(*) FROM emp GROUP BY dept, nope")
+
+
+def test_join_strategies_and_explain(tmp_path):
+    m = make_manager(tmp_path)
+    m.execute_query("CREATE TABLE dept (id INT PRIMARY KEY, name TEXT)")
+    m.execute_query("CREATE TABLE emp (id INT PRIMARY KEY, name TEXT, dept_id INT REFERENCES dept(id))")
+    m.execute_query("INSERT INTO dept VALUES (1, 'IT'), (2, 'HR'), (3, 'Ops')")
+    m.execute_query("INSERT INTO emp VALUES (10, 'a', 1), (11, 'b', 2), (12, 'c', 1), (13, 'd', 1)")
+    inner = "SELECT e.name, d.name FROM emp e JOIN dept d ON e.dept_id = d.id ORDER BY e.name"
+    expected = [{'e.name': 'a', 'd.name': 'IT'}, {'e.name': 'b', 'd.name': 'HR'},
+                {'e.name': 'c', 'd.name': 'IT'}, {'e.name': 'd', 'd.name': 'IT'}]
+    assert m.execute_query(inner) == expected
+    assert "hash join" in m.execute_query("EXPLAIN " + inner)[1]['detail']
+    left = m.execute_query("SELECT d.name, e.id FROM dept d LEFT JOIN emp e ON d.id = e.dept_id WHERE d.id > 1")
+    assert left == [{'d.name': 'HR', 'e.id': 11}, {'d.name': 'Ops', 'e.id': None}]
+
+    # A selective left side probes the index on the join column instead
+    m.execute_query("CREATE INDEX idx_dept ON emp(dept_id)")
+    query = "SELECT * FROM dept JOIN emp ON dept.id = emp.dept_id WHERE dept.name = 'IT'"
+    assert "index nested loop" in m.execute_query("EXPLAIN " + query)[1]['detail']
+    assert [r['emp.name'] for r in m.execute_query(query)] == ['a', 'c', 'd']
+    with pytest.raises(ValueError, match="ambiguous"):
+        m.execute_query("SELECT name FROM emp JOIN dept ON emp.dept_id = dept.id")
+
+
+def test_select_pipeline_streams_and_stops_at_limit(tmp_path, monkeypatch):
+    m = make_manager(tmp_path)
+    m.execute_query("CREATE TABLE t (id INT PRIMARY KEY, age INT)")
+    m.execute_query("INSERT INTO t VALUES " + ", ".join(f"({i}, {i % 10})" for i in range(1000)))
+    checked = []
+    compile_where = predicates.compile_where
+
+    def counting(where_clause):
+        predicate = compile_where(where_clause)
+        return lambda r: checked.append(r) or predicate(r)
+
+    monkeypatch.setattr(predicates, 'compile_where', counting)
+    rows = m.stream_query("SELECT * FROM t WHERE age = 3 LIMIT 2")
+    assert checked == []  # nothing is read before the first row is pulled
+    assert next(rows)['id'] == 3 and not isinstance(rows, list)
+    assert [r['id'] for r in rows] == [13]
+    assert len(checked) == 14
+    assert [r['id'] for r in m.execute_query("SELECT * FROM t WHERE age = 9 ORDER BY id DESC LIMIT 2")] == [999, 989]
+    with pytest.raises(ValueError, match="Only SELECT"):
+        m.stream_query("DELETE FROM t WHERE id = 1")
+
+
+def test_order_by_multiple_columns_and_top_k(tmp_path):
+    m = make_manager(tmp_path)
+    m.execute_query("CREATE TABLE t (id INT PRIMARY KEY, dept TEXT, score INT)")
+    m.execute_query("INSERT INTO t VALUES (1, 'b', 9), (2, 'a', 10), (3, 'b', 10), (4, 'a', 2), (5, 'b', NULL)")
+    ids = lambda query: [r['id'] for r in m.execute_query(query)]
+    assert ids("SELECT * FROM t ORDER BY score LIMIT 3") == [4, 1, 2]  # 9 sorts before 10
+    assert ids("SELECT * FROM t ORDER BY dept ASC, score DESC") == [2, 4, 5, 3, 1]
+    assert ids("SELECT * FROM t ORDER BY dept DESC, score ASC, id LIMIT 2") == [1, 3]
+    assert m.execute_query("EXPLAIN SELECT * FROM t ORDER BY dept, score DESC LIMIT 2")[-1]['operation'] == 'TOP-K'
+    assert m.execute_query("SELECT dept, MAX(score) FROM t GROUP BY dept ORDER BY MAX(score) DESC, dept DESC") == [
+        {'dept': 'b', 'MAX(score)': 10.0}, {'dept': 'a', 'MAX(score)': 10.0}]
+
+
+def test_select_projects_requested_columns(tmp_path):
+    m = make_manager(tmp_path)
+    for name, storage in (('r', 'ROW'), ('c', 'COLUMNAR')):
+        m.execute_query(f"CREATE TABLE {name} (id INT PRIMARY KEY, name TEXT, bio TEXT) STORAGE {storage}")
+        m.execute_query(f"INSERT INTO {name} VALUES (1, 'a', 'x'), (2, 'b', 'y')")
+        assert m.execute_query(f"SELECT * FROM {name} WHERE id = 2") == [{'id': 2, 'name': 'b', 'bio': 'y'}]
+        assert m.execute_query(f"SELECT name FROM {name} ORDER BY bio DESC") == [{'name': 'b'}, {'name': 'a'}]
+        assert list(m.execute_query(f"SELECT id, _created_at FROM {name} LIMIT 1")[0]) == ['id', '_created_at']
+        with pytest.raises(ValueError, match="Unknown column 'nope'"):
+            m.execute_query(f"SELECT nope FROM {name}")
+    # Results are copies: changing them leaves the table alone
+    m.execute_query("SELECT * FROM r")[0]['name'] = 'changed'
+    assert m.execute_query("SELECT name FROM r WHERE id = 1") == [{'name': 'a'}]
+    assert m.execute_query("SELECT r.name FROM r JOIN c ON r.id = c.id WHERE c.bio = 'y'") == [{'r.name': 'b'}]
+
+
+def test_databases_load_lazily_and_evict_under_memory_budget(tmp_path):
+    m = make_manager(tmp_path, checkpoint_interval=10 ** 6)
+    for name in ('a', 'b'):
+        m.execute_query(f"CREATE DATABASE {name}")
+        m.execute_query(f"USE {name}")
+        m.execute_query("CREATE TABLE t (id INT PRIMARY KEY, name TEXT)")
+        m.execute_query("INSERT INTO t VALUES " + ", ".join(f"({i}, '{name}{i}')" for i in range(200)))
+
+    m = database_manager.DatabaseManager(str(tmp_path), checkpoint_interval=10 ** 6)
+    m.login('admin', 'admin123')
+    assert not m.databases  # nothing is read at login
+    m.execute_query("USE a")
+    assert list(m.databases) == ['admin_a']
+
+    m.memory_budget = m.get_current_database().estimated_size() + 1000
+    m.execute_query("UPDATE t SET name = 'changed' WHERE id = 1")  # only in the WAL so far
+    m.execute_query("USE b")
+    assert list(m.databases) == ['admin_b'] and m.evictions == 1
+    m.execute_query("USE a")  # reloaded from the checkpoint written on eviction
+    assert m.execute_query("SELECT name FROM t WHERE id = 1") == [{'name': 'changed'}]
+    assert 'admin_b' not in m.databases
+    with pytest.raises(ValueError, match="DB exists"):
+        m.execute_query("CREATE DATABASE b")
+
+
+def test_page_file_round_trip_and_lazy_tables(tmp_path):
+    import pagefile
+    m = make_manager(tmp_path, storage_format='pages')
+    m.execute_query("CREATE TABLE r (id INT PRIMARY KEY, name TEXT, score FLOAT, n INT)")
+    m.execute_query("CREATE INDEX idx_score ON r(score) USING BTREE")
+    m.execute_query("INSERT INTO r VALUES (1, 'a', 2.5, 7), (2, NULL, 3, NULL), (3, 'c', NULL, 'x'), (4, 'd', 1.0, 0)")
+    m.execute_query("CREATE TABLE c (id INT PRIMARY KEY, dept TEXT, pay FLOAT) STORAGE COLUMNAR")
+    m.execute_query("INSERT INTO c VALUES " + ", ".join(f"({i}, 'd{i % 3}', {i * 1.5})" for i in range(50)))
+    m.execute_query("DELETE FROM c WHERE id < 5")
+    expected = {q: m.execute_query(q) for q in ("SELECT * FROM r", "SELECT * FROM r ORDER BY score DESC",
+                                                "SELECT * FROM c WHERE pay > 30", "SELECT dept, SUM(pay) FROM c GROUP BY dept")}
+    m.save_database('admin_testdb')
+    assert not (tmp_path / 'admin_testdb.json').exists()
+
+    db, extra = pagefile.open_database(str(tmp_path / 'admin_testdb.sdb'))
+    assert extra['owner'] == 'admin' and sorted(db.tables) == ['c', 'r']
+    assert db.tables.pending == {'c', 'r'}  # listing names decodes nothing
+    assert db.select_records('r', [('id', '=', 2)], columns='*') == [expected["SELECT * FROM r"][1]]
+    assert db.tables.pending == {'c'}
+    assert isinstance(db.indexes['r']['score'], database.data_structures.SortedIndex)
+
+    m = database_manager.DatabaseManager(str(tmp_path), storage_format='pages')
+    m.login('admin', 'admin123')
+    m.execute_query("USE testdb")
+    for query, rows in expected.items():
+        assert m.execute_query(query) == rows
+    assert m.execute_query("SELECT n FROM r WHERE id = 3") == [{'n': 'x'}]
+    assert 'c' in m.get_current_database().stores
+
+
+def test_commit_and_rollback_leave_page_file_tables_undecoded(tmp_path):
+    m = make_manager(tmp_path, storage_format='pages')
+    for name in 'abcd':
+        m.execute_query(f"CREATE TABLE {name} (id INT PRIMARY KEY, v INT)")
+        m.execute_query(f"INSERT INTO {name} VALUES (1, 1)")
+    m.save_database('admin_testdb')
+    m = database_manager.DatabaseManager(str(tmp_path), storage_format='pages')
+    m.login('admin', 'admin123')
+    m.execute_query("USE testdb")
+    tables = m.get_current_database().tables
+    assert tables.pending == {'a', 'b', 'c', 'd'}
+    m.execute_query("START TRANSACTION")
+    m.execute_query("INSERT INTO a VALUES (2, 2)")
+    m.execute_query("COMMIT")
+    assert tables.pending == {'b', 'c', 'd'}
+    m.execute_query("START TRANSACTION")
+    m.execute_query("INSERT INTO b VALUES (2, 2)")
+    m.execute_query("ROLLBACK")
+    assert tables.pending == {'c', 'd'}
+    assert m.execute_query("SELECT id FROM b") == [{'id': 1}]
+
+def test_concurrent_sessions_lose_no_updates(tmp_path):
+    import threading
+    m = make_manager(tmp_path, fsync_policy='never')
+    m.execute_query("CREATE TABLE counter (id INT PRIMARY KEY, n INT)")
+    m.execute_query("CREATE TABLE events (id INT PRIMARY KEY, worker INT)")
+    m.execute_query("INSERT INTO counter VALUES (1, 0)")
+    writers, increments, errors, done = 6, 40, [], threading.Event()
+
+    def writer(w):
+        s = m.connect('admin', 'admin123')
+        s.execute_query("USE testdb")
+        for i in range(increments):
+            # Read-modify-write inside a transaction: lost if another writer interleaves
+            s.execute_query("START TRANSACTION")
+            n = s.execute_query("SELECT n FROM counter WHERE id = 1")[0]['n']
+            s.execute_query(f"UPDATE counter SET n = {n + 1} WHERE id = 1")
+            s.execute_query("COMMIT")
+            s.execute_query(f"INSERT INTO events VALUES ({w * increments + i}, {w})")
+
+    def reader():
+        s = m.connect('admin', 'admin123')
+        s.execute_query("USE testdb")
+        last = 0
+        while not done.is_set():
+            n = s.execute_query("SELECT * FROM counter")[0]['n']
+            if n < last: errors.append((last, n))  # committed increments never disappear
+            last = n
+            s.execute_query("SELECT COUNT(*) FROM events")
+
+    def run(fn, *args):
+        try:
+            fn(*args)
+        except Exception as e:
+            errors.append(e)
+
+    readers = [threading.Thread(target=run, args=(reader,)) for _ in range(3)]
+    threads = [threading.Thread(target=run, args=(writer, w)) for w in range(writers)]
+    for t in readers + threads: t.start()
+    for t in threads: t.join()
+    done.set()
+    for t in readers: t.join()
+
+    assert errors == []
+    assert m.execute_query("SELECT n FROM counter") == [{'n': writers * increments}]
+    assert m.execute_query("SELECT COUNT(*) FROM events") == [{'COUNT(*)': writers * increments}]
+    assert reopen(tmp_path).execute_query("SELECT n FROM counter") == [{'n': writers * increments}]
+
+
+def test_snapshot_reads_see_committed_data_and_never_block_writers(tmp_path):
+    import threading
+    m = make_manager(tmp_path, fsync_policy='never', vacuum_interval=None)
+    m.execute_query("CREATE TABLE t (id INT PRIMARY KEY, v INT)")
+    m.execute_query("CREATE TABLE c (id INT PRIMARY KEY, v INT) STORAGE COLUMNAR")
+    for table in ('t', 'c'):
+        m.execute_query(f"INSERT INTO {table} VALUES " + ", ".join(f"({i}, {i % 10})" for i in range(3000)))
+    reader, writer = (m.connect('admin', 'admin123') for _ in range(2))
+    for s in (reader, writer):
+        s.execute_query("USE testdb")
+
+    # A long scan (several snapshot chunks) is under way while a transaction rewrites the table
+    stream = reader.stream_query("SELECT id, v FROM t")
+    first = [next(stream) for _ in range(10)]
+    seen = {}
+
+    def write():
+        writer.execute_query("START TRANSACTION")
+        writer.execute_query("UPDATE t SET v = -1 WHERE id < 2000")
+        writer.execute_query("DELETE FROM t WHERE id >= 2500")
+        writer.execute_query("INSERT INTO t VALUES (5000, -1)")
+        writer.execute_query("UPDATE c SET v = 100 WHERE id < 100")
+        # Other sessions neither see nor wait for the open transaction
+        seen['uncommitted'] = reader.execute_query("SELECT COUNT(*) FROM t WHERE v = -1")
+        seen['columnar'] = reader.execute_query("SELECT SUM(v) FROM c")
+        seen['own'] = writer.execute_query("SELECT COUNT(*) FROM t WHERE v = -1")
+        writer.execute_query("COMMIT")
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    thread.join(10)
+    assert not thread.is_alive()
+    assert seen == {'uncommitted': [{'COUNT(*)': 0}], 'columnar': [{'SUM(v)': 13500.0}],
+                    'own': [{'COUNT(*)': 2001}]}
+    rows = first + list(stream)
+    assert rows == [{'id': i, 'v': i % 10} for i in range(3000)]
+    assert reader.execute_query("SELECT COUNT(*) FROM t WHERE v = -1") == [{'COUNT(*)': 2001}]
+    assert reader.execute_query("SELECT SUM(v) FROM c") == [{'SUM(v)': 13500.0 - 450 + 10000}]
+
+    # With the stream closed no snapshot needs the replaced versions
+    db = m.get_current_database()
+    assert db.snapshots == {}
+    assert m.vacuum() == 2000 + 500 + 100  # versions the stream kept alive past COMMIT
+    assert not any(db.versions.values())
+    snapshot = db.snapshot()
+    m.execute_query("UPDATE t SET v = 7 WHERE id = 1")
+    assert snapshot.select_records('t', [('id', '=', 1)], columns=['v']) == [{'v': -1}]
+    assert m.vacuum() == 0
+    snapshot.close()
+    assert m.vacuum() == 1 and not any(db.versions.values())
+    assert reopen(tmp_path).execute_query("SELECT COUNT(*) FROM t") == [{'COUNT(*)': 2501}]
+
+
+def test_server_sessions_pipelining_streams_and_pool(tmp_path):
+    import asyncio
+    import threading
+    import client
+    import server
+    m = make_manager(tmp_path, fsync_policy='never')
+    m.execute_query("CREATE TABLE t (id INT PRIMARY KEY, v INT)")
+    m.execute_query("INSERT INTO t VALUES " + ", ".join(f"({i}, {i % 7})" for i in range(1200)))
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    srv = asyncio.run_coroutine_threadsafe(server.Server(m, port=0).start(), loop).result(5)
+    try:
+        with pytest.raises(ValueError, match="Invalid credentials"):
+            client.Connection(port=srv.port, user='admin', password='wrong')
+        conn = client.Connection(port=srv.port)
+        with pytest.raises(PermissionError, match="Login required"):
+            conn.execute("SHOW TABLES")
+        conn.login('admin', 'admin123')
+        assert conn.execute("USE testdb") == "Switched to testdb" and conn.database == 'admin_testdb'
+
+        # Pipelined: every statement runs in order; the failing one is reported after the rest
+        results = conn.pipeline(["INSERT INTO t VALUES (5000, 1)", "SELECT v FROM t WHERE id = 5000",
+                                 "SELECT COUNT(*) FROM t"])
+        assert results == ["Inserted 1 records. Errors: 0", [{'v': 1}], [{'COUNT(*)': 1201}]]
+        with pytest.raises(ValueError, match="does not exist"):
+            conn.pipeline(["SELECT * FROM missing", "UPDATE t SET v = 2 WHERE id = 5000"])
+        assert conn.execute("SELECT v FROM t WHERE id = 5000") == [{'v': 2}]
+
+        # Streams arrive in batches; leaving one early cancels it and the connection stays usable
+        assert [r['id'] for r in conn.stream("SELECT id FROM t ORDER BY id", batch=100)] == list(range(1200)) + [5000]
+        partial = conn.stream("SELECT id FROM t", batch=10)
+        assert [next(partial) for _ in range(15)] == [{'id': i} for i in range(15)]
+        partial.close()
+        assert conn.execute("SELECT COUNT(*) FROM t WHERE v = 0") == [{'COUNT(*)': 172}]
+
+        # A connection dropped inside a transaction is rolled back and releases the database
+        conn.execute("START TRANSACTION")
+        conn.execute("DELETE FROM t WHERE id = 5000")
+        assert conn.in_transaction
+        conn.close()
+
+        pool = client.ConnectionPool(port=srv.port, user='admin', password='admin123', database='testdb', size=3)
+        errors = []
+
+        def work(w):
+            try:
+                for i in range(20):
+                    pool.execute(f"INSERT INTO t VALUES ({10000 + w * 100 + i}, {w})")
+                with pool.connection() as c:
+                    c.execute("START TRANSACTION")  # handed back open: the pool rolls it back
+                    c.execute(f"DELETE FROM t WHERE v = {w}")
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=work, args=(w,)) for w in range(8)]
+        for t in threads: t.start()
+        for t in threads: t.join(30)
+        assert errors == [] and pool.opened <= 3
+        assert pool.execute("SELECT COUNT(*) FROM t") == [{'COUNT(*)': 1201 + 8 * 20}]
+        pool.close()
+    finally:
+        asyncio.run_coroutine_threadsafe(srv.stop(), loop).result(10)
+        loop.call_soon_threadsafe(loop.stop)
+
+
+def test_cancel_token_stops_scans_and_insert_batches(tmp_path):
+    m = make_manager(tmp_path, fsync_policy='never', vacuum_interval=None)
+    m.execute_query("CREATE TABLE t (id INT PRIMARY KEY, v INT)")
+    m.execute_query("CREATE TABLE c (id INT PRIMARY KEY, v INT) STORAGE COLUMNAR")
+    m.execute_query("INSERT INTO t VALUES " + ", ".join(f"({i}, {i % 7})" for i in range(3000)))
+    token = database.CancelToken()
+    assert len(m.execute_query("SELECT * FROM t WHERE v = 3", token)) == 429
+
+    # A scan stops at its next check once the token is cancelled from elsewhere
+    db = m.get_current_database()
+    with database.cancellable(token):
+        rows = db.iter_records('t', [('v', '>=', 0)])
+    for _ in range(1500): next(rows)
+    token.cancel()
+    with pytest.raises(database.QueryCancelled):
+        list(rows)
+
+    # Snapshot reads, reads inside a transaction, joins and aggregates all honour it
+    with pytest.raises(database.QueryCancelled):
+        m.execute_query("SELECT COUNT(*) FROM t WHERE v = 3", token)
+    with pytest.raises(database.QueryCancelled):
+        m.execute_query("SELECT * FROM t a JOIN t b ON a.id = b.v", token)
+    m.execute_query("START TRANSACTION")
+    with pytest.raises(database.QueryCancelled):
+        m.execute_query("UPDATE t SET v = 0 WHERE v = 3", token)
+    m.execute_query("ROLLBACK")
+    assert len(m.execute_query("SELECT * FROM t WHERE v = 3")) == 429
+
+    # An INSERT batch stops between rows; the rows before the cancel stay
+    with pytest.raises(database.QueryCancelled, match="after inserting 0 records"):
+        m.execute_query("INSERT INTO c VALUES (1, 1), (2, 2)", token)
+    assert m.execute_query("SELECT COUNT(*) FROM c") == [{'COUNT(*)': 0}]
+    assert m.execute_query("SELECT COUNT(*) FROM t") == [{'COUNT(*)': 3000}]
+
+
+def test_limit_offset_pages_and_select_page(tmp_path):
+    m = make_manager(tmp_path, fsync_policy='never', vacuum_interval=None)
+    m.execute_query("CREATE TABLE t (id INT PRIMARY KEY, v INT, s INT)")
+    m.execute_query("INSERT INTO t VALUES " + ", ".join(f"({i}, {i * 7 % 10}, {i})" for i in range(100)))
+    m.execute_query("CREATE INDEX t_s ON t (s) USING BTREE")
+    ids = lambda query: [next(iter(r.values())) for r in m.execute_query(query)]
+    assert ids("SELECT id FROM t LIMIT 3 OFFSET 5") == [5, 6, 7]
+    assert ids("SELECT id FROM t ORDER BY s DESC LIMIT 2 OFFSET 1") == [98, 97]
+    # Pages of a sort (heap for shallow pages, full sort for deep ones) tile the sorted order
+    whole = ids("SELECT id FROM t ORDER BY v, id DESC")
+    assert sum((ids(f"SELECT id FROM t ORDER BY v, id DESC LIMIT 7 OFFSET {o}") for o in range(0, 100, 7)), []) == whole
+    assert ids("SELECT id FROM t WHERE v = 3 ORDER BY v LIMIT 5 OFFSET 8") == [89, 99]
+    assert ids("SELECT b.id FROM t a JOIN t b ON a.id = b.v WHERE a.id = 9 ORDER BY b.id DESC LIMIT 2 OFFSET 1") == [87, 77]
+    assert m.execute_query("SELECT v, COUNT(*) FROM t GROUP BY v ORDER BY v LIMIT 2 OFFSET 8") == \
+        [{'v': 8, 'COUNT(*)': 10}, {'v': 9, 'COUNT(*)': 10}]
+    assert m.execute_query("EXPLAIN SELECT * FROM t ORDER BY v LIMIT 5 OFFSET 10")[-1]['detail'] == "5 OFFSET 10"
+
+    rows, total = m.select_page('t', 10, 95, [('v', 'DESC')])
+    assert total == 100 and [r['id'] for r in rows] == [40, 30, 20, 10, 0]  # v = 0 sorts last, ties by id DESC
+    assert list(rows[0]) == ['id', 'v', 's', '_created_at', '_updated_at']
+    history = len(m.query_history)
+    assert [r['id'] for r in m.select_page('t', 3, 0, [('s', 'DESC')])[0]] == [99, 98, 97]
+    assert len(m.query_history) == history
+
+
+def test_bench_aggregate_queries_run_on_row_and_columnar_tables():
+    import bench_aggregate
+    dbs = []
+    for storage in ('row', 'columnar'):
+        db = database.Database('bench', 'bench')
+        db.journal = None
+        db.create_table('emp', QueryParser.parse(bench_aggregate.COLUMNS)['columns'], storage)
+        for i in range(50):
+            db.insert_record('emp', [i, ['IT', 'HR', 'Ops'][i % 3], 20 + i, 40000.0 + 1000 * i])
+        dbs.append(db)
+    for sql in bench_aggregate.QUERIES:
+        q = QueryParser.parse(sql)
+        assert bench_aggregate.run_query(dbs[0], q) == bench_aggregate.run_query(dbs[1], q)
+    by_dept = bench_aggregate.run_query(dbs[0], QueryParser.parse("SELECT AVG(salary) FROM emp GROUP BY dept"))
+    assert [r['dept'] for r in by_dept] == ['IT', 'HR', 'Ops'] and by_dept[0]['AVG(salary)'] == 64000.0
+
+
+def test_convert_and_load_legacy_json_snapshots(tmp_path):
+    import json
+    import os
+    import shutil
+    import pagefile
+    shipped = os.path.join(os.path.dirname(__file__), 'structdb_data')
+    for name in os.listdir(shipped):
+        shutil.copy(os.path.join(shipped, name), tmp_path)
+    with open(tmp_path / 'admin_legacy.json', 'w') as f:
+        json.dump({'name': 'legacy', 'owner': 'admin', 'created_at': '2025-10-20T12:58:00', 'tables': {
+            't': {'columns': ['id', 'name'], 'column_definitions': [{'name': 'id', 'definition': 'INT'},
+                                                                    {'name': 'name', 'definition': 'TEXT'}],
+                  'primary_key': 'id', 'records': [{'id': 1, 'name': 'a'}], 'created_at': '2025-10-20'}}}, f)
+    converted = pagefile.convert(str(tmp_path))
+    assert sorted(os.path.basename(p) for p in converted) == \
+        ['admin_company.sdb', 'admin_demo.sdb', 'admin_legacy.sdb', 'sagar_SAGAR.sdb', 'sagar_testdb.sdb']
+    db, extra = pagefile.open_database(str(tmp_path / 'admin_legacy.sdb'))
+    assert extra['owner'] == 'admin' and db.select_records('t')[0]['name'] == 'a'
+
+    os.remove(tmp_path / 'admin_legacy.sdb')  # the JSON snapshot loads as well
+    m = database_manager.DatabaseManager(str(tmp_path))
+    m.login('admin', 'admin123')
+    m.execute_query("USE legacy")
+    assert m.execute_query("SELECT name FROM t") == [{'name': 'a'}]
+
+
+def test_form_writes_take_the_session_locks(tmp_path):
+    import threading
+    m = make_manager(tmp_path, fsync_policy='never', vacuum_interval=None)
+    m.execute_query("CREATE TABLE t (id INT PRIMARY KEY, name TEXT)")
+    other = m.connect('admin', 'admin123')
+    other.execute_query("USE testdb")
+    other.execute_query("START TRANSACTION")
+    other.execute_query("INSERT INTO t VALUES (1, 'tx')")
+    writer = threading.Thread(target=m.insert_record, args=('t', [2, 'form']))
+    writer.start()
+    writer.join(0.2)
+    assert writer.is_alive()  # waits for the other session's transaction
+    other.execute_query("COMMIT")
+    writer.join(5)
+    m.update_records('t', {'name': 'edited'}, [('id', '=', 2)])
+    m.delete_records('t', [('id', '=', '1')])
+    assert reopen(tmp_path).execute_query("SELECT * FROM t") == [{'id': 2, 'name': 'edited'}]
+
+
+def test_logout_checkpoints_only_the_sessions_databases(tmp_path):
+    m = make_manager(tmp_path, fsync_policy='never', vacuum_interval=None)
+    m.execute_query("CREATE TABLE t (id INT PRIMARY KEY)")
+    m.execute_query("INSERT INTO t VALUES (1)")
+    other = m.connect('admin', 'admin123')
+    other.execute_query("CREATE DATABASE other")
+    other.execute_query("USE other")
+    other.execute_query("CREATE TABLE u (id INT PRIMARY KEY)")
+    other.execute_query("INSERT INTO u VALUES (1)")
+    wal_records = lambda name: m.databases[name]['wal'].record_count
+    assert wal_records('admin_testdb') and wal_records('admin_other')
+    other.logout()
+    assert wal_records('admin_testdb') and not wal_records('admin_other')
+
+
+def test_load_databases_leaves_resident_ones_alone(tmp_path):
+    m = make_manager(tmp_path, fsync_policy='never')
+    m.execute_query("CREATE TABLE t (id INT PRIMARY KEY)")
+    m.save_database('admin_testdb')
+    db = m.get_current_database()
+    other = m.connect('admin', 'admin123')
+    other.execute_query("USE testdb")
+    other.execute_query("START TRANSACTION")
+    other.execute_query("INSERT INTO t VALUES (1)")
+    m.load_databases()
+    assert m.get_current_database() is db
+    other.execute_query("COMMIT")
+    assert m.execute_query("SELECT id FROM t") == [{'id': 1}]
+
+def test_memory_budget_skips_databases_being_written(tmp_path):
+    m = make_manager(tmp_path, fsync_policy='never', vacuum_interval=None)
+    m.execute_query("CREATE TABLE t (id INT PRIMARY KEY, name TEXT)")
+    m.execute_query("INSERT INTO t VALUES " + ", ".join(f"({i}, 'name {i}')" for i in range(200)))
+    m.execute_query("CREATE DATABASE other")
+    db = m.databases['admin_testdb']['database']
+    sized = []
+    db.estimated_size = lambda: sized.append(1) or 10 ** 6
+    m.memory_budget = 1
+    with m.lock_for('admin_testdb').write():  # another session's statement
+        m._enforce_memory_budget(pinned=('admin_other',))
+    assert not sized and 'admin_testdb' in m.databases
+    m._enforce_memory_budget(pinned=('admin_other',))
+    assert sized and 'admin_testdb' not in m.databases
+
+
+def test_record_pages_window_moves_by_offset_and_keyset(tmp_path):
+    import gui
+    m = make_manager(tmp_path, fsync_policy='never', vacuum_interval=None)
+    m.execute_query("CREATE TABLE t (id INT PRIMARY KEY, v INT)")
+    m.execute_query("INSERT INTO t VALUES " + ", ".join(f"({(i * 37) % 101}, {i % 4})" for i in range(101)))
+    for order in (None, ('v', 'ASC'), ('v', 'DESC'), ('id', 'DESC')):
+        expected = [r['id'] for r in m.select_page('t', 1000, 0, [order, ('id', order[1])] if order else None)[0]]
+        pages = gui.RecordPages('t', order, page_size=10, max_pages=3)
+
+        def move(forward):
+            request = pages.request(forward)
+            if request is None: return False
+            page, dropped = pages.add(forward, request, *pages.fetch(m, request))
+            assert len(pages.pages) <= 3 and (page is None or page['count'] <= 10)
+            return True
+
+        def window():
+            """ids of the rows held, checked against the full order"""
+            ids, start = [], pages.first_row
+            for page in pages.pages:
+                first, last = page['rows']
+                assert (first['id'], last['id']) == (expected[start], expected[start + page['count'] - 1])
+                ids += expected[start:start + page['count']]
+                start += page['count']
+            return ids
+
+        while move(True): pass
+        assert pages.at_end and window() == expected[-pages.row_count:] and pages.total == 101
+        while move(False): pass
+        assert pages.at_start and window() == expected[:30]
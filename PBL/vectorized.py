@@ -0,0 +1,185 @@
+"""
+vectorized.py
+NumPy execution over columnar tables: WHERE masks, aggregates and GROUP BY
+
+Only used when NumPy is importable; otherwise Database keeps to the
+array/itertools column path and the row-at-a-time code. Results match the
+row layout: NULLs and text follow the same comparison rules, sums are
+accumulated in row order and groups come out in first-seen order.
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import columnar
+import predicates
+
+
+def _buffer(values):
+    """Zero-copy ndarray over an array.array/bytearray (do not keep it: it pins the buffer)"""
+    dtype = np.uint8 if isinstance(values, bytearray) else np.dtype(values.typecode)
+    return np.frombuffer(values, dtype) if len(values) else np.empty(0, dtype)
+
+
+def column_mask(column, op, value):
+    """Boolean mask over every row of a column for `op value`, or None if the row path must decide"""
+    if op == 'OR' or column is None or isinstance(column, columnar.TimestampColumn):
+        return None
+    if isinstance(column, columnar.DictColumn):
+        # Decide once per distinct value, then look the answer up by code
+        predicate = predicates.compile_where([('v', op, value)])
+        table = np.fromiter((predicate({'v': v}) for v in column.dictionary), bool, len(column.dictionary))
+        return table[_buffer(column.codes)]
+    if op == 'IN':
+        wanted = [n for n in (predicates._coerce(v)[0] for v in value) if n is not None]
+        mask = np.isin(_buffer(column.data), wanted)
+    elif op in columnar.COMPARE:
+        constant = predicates._coerce(value)[0]
+        if constant is None or constant != constant: return None
+        mask = columnar.COMPARE[op](_buffer(column.data), constant)
+    else:
+        return None
+    kinds = _buffer(column.kinds)
+    if not kinds.all():
+        mask = np.where(kinds != columnar.NULL, mask, columnar._matches_null(op, value))
+    return mask
+
+
+def where_mask(store, where_clause):
+    """(AND of the conjuncts decidable on column buffers or None, conjuncts left for the row path)"""
+    mask, remaining = None, []
+    for condition in where_clause:
+        col, op, value = condition
+        m = column_mask(store.columns.get(col), op, value)
+        if m is None:
+            remaining.append(condition)
+        else:
+            mask = m if mask is None else mask & m
+    return mask, remaining
+
+
+def _take(values, positions):
+    """Buffer of a column at positions (None: every row)"""
+    data = _buffer(values)
+    return data if positions is None else data[positions]
+
+
+def _numbers(column, positions, n):
+    """(float64 values, valid) at positions; valid where the row path's float(value) succeeds"""
+    if column is None or isinstance(column, columnar.TimestampColumn):
+        return np.zeros(n), np.zeros(n, bool)
+    if isinstance(column, columnar.DictColumn):
+        converted, ok = [], []
+        for v in column.dictionary:
+            try:
+                converted.append(float(v))
+                ok.append(True)
+            except (TypeError, ValueError):
+                converted.append(0.0)
+                ok.append(False)
+        codes = _take(column.codes, positions)
+        return np.array(converted, np.float64)[codes], np.array(ok, bool)[codes]
+    return _take(column.data, positions).astype(np.float64), _take(column.kinds, positions) != columnar.NULL
+
+
+def _group_codes(column, positions, n):
+    """(code per selected row, bound) with codes in [0, bound), equal exactly when the values are equal"""
+    if column is None:
+        return np.zeros(n, np.int64), 1
+    if isinstance(column, columnar.DictColumn):
+        canonical = {}
+        codes = [canonical.setdefault(v, len(canonical)) for v in column.dictionary]
+        return np.array(codes, np.int64)[_take(column.codes, positions)], max(len(canonical), 1)
+    data = _take(column.data, positions)
+    nulls = _take(column.kinds, positions) == columnar.NULL
+    if isinstance(column, columnar.IntColumn) and n:
+        low, high = int(data.min()), int(data.max())
+        if high - low <= 4 * n:
+            # Small integer range: offsets are already dense codes, no sort needed
+            codes = data - low
+            codes[nulls] = high - low + 1
+            return codes, high - low + 2
+    uniques, inverse = np.unique(data, return_inverse=True)
+    inverse = inverse.reshape(-1).astype(np.int64)
+    inverse[nulls] = len(uniques)
+    return inverse, len(uniques) + 1
+
+
+def _first_seen(codes, bound):
+    """(group id per row numbered in first-seen order, group count, first row of each group)"""
+    n = len(codes)
+    first = np.full(bound, n, np.intp)
+    np.minimum.at(first, codes, np.arange(n))
+    present = np.flatnonzero(first < n)
+    order = present[np.argsort(first[present], kind='stable')]
+    rank = np.empty(bound, np.intp)
+    rank[order] = np.arange(len(order))
+    return rank[codes], len(order), first[order]
+
+
+def group_rows(store, group_by, positions, n):
+    """(group id per selected row, number of groups, first position of each group) in first-seen order"""
+    if not group_by:
+        return None, 1, None
+    if not n:
+        return np.zeros(0, np.intp), 0, np.zeros(0, np.intp)
+    combined, bound = None, 1
+    for name in group_by:
+        codes, size = _group_codes(store.columns.get(name), positions, n)
+        if combined is not None:
+            codes = combined * size + codes
+            size *= bound
+            if size > 4 * n:
+                _, codes = np.unique(codes, return_inverse=True)
+                codes = codes.reshape(-1)
+                size = int(codes.max()) + 1
+        combined, bound = codes, size
+    group_ids, count, first = _first_seen(combined, bound)
+    return group_ids, count, first if positions is None else positions[first]
+
+
+def aggregate(store, aggregates, group_by, positions=None, check=None):
+    """[(group key tuple, [value per (function, column)])] over the rows at positions (None: all rows);
+    check, if given, is called between column passes (it raises to stop the statement)"""
+    n = len(store) if positions is None else len(positions)
+    group_ids, count, firsts = group_rows(store, group_by, positions, n)
+    rows = [n] if group_ids is None else np.bincount(group_ids, minlength=count).tolist()
+    columns_out = []
+    for function, column in aggregates:
+        if check is not None: check()
+        if function == 'COUNT':
+            columns_out.append(rows)
+            continue
+        values, valid = _numbers(store.columns.get(column), positions, n)
+        ids = group_ids
+        if not valid.all():
+            values = values[valid]
+            ids = None if ids is None else ids[valid]
+        if ids is None:
+            # One group: cumsum adds in row order like the row path's sum()
+            seen = [len(values)]
+            if not len(values): out = [0.0]
+            elif function in ('SUM', 'AVG'): out = [float(values.cumsum()[-1])]
+            else: out = [float(values.min() if function == 'MIN' else values.max())]
+            if function == 'AVG' and len(values): out = [out[0] / len(values)]
+        else:
+            seen = np.bincount(ids, minlength=count)
+            if function in ('SUM', 'AVG'):
+                # bincount also adds in row order
+                totals = np.bincount(ids, weights=values, minlength=count)
+                out = totals if function == 'SUM' else totals / np.maximum(seen, 1)
+            else:
+                out = np.full(count, np.inf if function == 'MIN' else -np.inf)
+                (np.minimum if function == 'MIN' else np.maximum).at(out, ids, values)
+            out, seen = out.tolist(), seen.tolist()
+        empty = 0 if function == 'SUM' else None
+        columns_out.append([float(v) if k else empty for v, k in zip(out, seen)])
+
+    results = []
+    for g in range(count):
+        key = tuple(store.columns[name].get(int(firsts[g])) if name in store.columns else None
+                    for name in group_by) if group_by else ()
+        results.append((key, [values[g] for values in columns_out]))
+    return results
@@ -0,0 +1,82 @@
+"""
+wal.py
+Append-only write-ahead log for a single database file
+"""
+
+import json
+import os
+
+FSYNC_POLICIES = ('always', 'commit', 'never')
+
+
+class WriteAheadLog:
+    """JSON-lines redo log stored next to the database snapshot (<user>_<db>.wal)
+
+    fsync_policy:
+        'always' - fsync after every record
+        'commit' - fsync once per appended batch (statement or COMMIT)
+        'never'  - leave flushing to the operating system
+    """
+    def __init__(self, path, fsync_policy='commit'):
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy '{fsync_policy}'")
+        self.path = path
+        self.fsync_policy = fsync_policy
+        self.record_count = 0
+        self._file = None
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        return self._file
+
+    def _sync(self, f):
+        f.flush()
+        os.fsync(f.fileno())
+
+    def append(self, entries):
+        """Append a batch of log records"""
+        if not entries: return
+        f = self._open()
+        for entry in entries:
+            f.write(json.dumps(entry, separators=(',', ':')) + '\n')
+            if self.fsync_policy == 'always':
+                self._sync(f)
+        if self.fsync_policy == 'commit':
+            self._sync(f)
+        elif self.fsync_policy == 'never':
+            f.flush()
+        self.record_count += len(entries)
+
+    def read(self):
+        """Return all complete records in the log. A torn trailing line is ignored."""
+        entries = []
+        if not os.path.exists(self.path):
+            return entries
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line: continue
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break
+        self.record_count = len(entries)
+        return entries
+
+    def truncate(self):
+        """Discard the log after a checkpoint has been written"""
+        self.close()
+        with open(self.path, 'w', encoding='utf-8'):
+            pass
+        self.record_count = 0
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        self.close()
+        if os.path.exists(self.path): os.remove(self.path)
+        self.record_count = 0